@@ -0,0 +1,367 @@
+﻿"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archive_periods',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.String(length=7), nullable=False),
+    sa.Column('file_name', sa.String(length=200), nullable=False),
+    sa.Column('date_from', sa.Date(), nullable=False),
+    sa.Column('date_to', sa.Date(), nullable=False),
+    sa.Column('ledger_rows', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('period')
+    )
+    op.create_table('cache_generations',
+    sa.Column('namespace', sa.String(length=50), nullable=False),
+    sa.Column('generation', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('namespace')
+    )
+    op.create_table('doc_sequences',
+    sa.Column('doc_type', sa.String(length=30), nullable=False),
+    sa.Column('period', sa.String(length=6), nullable=False),
+    sa.Column('next_value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('doc_type', 'period')
+    )
+    op.create_table('partners',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(length=20), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('phone', sa.String(length=50), nullable=True),
+    sa.Column('address', sa.String(length=200), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('partners', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_partners_name'), ['name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_partners_type'), ['type'], unique=False)
+
+    op.create_table('products',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sku', sa.String(length=100), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('brand', sa.String(length=100), nullable=True),
+    sa.Column('model', sa.String(length=100), nullable=True),
+    sa.Column('barcode', sa.String(length=100), nullable=True),
+    sa.Column('unit', sa.String(length=20), nullable=True),
+    sa.Column('track_sn', sa.Boolean(), nullable=False),
+    sa.Column('warranty_months', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_products_brand'), ['brand'], unique=False)
+        batch_op.create_index(batch_op.f('ix_products_model'), ['model'], unique=False)
+        batch_op.create_index(batch_op.f('ix_products_name'), ['name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_products_sku'), ['sku'], unique=True)
+
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=50), nullable=False),
+    sa.Column('password_hash', sa.String(length=255), nullable=False),
+    sa.Column('role', sa.String(length=20), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_users_username'), ['username'], unique=True)
+
+    op.create_table('warehouses',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('code', sa.String(length=50), nullable=True),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('location', sa.String(length=200), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('code'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('docs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('doc_type', sa.String(length=30), nullable=False),
+    sa.Column('doc_no', sa.String(length=50), nullable=False),
+    sa.Column('biz_date', sa.Date(), nullable=False),
+    sa.Column('partner_id', sa.Integer(), nullable=True),
+    sa.Column('from_wh_id', sa.Integer(), nullable=True),
+    sa.Column('to_wh_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('remark', sa.String(length=500), nullable=True),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('approved_by', sa.Integer(), nullable=True),
+    sa.Column('approved_at', sa.DateTime(), nullable=True),
+    sa.Column('posted_by', sa.Integer(), nullable=True),
+    sa.Column('posted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['approved_by'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['from_wh_id'], ['warehouses.id'], ),
+    sa.ForeignKeyConstraint(['partner_id'], ['partners.id'], ),
+    sa.ForeignKeyConstraint(['posted_by'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['to_wh_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('docs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_docs_biz_date'), ['biz_date'], unique=False)
+        batch_op.create_index(batch_op.f('ix_docs_doc_no'), ['doc_no'], unique=True)
+        batch_op.create_index(batch_op.f('ix_docs_doc_type'), ['doc_type'], unique=False)
+        batch_op.create_index(batch_op.f('ix_docs_status'), ['status'], unique=False)
+
+    op.create_table('jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('params', sa.JSON(), nullable=True),
+    sa.Column('checkpoint', sa.JSON(), nullable=True),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('error', sa.String(length=1000), nullable=True),
+    sa.Column('progress_done', sa.Integer(), nullable=False),
+    sa.Column('progress_total', sa.Integer(), nullable=True),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_jobs_kind'), ['kind'], unique=False)
+        batch_op.create_index(batch_op.f('ix_jobs_status'), ['status'], unique=False)
+
+    op.create_table('period_closes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cutoff', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('opening_doc_id', sa.Integer(), nullable=True),
+    sa.Column('ledger_rows', sa.Integer(), nullable=False),
+    sa.Column('doc_count', sa.Integer(), nullable=False),
+    sa.Column('closed_by', sa.Integer(), nullable=True),
+    sa.Column('closed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['closed_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('period_closes', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_period_closes_cutoff'), ['cutoff'], unique=True)
+
+    op.create_table('stock_alerts',
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('qty_on_hand', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('min_qty', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('max_qty', sa.Numeric(precision=18, scale=2), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('warehouse_id', 'product_id')
+    )
+    op.create_table('stock_balances',
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('qty_on_hand', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('warehouse_id', 'product_id')
+    )
+    op.create_table('stock_thresholds',
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('min_qty', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('max_qty', sa.Numeric(precision=18, scale=2), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('warehouse_id', 'product_id')
+    )
+    op.create_table('warranty_expiry_buckets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('expiry_date', sa.Date(), nullable=False),
+    sa.Column('partner_id', sa.Integer(), nullable=True),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('sn_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['partner_id'], ['partners.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('expiry_date', 'partner_id', 'product_id', name='uq_warranty_bucket')
+    )
+    with op.batch_alter_table('warranty_expiry_buckets', schema=None) as batch_op:
+        batch_op.create_index('ix_warranty_bucket_partner_date', ['partner_id', 'expiry_date'], unique=False)
+
+    op.create_table('doc_lines',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('doc_id', sa.Integer(), nullable=False),
+    sa.Column('line_no', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('qty', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('unit_price', sa.Numeric(precision=18, scale=2), nullable=True),
+    sa.Column('amount', sa.Numeric(precision=18, scale=2), nullable=True),
+    sa.Column('from_wh_id', sa.Integer(), nullable=True),
+    sa.Column('to_wh_id', sa.Integer(), nullable=True),
+    sa.Column('remark', sa.String(length=500), nullable=True),
+    sa.CheckConstraint('qty > 0', name='ck_doc_line_qty_gt_zero'),
+    sa.ForeignKeyConstraint(['doc_id'], ['docs.id'], ),
+    sa.ForeignKeyConstraint(['from_wh_id'], ['warehouses.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['to_wh_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('doc_id', 'line_no', name='uq_doc_line_no')
+    )
+    with op.batch_alter_table('doc_lines', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_doc_lines_doc_id'), ['doc_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_doc_lines_from_wh_id'), ['from_wh_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_doc_lines_product_id'), ['product_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_doc_lines_to_wh_id'), ['to_wh_id'], unique=False)
+
+    op.create_table('product_sns',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('sn', sa.String(length=100), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=True),
+    sa.Column('in_doc_id', sa.Integer(), nullable=True),
+    sa.Column('in_line_id', sa.Integer(), nullable=True),
+    sa.Column('in_date', sa.Date(), nullable=True),
+    sa.Column('out_doc_id', sa.Integer(), nullable=True),
+    sa.Column('out_line_id', sa.Integer(), nullable=True),
+    sa.Column('out_date', sa.Date(), nullable=True),
+    sa.Column('warranty_start', sa.Date(), nullable=True),
+    sa.Column('warranty_end', sa.Date(), nullable=True),
+    sa.ForeignKeyConstraint(['in_doc_id'], ['docs.id'], ),
+    sa.ForeignKeyConstraint(['in_line_id'], ['doc_lines.id'], ),
+    sa.ForeignKeyConstraint(['out_doc_id'], ['docs.id'], ),
+    sa.ForeignKeyConstraint(['out_line_id'], ['doc_lines.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('product_sns', schema=None) as batch_op:
+        batch_op.create_index('ix_product_sns_in_doc', ['in_doc_id'], unique=False)
+        batch_op.create_index('ix_product_sns_out_doc', ['out_doc_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_product_sns_product_id'), ['product_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_product_sns_sn'), ['sn'], unique=True)
+        batch_op.create_index(batch_op.f('ix_product_sns_status'), ['status'], unique=False)
+        batch_op.create_index(batch_op.f('ix_product_sns_warehouse_id'), ['warehouse_id'], unique=False)
+        batch_op.create_index('ix_product_sns_warranty_end', ['warranty_end'], unique=False)
+
+    op.create_table('stock_ledger',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('ref_doc_id', sa.Integer(), nullable=False),
+    sa.Column('ref_line_id', sa.Integer(), nullable=False),
+    sa.Column('ref_type', sa.String(length=30), nullable=False),
+    sa.Column('biz_date', sa.Date(), nullable=False),
+    sa.Column('in_qty', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('out_qty', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('unit_cost', sa.Numeric(precision=18, scale=2), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['ref_doc_id'], ['docs.id'], ),
+    sa.ForeignKeyConstraint(['ref_line_id'], ['doc_lines.id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stock_ledger', schema=None) as batch_op:
+        batch_op.create_index('ix_ledger_ref_doc', ['ref_doc_id'], unique=False)
+        batch_op.create_index('ix_ledger_wh_prod_date', ['warehouse_id', 'product_id', 'biz_date'], unique=False)
+
+    op.create_table('doc_line_sns',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('doc_id', sa.Integer(), nullable=False),
+    sa.Column('line_id', sa.Integer(), nullable=False),
+    sa.Column('sn_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['doc_id'], ['docs.id'], ),
+    sa.ForeignKeyConstraint(['line_id'], ['doc_lines.id'], ),
+    sa.ForeignKeyConstraint(['sn_id'], ['product_sns.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('line_id', 'sn_id', name='uq_line_sn')
+    )
+    with op.batch_alter_table('doc_line_sns', schema=None) as batch_op:
+        batch_op.create_index('ix_doc_line_sn', ['doc_id', 'sn_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_doc_line_sns_doc_id'), ['doc_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_doc_line_sns_line_id'), ['line_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('doc_line_sns', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_doc_line_sns_line_id'))
+        batch_op.drop_index(batch_op.f('ix_doc_line_sns_doc_id'))
+        batch_op.drop_index('ix_doc_line_sn')
+
+    op.drop_table('doc_line_sns')
+    with op.batch_alter_table('stock_ledger', schema=None) as batch_op:
+        batch_op.drop_index('ix_ledger_wh_prod_date')
+        batch_op.drop_index('ix_ledger_ref_doc')
+
+    op.drop_table('stock_ledger')
+    with op.batch_alter_table('product_sns', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_sns_warranty_end')
+        batch_op.drop_index(batch_op.f('ix_product_sns_warehouse_id'))
+        batch_op.drop_index(batch_op.f('ix_product_sns_status'))
+        batch_op.drop_index(batch_op.f('ix_product_sns_sn'))
+        batch_op.drop_index(batch_op.f('ix_product_sns_product_id'))
+        batch_op.drop_index('ix_product_sns_out_doc')
+        batch_op.drop_index('ix_product_sns_in_doc')
+
+    op.drop_table('product_sns')
+    with op.batch_alter_table('doc_lines', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_doc_lines_to_wh_id'))
+        batch_op.drop_index(batch_op.f('ix_doc_lines_product_id'))
+        batch_op.drop_index(batch_op.f('ix_doc_lines_from_wh_id'))
+        batch_op.drop_index(batch_op.f('ix_doc_lines_doc_id'))
+
+    op.drop_table('doc_lines')
+    with op.batch_alter_table('warranty_expiry_buckets', schema=None) as batch_op:
+        batch_op.drop_index('ix_warranty_bucket_partner_date')
+
+    op.drop_table('warranty_expiry_buckets')
+    op.drop_table('stock_thresholds')
+    op.drop_table('stock_balances')
+    op.drop_table('stock_alerts')
+    with op.batch_alter_table('period_closes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_period_closes_cutoff'))
+
+    op.drop_table('period_closes')
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_jobs_status'))
+        batch_op.drop_index(batch_op.f('ix_jobs_kind'))
+
+    op.drop_table('jobs')
+    with op.batch_alter_table('docs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_docs_status'))
+        batch_op.drop_index(batch_op.f('ix_docs_doc_type'))
+        batch_op.drop_index(batch_op.f('ix_docs_doc_no'))
+        batch_op.drop_index(batch_op.f('ix_docs_biz_date'))
+
+    op.drop_table('docs')
+    op.drop_table('warehouses')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_username'))
+
+    op.drop_table('users')
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_products_sku'))
+        batch_op.drop_index(batch_op.f('ix_products_name'))
+        batch_op.drop_index(batch_op.f('ix_products_model'))
+        batch_op.drop_index(batch_op.f('ix_products_brand'))
+
+    op.drop_table('products')
+    with op.batch_alter_table('partners', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_partners_type'))
+        batch_op.drop_index(batch_op.f('ix_partners_name'))
+
+    op.drop_table('partners')
+    op.drop_table('doc_sequences')
+    op.drop_table('cache_generations')
+    op.drop_table('archive_periods')
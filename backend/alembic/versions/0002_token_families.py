@@ -0,0 +1,40 @@
+﻿"""token families
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('token_families',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('current_jti', sa.String(length=32), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=True),
+    sa.Column('revoked_at', sa.DateTime(), nullable=True),
+    sa.Column('revoke_reason', sa.String(length=50), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('token_families', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_token_families_revoked_at'), ['revoked_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_token_families_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('token_families', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_token_families_user_id'))
+        batch_op.drop_index(batch_op.f('ix_token_families_revoked_at'))
+
+    op.drop_table('token_families')
@@ -0,0 +1,56 @@
+﻿"""stocktake snapshots
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stocktake_lines',
+    sa.Column('doc_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('book_qty', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('counted_qty', sa.Numeric(precision=18, scale=2), nullable=True),
+    sa.ForeignKeyConstraint(['doc_id'], ['docs.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('doc_id', 'product_id')
+    )
+    op.create_table('stocktakes',
+    sa.Column('doc_id', sa.Integer(), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('snapshot_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['doc_id'], ['docs.id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('doc_id')
+    )
+    with op.batch_alter_table('stocktakes', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stocktakes_warehouse_id'), ['warehouse_id'], unique=False)
+
+    op.create_table('stocktake_sns',
+    sa.Column('doc_id', sa.Integer(), nullable=False),
+    sa.Column('sn_id', sa.Integer(), nullable=False),
+    sa.Column('in_book', sa.Boolean(), nullable=False),
+    sa.Column('counted', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['doc_id'], ['docs.id'], ),
+    sa.ForeignKeyConstraint(['sn_id'], ['product_sns.id'], ),
+    sa.PrimaryKeyConstraint('doc_id', 'sn_id')
+    )
+
+
+def downgrade():
+    op.drop_table('stocktake_sns')
+    with op.batch_alter_table('stocktakes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stocktakes_warehouse_id'))
+
+    op.drop_table('stocktakes')
+    op.drop_table('stocktake_lines')
@@ -0,0 +1,27 @@
+﻿"""docs.ref_doc_id for returns
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ADD COLUMN ... REFERENCES rather than a batch rebuild: docs is referenced by most other
+    # tables, and dropping it for a rebuild fails with foreign keys enforced.
+    op.execute('ALTER TABLE docs ADD COLUMN ref_doc_id INTEGER REFERENCES docs (id)')
+    op.create_index(op.f('ix_docs_ref_doc_id'), 'docs', ['ref_doc_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_docs_ref_doc_id'), table_name='docs')
+    op.drop_column('docs', 'ref_doc_id')
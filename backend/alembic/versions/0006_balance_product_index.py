@@ -0,0 +1,26 @@
+﻿"""stock balance product index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stock_balances', schema=None) as batch_op:
+        batch_op.create_index('ix_balance_product_wh', ['product_id', 'warehouse_id', 'qty_on_hand'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stock_balances', schema=None) as batch_op:
+        batch_op.drop_index('ix_balance_product_wh')
+
@@ -0,0 +1,58 @@
+﻿"""partner summaries
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('partner_summaries',
+    sa.Column('partner_id', sa.Integer(), nullable=False),
+    sa.Column('doc_type', sa.String(length=30), nullable=False),
+    sa.Column('period', sa.String(length=6), nullable=False),
+    sa.Column('open_count', sa.Integer(), nullable=False),
+    sa.Column('open_amount', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('posted_count', sa.Integer(), nullable=False),
+    sa.Column('posted_amount', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('last_biz_date', sa.Date(), nullable=True),
+    sa.ForeignKeyConstraint(['partner_id'], ['partners.id'], ),
+    sa.PrimaryKeyConstraint('partner_id', 'doc_type', 'period')
+    )
+    with op.batch_alter_table('docs', schema=None) as batch_op:
+        batch_op.create_index('ix_docs_partner_date', ['partner_id', 'biz_date'], unique=False)
+    # backfill from the docs still in the main database
+    op.execute(
+        """
+        INSERT INTO partner_summaries
+            (partner_id, doc_type, period, open_count, open_amount, posted_count, posted_amount, last_biz_date)
+        SELECT d.partner_id, d.doc_type, strftime('%Y%m', d.biz_date),
+               SUM(CASE WHEN d.status = 'POSTED' THEN 0 ELSE 1 END),
+               ROUND(SUM(CASE WHEN d.status = 'POSTED' THEN 0 ELSE COALESCE(l.amount, 0) END), 2),
+               SUM(CASE WHEN d.status = 'POSTED' THEN 1 ELSE 0 END),
+               ROUND(SUM(CASE WHEN d.status = 'POSTED' THEN COALESCE(l.amount, 0) ELSE 0 END), 2),
+               MAX(d.biz_date)
+        FROM docs d
+        LEFT JOIN (
+            SELECT doc_id, SUM(COALESCE(amount, qty * unit_price, 0)) AS amount FROM doc_lines GROUP BY doc_id
+        ) l ON l.doc_id = d.id
+        WHERE d.partner_id IS NOT NULL AND d.status != 'VOID'
+        GROUP BY d.partner_id, d.doc_type, strftime('%Y%m', d.biz_date)
+        """
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('docs', schema=None) as batch_op:
+        batch_op.drop_index('ix_docs_partner_date')
+
+    op.drop_table('partner_summaries')
@@ -0,0 +1,83 @@
+﻿"""quantities and amounts as integer hundredths
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+import sqlite3
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import ARCHIVE_DIR
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+# table -> (column, nullable)
+COLUMNS = {
+    'doc_lines': (('qty', False), ('unit_price', True), ('amount', True)),
+    'partner_summaries': (('open_amount', False), ('posted_amount', False)),
+    'stock_alerts': (('qty_on_hand', False), ('min_qty', False), ('max_qty', True)),
+    'stock_balances': (('qty_on_hand', False),),
+    'stock_ledger': (('in_qty', False), ('out_qty', False), ('unit_cost', True)),
+    'stock_thresholds': (('min_qty', False), ('max_qty', True)),
+    'stocktake_lines': (('book_qty', False), ('counted_qty', True)),
+}
+# archive files hold plain copies of these; PRAGMA user_version records the format they are in
+ARCHIVED = ('doc_lines', 'stock_ledger')
+ARCHIVE_VERSION = 1
+
+TO_HUNDREDTHS = '{0} = CAST(ROUND({0} * 100) AS INTEGER)'
+FROM_HUNDREDTHS = '{0} = ROUND({0} / 100.0, 2)'
+
+
+def _scale(execute, table, columns, expression):
+    execute(f"UPDATE {table} SET {', '.join(expression.format(name) for name, _ in columns)}")
+
+
+def _archive_files():
+    if 'archive_periods' not in sa.inspect(op.get_bind()).get_table_names():
+        return []
+    names = op.get_bind().exec_driver_sql('SELECT file_name FROM archive_periods').scalars().all()
+    return [ARCHIVE_DIR / name for name in names if (ARCHIVE_DIR / name).exists()]
+
+
+def _convert_archives(expression, from_version, to_version):
+    for path in _archive_files():
+        conn = sqlite3.connect(path)
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] != from_version:
+                continue
+            with conn:
+                for table in ARCHIVED:
+                    _scale(conn.execute, table, COLUMNS[table], expression)
+                conn.execute(f'PRAGMA user_version = {to_version}')
+        finally:
+            conn.close()
+
+
+def upgrade():
+    for table, columns in COLUMNS.items():
+        _scale(op.execute, table, columns, TO_HUNDREDTHS)
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name, nullable in columns:
+                batch_op.alter_column(
+                    name, existing_type=sa.NUMERIC(precision=18, scale=2), type_=sa.Integer(), existing_nullable=nullable
+                )
+    _convert_archives(TO_HUNDREDTHS, 0, ARCHIVE_VERSION)
+
+
+def downgrade():
+    _convert_archives(FROM_HUNDREDTHS, ARCHIVE_VERSION, 0)
+    for table, columns in COLUMNS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name, nullable in columns:
+                batch_op.alter_column(
+                    name, existing_type=sa.Integer(), type_=sa.NUMERIC(precision=18, scale=2), existing_nullable=nullable
+                )
+        _scale(op.execute, table, columns, FROM_HUNDREDTHS)
@@ -0,0 +1,38 @@
+﻿"""stocktake serial prior state
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+# column -> declaration; plain ADD COLUMN ... REFERENCES, as in 0005, instead of a batch rebuild
+COLUMNS = {
+    'prior_status': 'VARCHAR(20)',
+    'prior_warehouse_id': 'INTEGER REFERENCES warehouses (id)',
+    'prior_in_doc_id': 'INTEGER REFERENCES docs (id)',
+    'prior_in_line_id': 'INTEGER REFERENCES doc_lines (id)',
+    'prior_in_date': 'DATE',
+    'prior_out_doc_id': 'INTEGER REFERENCES docs (id)',
+    'prior_out_line_id': 'INTEGER REFERENCES doc_lines (id)',
+    'prior_out_date': 'DATE',
+}
+
+
+def upgrade():
+    for name, declaration in COLUMNS.items():
+        op.execute(f'ALTER TABLE stocktake_sns ADD COLUMN {name} {declaration}')
+
+
+def downgrade():
+    with op.batch_alter_table('stocktake_sns', schema=None) as batch_op:
+        for name in reversed(COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,27 @@
+﻿"""token family revocation sequence
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('token_families', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('revoked_seq', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_token_families_revoked_seq'), ['revoked_seq'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('token_families', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_token_families_revoked_seq'))
+        batch_op.drop_column('revoked_seq')
@@ -1,41 +1,92 @@
 ﻿from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
+from functools import lru_cache
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 
 from app.core.deps import get_current_user
-from app.core.security import verify_password, create_access_token, create_refresh_token
+from app.core.login_guard import LoginBusy, hash_executor, ip_limiter, username_limiter
+from app.core.security import hash_password, verify_and_update
+from app.core.tokens import TokenError, issue_tokens, revoke_refresh_token, rotate_refresh_token
 from app.db.deps import get_db
 from app.models import User
-from app.schemas.schemas import LoginIn, TokenOut
+from app.schemas.schemas import LoginIn, RefreshIn, TokenOut
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 
+@lru_cache(maxsize=1)
+def _dummy_hash() -> str:
+    # unknown usernames are still hashed, so response time does not reveal which names exist
+    return hash_password("not-a-user")
+
+
+def _throttle(key: str, limiter):
+    retry_after = limiter.take(key)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(int(retry_after) + 1)},
+        )
+
+
+def _load_user(db: Session, username: str):
+    return db.execute(select(User).where(User.username == username)).scalar_one_or_none()
+
+
+def _save_rehash(db: Session, user_id: int, password_hash: str):
+    db.execute(update(User).where(User.id == user_id).values(password_hash=password_hash))
+    db.commit()
+
+
 @router.post("/login", response_model=TokenOut)
-def login(data: LoginIn, db: Session = Depends(get_db)):
-    stmt = select(User).where(User.username == data.username)
-    user = db.execute(stmt).scalar_one_or_none()
-    if user is None or not verify_password(data.password, user.password_hash):
+async def login(data: LoginIn, request: Request, db: Session = Depends(get_db)):
+    # async so that waiting for the hash pool does not hold a request thread
+    # request.client is the real client only when uvicorn trusts the proxy's X-Forwarded-For
+    if ip_limiter is not None:
+        _throttle(f"ip:{request.client.host if request.client else ''}", ip_limiter)
+    _throttle(f"user:{data.username.lower()}", username_limiter)
+
+    user = await run_in_threadpool(_load_user, db, data.username)
+    password_hash = user.password_hash if user is not None else await run_in_threadpool(_dummy_hash)
+    try:
+        valid, new_hash = await hash_executor.run(verify_and_update, data.password, password_hash)
+    except LoginBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Login busy, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    if user is None or not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    if new_hash:
+        await run_in_threadpool(_save_rehash, db, user.id, new_hash)
 
-    return TokenOut(
-        access_token=create_access_token(user.username),
-        refresh_token=create_refresh_token(user.username),
-    )
+    access_token, refresh_token = await run_in_threadpool(issue_tokens, db, user)
+    return TokenOut(access_token=access_token, refresh_token=refresh_token)
 
 
 @router.post("/refresh", response_model=TokenOut)
-def refresh(body: dict):
-    refresh_token = body.get("refresh_token")
-    if not refresh_token:
-        raise HTTPException(status_code=400, detail="refresh_token required")
-    # In a real system, verify refresh token and subject
-    return TokenOut(
-        access_token=create_access_token("system"),
-        refresh_token=create_refresh_token("system"),
-    )
+def refresh(data: RefreshIn, db: Session = Depends(get_db)):
+    # Single use: the response carries a new refresh token and the submitted one stops working.
+    try:
+        access_token, refresh_token = rotate_refresh_token(db, data.refresh_token)
+    except TokenError as exc:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(exc))
+    return TokenOut(access_token=access_token, refresh_token=refresh_token)
+
+
+@router.post("/logout", status_code=204)
+def logout(data: RefreshIn, db: Session = Depends(get_db)):
+    # Revokes the whole login: its refresh token and every access token issued from it.
+    try:
+        revoke_refresh_token(db, data.refresh_token)
+    except TokenError as exc:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(exc))
 
 
 @router.get("/me")
@@ -1,21 +1,54 @@
 ﻿from __future__ import annotations
 
-from datetime import datetime
-from typing import List, Optional
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.api.routes.jobs import job_accepted
 from app.core.deps import get_current_user
 from app.db.deps import db_transaction, get_db
-from app.models import Doc, DocLine
-from app.schemas.schemas import DocCreate, DocOut
+from app.models import Doc, DocLine, DocLineSN
+from app.schemas.schemas import (
+    DocBatchCreateIn,
+    DocBatchCreateResult,
+    DocBatchPostIn,
+    DocCheckOut,
+    DocCreate,
+    DocLineOut,
+    DocLinePatch,
+    DocOut,
+    JobOut,
+)
+from app.services.doc_batch import create_docs
+from app.services.doc_numbers import doc_no_conflict, doc_numbers
+from app.services.events import emit_doc
+from app.services.jobs import submit_job
+from app.services.partner_summary import track_docs, untrack_docs
+from app.services.post_check import check_doc
 from app.services.post_doc import post_doc, PostError
+from app.services.reversal import reverse_doc
+from app.services.stocktake import STOCKTAKE
 
 router = APIRouter(prefix="/api/docs", tags=["docs"])
 
 
+@contextmanager
+def doc_no_conflicts():
+    # a doc_no already taken, or taken by another request between allocation and the insert
+    try:
+        yield
+    except IntegrityError as exc:
+        if not doc_no_conflict(exc):
+            raise
+        raise HTTPException(status_code=409, detail="doc_no already exists")
+
+
 @router.get("", response_model=List[DocOut])
 def list_docs(
     doc_type: Optional[str] = None,
@@ -46,14 +79,19 @@ def get_doc(doc_id: int, db: Session = Depends(get_db), user=Depends(get_current
 
 @router.post("", response_model=DocOut)
 def create_doc(data: DocCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    with db_transaction(db):
+    if data.doc_type == STOCKTAKE:
+        raise HTTPException(status_code=400, detail="Create stocktakes via /api/stocktakes")
+    # allocate before the transaction: a block refill writes doc_sequences on its own connection
+    doc_no = data.doc_no or doc_numbers.next(data.doc_type, data.biz_date)
+    with doc_no_conflicts(), db_transaction(db):
         doc = Doc(
             doc_type=data.doc_type,
-            doc_no=data.doc_no,
+            doc_no=doc_no,
             biz_date=data.biz_date,
             partner_id=data.partner_id,
             from_wh_id=data.from_wh_id,
             to_wh_id=data.to_wh_id,
+            ref_doc_id=data.ref_doc_id,
             status="DRAFT",
             remark=data.remark,
             created_by=user.id,
@@ -75,43 +113,119 @@ def create_doc(data: DocCreate, db: Session = Depends(get_db), user=Depends(get_
             )
             db.add(doc_line)
         db.flush()
+        track_docs(db, [doc.id])
+        emit_doc(db, doc)
         return doc
 
 
-@router.put("/{doc_id}", response_model=DocOut)
-def update_doc(doc_id: int, data: DocCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+@router.post("/batch", response_model=List[DocBatchCreateResult])
+def create_docs_batch(data: DocBatchCreateIn, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    # Per-document results in request order; invalid docs carry an error and are not created.
+    with doc_no_conflicts():
+        return create_docs(db, data.docs, user.id)
+
+
+LINE_FIELDS = ("product_id", "qty", "unit_price", "amount", "from_wh_id", "to_wh_id", "remark")
+
+
+def _as_column_value(value):
+    return Decimal(str(value)) if isinstance(value, float) else value
+
+
+def _apply_line_changes(line: DocLine, values: Dict[str, Any]) -> bool:
+    # Assigns only differing columns, so the UPDATE touches just those; returns True if product changed.
+    product_changed = False
+    for field, value in values.items():
+        value = _as_column_value(value)
+        if getattr(line, field) != value:
+            setattr(line, field, value)
+            product_changed = product_changed or field == "product_id"
+    return product_changed
+
+
+def _get_draft(db: Session, doc_id: int) -> Doc:
     doc = db.get(Doc, doc_id)
     if doc is None:
         raise HTTPException(status_code=404, detail="Doc not found")
     if doc.status != "DRAFT":
         raise HTTPException(status_code=400, detail="Only DRAFT can be updated")
+    if doc.doc_type == STOCKTAKE:
+        raise HTTPException(status_code=400, detail="Stocktake lines are generated on posting")
+    return doc
 
-    with db_transaction(db):
+
+@router.put("/{doc_id}", response_model=DocOut)
+def update_doc(doc_id: int, data: DocCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    doc = _get_draft(db, doc_id)
+    if data.doc_type == STOCKTAKE:
+        raise HTTPException(status_code=400, detail="Create stocktakes via /api/stocktakes")
+    line_nos = [line.line_no for line in data.lines]
+    if len(set(line_nos)) != len(line_nos):
+        raise HTTPException(status_code=400, detail="duplicate line_no")
+
+    with doc_no_conflicts(), db_transaction(db):
+        untrack_docs(db, [doc.id])
         doc.doc_type = data.doc_type
-        doc.doc_no = data.doc_no
+        doc.doc_no = data.doc_no or doc.doc_no
         doc.biz_date = data.biz_date
         doc.partner_id = data.partner_id
         doc.from_wh_id = data.from_wh_id
         doc.to_wh_id = data.to_wh_id
+        doc.ref_doc_id = data.ref_doc_id
         doc.remark = data.remark
 
-        db.execute(delete(DocLine).where(DocLine.doc_id == doc_id))
+        # Lines are matched by line_no: unchanged lines keep their id and SN links.
+        existing = {
+            line.line_no: line
+            for line in db.execute(select(DocLine).where(DocLine.doc_id == doc_id)).scalars().all()
+        }
+        unlink_ids = []
         for line in data.lines:
-            doc_line = DocLine(
-                doc_id=doc.id,
-                line_no=line.line_no,
-                product_id=line.product_id,
-                qty=line.qty,
-                unit_price=line.unit_price,
-                amount=line.amount,
-                from_wh_id=line.from_wh_id,
-                to_wh_id=line.to_wh_id,
-                remark=line.remark,
-            )
-            db.add(doc_line)
+            values = line.model_dump(include=set(LINE_FIELDS))
+            current = existing.pop(line.line_no, None)
+            if current is None:
+                db.add(DocLine(doc_id=doc.id, line_no=line.line_no, **values))
+            elif _apply_line_changes(current, values):
+                unlink_ids.append(current.id)
+        removed_ids = [line.id for line in existing.values()]
+        if unlink_ids or removed_ids:
+            db.execute(delete(DocLineSN).where(DocLineSN.line_id.in_(unlink_ids + removed_ids)))
+        if removed_ids:
+            db.execute(delete(DocLine).where(DocLine.id.in_(removed_ids)))
+        db.flush()
+        track_docs(db, [doc.id])
         return doc
 
 
+@router.patch("/{doc_id}/lines/{line_no}", response_model=DocLineOut)
+def patch_doc_line(
+    doc_id: int,
+    line_no: int,
+    data: DocLinePatch,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    _get_draft(db, doc_id)
+    line = db.execute(
+        select(DocLine).where(DocLine.doc_id == doc_id, DocLine.line_no == line_no)
+    ).scalar_one_or_none()
+    if line is None:
+        raise HTTPException(status_code=404, detail="Line not found")
+
+    values = data.model_dump(exclude_unset=True)
+    if values.get("product_id", 0) is None or values.get("qty", 0) is None:
+        raise HTTPException(status_code=400, detail="product_id and qty cannot be null")
+    with db_transaction(db):
+        untrack_docs(db, [doc_id])
+        if _apply_line_changes(line, values):
+            # serials linked for the old product no longer apply
+            db.execute(delete(DocLineSN).where(DocLineSN.line_id == line.id))
+        db.flush()
+        track_docs(db, [doc_id])
+    db.refresh(line)
+    return line
+
+
 @router.post("/{doc_id}/approve", response_model=DocOut)
 def approve_doc(doc_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
     doc = db.get(Doc, doc_id)
@@ -122,13 +236,39 @@ def approve_doc(doc_id: int, db: Session = Depends(get_db), user=Depends(get_cur
     doc.status = "APPROVED"
     doc.approved_by = user.id
     doc.approved_at = datetime.utcnow()
+    emit_doc(db, doc)
     db.commit()
     db.refresh(doc)
     return doc
 
 
+@router.post("/post-batch", response_model=JobOut, status_code=202)
+def post_docs_batch(data: DocBatchPostIn, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    job = submit_job(db, "post_docs", {"doc_ids": data.doc_ids, "user_id": user.id}, user.id)
+    return job_accepted(job)
+
+
+@router.get("/{doc_id}/check", response_model=DocCheckOut)
+def check_doc_endpoint(doc_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    # Dry-run post: every problem that would make POST /post fail, read-only and outside a write transaction.
+    doc = db.get(Doc, doc_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Doc not found")
+    return check_doc(db, doc)
+
+
 @router.post("/{doc_id}/post", response_model=DocOut)
-def post_doc_endpoint(doc_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def post_doc_endpoint(
+    doc_id: int,
+    background: bool = False,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    if background:
+        if db.get(Doc, doc_id) is None:
+            raise HTTPException(status_code=404, detail="Doc not found")
+        job = submit_job(db, "post_docs", {"doc_ids": [doc_id], "user_id": user.id}, user.id)
+        return job_accepted(job)
     try:
         with db_transaction(db):
             doc = post_doc(db, doc_id, user.id)
@@ -136,3 +276,20 @@ def post_doc_endpoint(doc_id: int, db: Session = Depends(get_db), user=Depends(g
         return doc
     except PostError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.post("/{doc_id}/reverse", response_model=DocOut)
+def reverse_doc_endpoint(
+    doc_id: int,
+    biz_date: Optional[date] = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    # Compensating ledger entries dated biz_date (default: the doc's own date); the doc becomes VOID.
+    try:
+        with db_transaction(db):
+            doc = reverse_doc(db, doc_id, biz_date)
+        db.refresh(doc)
+        return doc
+    except PostError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
@@ -0,0 +1,45 @@
+﻿from __future__ import annotations
+
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.deps import get_stream_user
+from app.services.events import event_bus
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+HEARTBEAT_SECONDS = 15
+
+
+def _format(item) -> str:
+    return f"id: {item['id']}\nevent: {item['topic']}\ndata: {json.dumps(item['data'])}\n\n"
+
+
+@router.get("/stream")
+async def stream_events(request: Request, topics: Optional[str] = None, user=Depends(get_stream_user)):
+    # topics: comma separated subset of balance,doc,sn,alert; omit for all
+    wanted = [t.strip() for t in topics.split(",") if t.strip()] if topics else None
+
+    async def gen():
+        sub = event_bus.subscribe(wanted)
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    item = await asyncio.wait_for(sub.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield _format(item)
+        finally:
+            event_bus.unsubscribe(sub)
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
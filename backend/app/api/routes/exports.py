@@ -0,0 +1,87 @@
+﻿from __future__ import annotations
+
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.api.routes.jobs import job_accepted
+from app.core.deps import get_current_user
+from app.db.deps import get_db
+from app.models import Job
+from app.schemas.schemas import JobOut
+from app.services.jobs import submit_job
+
+router = APIRouter(prefix="/api/exports", tags=["exports"])
+
+# app.services.exports (and through it the archive readers) is imported by each endpoint on first use,
+# so a worker that never exports does not load it
+
+
+@router.get("/{dataset}")
+def stream_export(
+    dataset: str,
+    format: str = "csv",
+    gzip: bool = True,
+    warehouse_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    user=Depends(get_current_user),
+):
+    # dataset: ledger | balances | sns; format: csv | columnar (one JSON column block per chunk)
+    from app.services.exports import ExportError, ExportFilters, check_request, export_filename, iter_export
+
+    try:
+        check_request(dataset, format)
+    except ExportError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    filters = ExportFilters(warehouse_id, product_id, date_from, date_to)
+    media_type = "application/gzip" if gzip else ("text/csv" if format == "csv" else "application/x-ndjson")
+    return StreamingResponse(
+        iter_export(dataset, format, filters, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(dataset, format, gzip)}"'},
+    )
+
+
+@router.post("/{dataset}/jobs", response_model=JobOut, status_code=202)
+def submit_export(
+    dataset: str,
+    format: str = "csv",
+    warehouse_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    from app.services.exports import ExportError, ExportFilters, check_request
+
+    try:
+        check_request(dataset, format)
+    except ExportError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    filters = ExportFilters(warehouse_id, product_id, date_from, date_to)
+    job = submit_job(
+        db, "export", {"dataset": dataset, "format": format, "filters": filters.to_params()}, user.id
+    )
+    return job_accepted(job)
+
+
+@router.get("/jobs/{job_id}/file")
+def download_export(job_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    from app.services.exports import ExportError, export_path
+
+    job = db.get(Job, job_id)
+    if job is None or job.kind != "export":
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != "DONE":
+        raise HTTPException(status_code=409, detail="Export not finished")
+    try:
+        path = export_path(job.result["file"])
+    except ExportError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    return FileResponse(path, media_type="application/gzip", filename=path.name)
@@ -0,0 +1,47 @@
+﻿from __future__ import annotations
+
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.deps import get_current_user
+from app.db.deps import get_db
+from app.models import Job
+from app.schemas.schemas import JobOut
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+def job_accepted(job: Job) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content=JobOut.model_validate(job).model_dump(mode="json"),
+        headers={"Location": f"/api/jobs/{job.id}"},
+    )
+
+
+@router.get("", response_model=List[JobOut])
+def list_jobs(
+    kind: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    stmt = select(Job)
+    if kind:
+        stmt = stmt.where(Job.kind == kind)
+    if status:
+        stmt = stmt.where(Job.status == status)
+    return list(db.execute(stmt.order_by(Job.id.desc()).limit(limit)).scalars().all())
+
+
+@router.get("/{job_id}", response_model=JobOut)
+def get_job(job_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    job = db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
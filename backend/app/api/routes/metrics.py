@@ -0,0 +1,21 @@
+﻿from __future__ import annotations
+
+import os
+
+from fastapi import APIRouter, Depends, Request
+
+from app.core.cache import response_cache
+from app.core.deps import get_current_user
+from app.core.login_guard import hash_executor
+
+router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+
+
+@router.get("")
+def get_metrics(request: Request, user=Depends(get_current_user)):
+    return {
+        "pid": os.getpid(),
+        "startup_seconds": getattr(request.app.state, "startup_seconds", None),
+        "response_cache": response_cache.stats(),
+        "login_hash": hash_executor.stats(),
+    }
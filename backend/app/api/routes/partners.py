@@ -1,28 +1,50 @@
 ﻿from __future__ import annotations
 
-from typing import List, Optional
+from datetime import date
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
+from app.core.cache import response_cache
 from app.core.deps import get_current_user
 from app.db.deps import get_db
-from app.models import Partner
-from app.schemas.schemas import PartnerCreate, PartnerOut
+from app.models import Doc, Partner, PartnerSummary
+from app.schemas.schemas import (
+    PartnerCreate,
+    PartnerOut,
+    PartnerStatementDoc,
+    PartnerStatementOut,
+    PartnerSummaryOut,
+)
+from app.services.partner_summary import doc_amount
 
 router = APIRouter(prefix="/api/partners", tags=["partners"])
 
+_list_adapter = TypeAdapter(List[PartnerOut])
+
 
 @router.get("", response_model=List[PartnerOut])
-def list_partners(type: Optional[str] = None, q: Optional[str] = None, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    stmt = select(Partner)
-    if type:
-        stmt = stmt.where(Partner.type == type)
-    if q:
-        like = f"%{q}%"
-        stmt = stmt.where(Partner.name.like(like))
-    return list(db.execute(stmt).scalars().all())
+def list_partners(
+    request: Request,
+    type: Optional[str] = None,
+    q: Optional[str] = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    def build():
+        stmt = select(Partner)
+        if type:
+            stmt = stmt.where(Partner.type == type)
+        if q:
+            like = f"%{q}%"
+            stmt = stmt.where(Partner.name.like(like))
+        rows = db.execute(stmt).scalars().all()
+        return _list_adapter.dump_json(_list_adapter.validate_python(rows))
+
+    return response_cache.respond("partners", request, build)
 
 
 @router.post("", response_model=PartnerOut)
@@ -30,6 +52,7 @@ def create_partner(data: PartnerCreate, db: Session = Depends(get_db), user=Depe
     partner = Partner(**data.model_dump())
     db.add(partner)
     db.commit()
+    response_cache.bump("partners")
     db.refresh(partner)
     return partner
 
@@ -42,5 +65,89 @@ def update_partner(partner_id: int, data: PartnerCreate, db: Session = Depends(g
     for key, value in data.model_dump().items():
         setattr(partner, key, value)
     db.commit()
+    response_cache.bump("partners")
     db.refresh(partner)
     return partner
+
+
+@router.get("/summary", response_model=List[PartnerSummaryOut])
+def list_partner_summaries(
+    partner_id: Optional[int] = None,
+    doc_type: Optional[str] = None,
+    period_from: Optional[str] = Query(None, pattern=r"^\d{6}$"),
+    period_to: Optional[str] = Query(None, pattern=r"^\d{6}$"),
+    by_period: bool = False,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    # Read from partner_summaries (periods are YYYYMM); totals per partner and doc type unless by_period.
+    if by_period:
+        stmt = select(PartnerSummary).order_by(PartnerSummary.partner_id, PartnerSummary.doc_type, PartnerSummary.period)
+    else:
+        stmt = select(
+            PartnerSummary.partner_id,
+            PartnerSummary.doc_type,
+            func.sum(PartnerSummary.open_count).label("open_count"),
+            func.sum(PartnerSummary.open_amount).label("open_amount"),
+            func.sum(PartnerSummary.posted_count).label("posted_count"),
+            func.sum(PartnerSummary.posted_amount).label("posted_amount"),
+            func.max(PartnerSummary.last_biz_date).label("last_biz_date"),
+        ).group_by(PartnerSummary.partner_id, PartnerSummary.doc_type)
+    stmt = stmt.where(PartnerSummary.open_count + PartnerSummary.posted_count > 0)
+    if partner_id:
+        stmt = stmt.where(PartnerSummary.partner_id == partner_id)
+    if doc_type:
+        stmt = stmt.where(PartnerSummary.doc_type == doc_type)
+    if period_from:
+        stmt = stmt.where(PartnerSummary.period >= period_from)
+    if period_to:
+        stmt = stmt.where(PartnerSummary.period <= period_to)
+    if by_period:
+        return [PartnerSummaryOut.model_validate(row, from_attributes=True) for row in db.execute(stmt).scalars()]
+    return [PartnerSummaryOut(**row._mapping) for row in db.execute(stmt)]
+
+
+@router.get("/{partner_id}/statement", response_model=PartnerStatementOut)
+def get_partner_statement(
+    partner_id: int,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    doc_type: Optional[str] = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    # Docs of the partner in date order (ix_docs_partner_date) with line totals; VOID docs are listed
+    # but left out of the totals. Archived periods are only in the summary.
+    if db.get(Partner, partner_id) is None:
+        raise HTTPException(status_code=404, detail="Partner not found")
+    stmt = select(Doc.id, Doc.doc_no, Doc.doc_type, Doc.biz_date, Doc.status, doc_amount().label("amount")).where(
+        Doc.partner_id == partner_id
+    )
+    if date_from:
+        stmt = stmt.where(Doc.biz_date >= date_from)
+    if date_to:
+        stmt = stmt.where(Doc.biz_date <= date_to)
+    if doc_type:
+        stmt = stmt.where(Doc.doc_type == doc_type)
+    docs = [PartnerStatementDoc(**row._mapping) for row in db.execute(stmt.order_by(Doc.biz_date, Doc.id))]
+
+    totals: Dict[str, PartnerSummaryOut] = {}
+    for doc in docs:
+        if doc.status == "VOID":
+            continue
+        total = totals.setdefault(
+            doc.doc_type,
+            PartnerSummaryOut(
+                partner_id=partner_id, doc_type=doc.doc_type, open_count=0, open_amount=0, posted_count=0, posted_amount=0
+            ),
+        )
+        if doc.status == "POSTED":
+            total.posted_count += 1
+            total.posted_amount = round(total.posted_amount + doc.amount, 2)
+        else:
+            total.open_count += 1
+            total.open_amount = round(total.open_amount + doc.amount, 2)
+        total.last_biz_date = doc.biz_date
+    return PartnerStatementOut(
+        partner_id=partner_id, date_from=date_from, date_to=date_to, totals=list(totals.values()), docs=docs
+    )
@@ -0,0 +1,42 @@
+﻿from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.api.routes.jobs import job_accepted
+from app.core.deps import get_current_user
+from app.db.deps import get_db
+from app.models import ArchivePeriod, Doc, PeriodClose
+from app.schemas.schemas import JobOut, PeriodCloseIn, PeriodsOut
+from app.services.closing import closed_through
+from app.services.jobs import submit_job
+
+router = APIRouter(prefix="/api/periods", tags=["periods"])
+
+
+@router.get("", response_model=PeriodsOut)
+def list_periods(db: Session = Depends(get_db), user=Depends(get_current_user)):
+    return PeriodsOut(
+        closes=db.execute(select(PeriodClose).order_by(PeriodClose.cutoff)).scalars().all(),
+        archives=db.execute(select(ArchivePeriod).order_by(ArchivePeriod.period)).scalars().all(),
+    )
+
+
+@router.post("/close", response_model=JobOut, status_code=202)
+def close_period_endpoint(data: PeriodCloseIn, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    # Archives ledger and posted docs dated before cutoff; runs as a background job.
+    latest = closed_through(db)
+    # a close that failed part-way (status CLOSING) is resumed by submitting the same cutoff again
+    resuming = db.execute(
+        select(PeriodClose.id).where(PeriodClose.cutoff == data.cutoff, PeriodClose.status == "CLOSING")
+    ).first()
+    if latest is not None and data.cutoff <= latest and resuming is None:
+        raise HTTPException(status_code=400, detail=f"cutoff must be after {latest.isoformat()}")
+    open_docs = db.execute(
+        select(func.count(Doc.id)).where(Doc.status.in_(("DRAFT", "APPROVED")), Doc.biz_date < data.cutoff)
+    ).scalar_one()
+    if open_docs:
+        raise HTTPException(status_code=400, detail=f"{open_docs} unposted docs dated before cutoff")
+    job = submit_job(db, "close_period", {"cutoff": data.cutoff.isoformat(), "user_id": user.id}, user.id)
+    return job_accepted(job)
@@ -3,27 +3,36 @@
 from datetime import datetime, date
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pydantic import TypeAdapter
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from app.core.cache import response_cache
 from app.core.deps import get_current_user
 from app.db.deps import get_db
 from app.models import Product
 from app.schemas.schemas import ProductCreate, ProductOut
+from app.services.product_lookup import product_lookup
 
 router = APIRouter(prefix="/api/products", tags=["products"])
 
+_list_adapter = TypeAdapter(List[ProductOut])
+
 
 @router.get("", response_model=List[ProductOut])
-def list_products(q: Optional[str] = None, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    stmt = select(Product)
-    if q:
-        like = f"%{q}%"
-        stmt = stmt.where(
-            (Product.sku.like(like)) | (Product.name.like(like)) | (Product.model.like(like))
-        )
-    return list(db.execute(stmt).scalars().all())
+def list_products(request: Request, q: Optional[str] = None, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    def build():
+        stmt = select(Product)
+        if q:
+            like = f"%{q}%"
+            stmt = stmt.where(
+                (Product.sku.like(like)) | (Product.name.like(like)) | (Product.model.like(like))
+            )
+        rows = db.execute(stmt).scalars().all()
+        return _list_adapter.dump_json(_list_adapter.validate_python(rows))
+
+    return response_cache.respond("products", request, build)
 
 
 @router.post("", response_model=ProductOut)
@@ -31,7 +40,9 @@ def create_product(data: ProductCreate, db: Session = Depends(get_db), user=Depe
     product = Product(**data.model_dump())
     db.add(product)
     db.commit()
+    response_cache.bump("products")
     db.refresh(product)
+    product_lookup.put(product)
     return product
 
 
@@ -43,5 +54,7 @@ def update_product(product_id: int, data: ProductCreate, db: Session = Depends(g
     for key, value in data.model_dump().items():
         setattr(product, key, value)
     db.commit()
+    response_cache.bump("products")
     db.refresh(product)
+    product_lookup.put(product)
     return product
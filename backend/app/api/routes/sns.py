@@ -1,15 +1,23 @@
 ﻿from __future__ import annotations
 
+from datetime import date, timedelta
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, func, or_, select
 from sqlalchemy.orm import Session
 
+from app.api.routes.jobs import job_accepted
 from app.core.deps import get_current_user
+from app.core.fastjson import rows_response
 from app.db.deps import db_transaction, get_db
-from app.models import DocLine, Product, ProductSN, DocLineSN
-from app.schemas.schemas import SNOut
+from app.models import Doc, DocLine, ProductSN, DocLineSN, WarrantyExpiryBucket
+from app.schemas.schemas import ScanIn, ScanOut, SNOut, WarrantyBucketOut, WarrantySNOut
+from app.services.jobs import submit_job
+from app.services.product_lookup import product_lookup
+from app.services.projections import SN_COLUMNS
+from app.services.sn_link import SNError, link_sns, load_sn_line
+from app.services.warranty import rebuild_buckets
 
 router = APIRouter(prefix="/api", tags=["sns"])
 
@@ -23,7 +31,7 @@ def list_sns(
     db: Session = Depends(get_db),
     user=Depends(get_current_user),
 ):
-    stmt = select(ProductSN)
+    stmt = select(*SN_COLUMNS)
     if sn:
         stmt = stmt.where(ProductSN.sn == sn)
     if status:
@@ -32,43 +40,112 @@ def list_sns(
         stmt = stmt.where(ProductSN.warehouse_id == warehouse_id)
     if product_id:
         stmt = stmt.where(ProductSN.product_id == product_id)
-    return list(db.execute(stmt).scalars().all())
+    return rows_response(db.execute(stmt))
+
+
+def _warranty_window(date_from: Optional[date], date_to: Optional[date]):
+    date_from = date_from or date.today()
+    date_to = date_to or date_from + timedelta(days=30)
+    return date_from, date_to
+
+
+@router.get("/sns/warranty/expiring", response_model=List[WarrantySNOut])
+def list_expiring_sns(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    partner_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    after_date: Optional[date] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    date_from, date_to = _warranty_window(date_from, date_to)
+    stmt = (
+        select(ProductSN, Doc.partner_id)
+        .join(Doc, Doc.id == ProductSN.out_doc_id)
+        .where(ProductSN.warranty_end >= date_from, ProductSN.warranty_end <= date_to)
+    )
+    if partner_id:
+        stmt = stmt.where(Doc.partner_id == partner_id)
+    if product_id:
+        stmt = stmt.where(ProductSN.product_id == product_id)
+    # Keyset paging: pass the last row's warranty_end/id to fetch the next page.
+    if after_date and after_id:
+        stmt = stmt.where(
+            or_(
+                ProductSN.warranty_end > after_date,
+                and_(ProductSN.warranty_end == after_date, ProductSN.id > after_id),
+            )
+        )
+    stmt = stmt.order_by(ProductSN.warranty_end, ProductSN.id).limit(limit)
+    return [
+        WarrantySNOut(**SNOut.model_validate(sn).model_dump(), partner_id=pid)
+        for sn, pid in db.execute(stmt).all()
+    ]
+
+
+@router.get("/sns/warranty/buckets", response_model=List[WarrantyBucketOut])
+def list_warranty_buckets(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    partner_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    date_from, date_to = _warranty_window(date_from, date_to)
+    stmt = select(
+        WarrantyExpiryBucket.expiry_date,
+        WarrantyExpiryBucket.partner_id,
+        func.sum(WarrantyExpiryBucket.sn_count).label("sn_count"),
+    ).where(
+        WarrantyExpiryBucket.expiry_date >= date_from,
+        WarrantyExpiryBucket.expiry_date <= date_to,
+    )
+    if partner_id:
+        stmt = stmt.where(WarrantyExpiryBucket.partner_id == partner_id)
+    if product_id:
+        stmt = stmt.where(WarrantyExpiryBucket.product_id == product_id)
+    stmt = stmt.group_by(WarrantyExpiryBucket.expiry_date, WarrantyExpiryBucket.partner_id).order_by(
+        WarrantyExpiryBucket.expiry_date
+    )
+    return [
+        WarrantyBucketOut(expiry_date=row.expiry_date, partner_id=row.partner_id, sn_count=row.sn_count)
+        for row in db.execute(stmt).all()
+    ]
+
+
+@router.post("/sns/warranty/buckets/rebuild")
+def rebuild_warranty_buckets(db: Session = Depends(get_db), user=Depends(get_current_user)):
+    with db_transaction(db):
+        count = rebuild_buckets(db)
+    return {"ok": True, "buckets": count}
 
 
 @router.post("/docs/{doc_id}/lines/{line_id}/sns/import", response_model=List[SNOut])
-def import_sns(doc_id: int, line_id: int, body: dict, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def import_sns(
+    doc_id: int,
+    line_id: int,
+    body: dict,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+    background: bool = False,
+):
     sns = body.get("sns") or []
     if not isinstance(sns, list) or not sns:
         raise HTTPException(status_code=400, detail="sns required")
 
-    line = db.get(DocLine, line_id)
-    if line is None or line.doc_id != doc_id:
-        raise HTTPException(status_code=404, detail="Line not found")
-
-    product = db.get(Product, line.product_id)
-    if product is None or not product.track_sn:
-        raise HTTPException(status_code=400, detail="Product does not track SN")
-
-    created = []
-    with db_transaction(db):
-        for sn_code in sns:
-            existing = db.execute(select(ProductSN).where(ProductSN.sn == sn_code)).scalar_one_or_none()
-            if existing:
-                if existing.product_id != product.id:
-                    raise HTTPException(status_code=400, detail="SN product mismatch")
-                if existing.status not in ("LOCKED", "IN_STOCK"):
-                    raise HTTPException(status_code=400, detail="SN status invalid")
-                sn_obj = existing
-            else:
-                sn_obj = ProductSN(product_id=product.id, sn=sn_code, status="LOCKED")
-                db.add(sn_obj)
-                db.flush()
-            link = db.execute(
-                select(DocLineSN).where(DocLineSN.line_id == line_id, DocLineSN.sn_id == sn_obj.id)
-            ).scalar_one_or_none()
-            if link is None:
-                db.add(DocLineSN(doc_id=doc_id, line_id=line_id, sn_id=sn_obj.id))
-            created.append(sn_obj)
+    try:
+        if background:
+            load_sn_line(db, doc_id, line_id)
+            job = submit_job(db, "import_sns", {"doc_id": doc_id, "line_id": line_id, "sns": sns}, user.id)
+            return job_accepted(job)
+        with db_transaction(db):
+            created = link_sns(db, doc_id, line_id, sns)
+    except SNError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
     return created
 
 
@@ -82,6 +159,41 @@ def scan_sn(doc_id: int, line_id: int, body: dict, db: Session = Depends(get_db)
     return result[0]
 
 
+@router.post("/docs/{doc_id}/scan", response_model=ScanOut)
+def scan_code(doc_id: int, data: ScanIn, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    # Handheld flow: code is a product barcode or SKU; the first line of that product that still
+    # lacks serials takes the scan. Without sn only the line is resolved.
+    product = product_lookup.resolve(db, data.code)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Unknown barcode")
+
+    linked = (
+        select(func.count(DocLineSN.id))
+        .where(DocLineSN.line_id == DocLine.id)
+        .correlate(DocLine)
+        .scalar_subquery()
+    )
+    lines = db.execute(
+        select(DocLine.id, DocLine.line_no, DocLine.qty, linked.label("linked"))
+        .where(DocLine.doc_id == doc_id, DocLine.product_id == product.id)
+        .order_by(DocLine.line_no)
+    ).all()
+    if not lines:
+        raise HTTPException(status_code=404, detail="Product not on doc")
+    line = next((row for row in lines if not product.track_sn or row.linked < row.qty), None)
+    if line is None:
+        raise HTTPException(status_code=400, detail="All lines for this product have their SNs")
+
+    result = ScanOut(product_id=product.id, line_id=line.id, line_no=line.line_no)
+    if data.sn:
+        try:
+            with db_transaction(db):
+                result.sn = SNOut.model_validate(link_sns(db, doc_id, line.id, [data.sn])[0])
+        except SNError as exc:
+            raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    return result
+
+
 @router.delete("/docs/{doc_id}/lines/{line_id}/sns/{sn_id}")
 def delete_sn_link(
     doc_id: int,
@@ -1,15 +1,28 @@
 ﻿from __future__ import annotations
 
+from datetime import date
+from itertools import chain
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.core.deps import get_current_user
-from app.db.deps import get_db
-from app.models import StockBalance, StockLedger, Product
-from app.schemas.schemas import StockBalanceOut, StockLedgerOut
+from app.core.fastjson import json_response, rows_response, rows_to_json
+from app.db.deps import db_transaction, get_db
+from app.models import StockAlert, StockBalance, StockLedger, StockThreshold, Product
+from app.schemas.schemas import (
+    StockAlertOut,
+    StockBalanceOut,
+    StockLedgerOut,
+    StockMatrixOut,
+    StockThresholdIn,
+    StockThresholdOut,
+)
+from app.services.projections import BALANCE_COLUMNS, LEDGER_COLUMNS
+from app.services.stock_alerts import delete_threshold, set_threshold, suggested_qty
+from app.services.stock_matrix import stock_matrix
 
 router = APIRouter(prefix="/api/stock", tags=["stock"])
 
@@ -21,7 +34,8 @@ def list_balances(
     db: Session = Depends(get_db),
     user=Depends(get_current_user),
 ):
-    stmt = select(StockBalance)
+    # Rows are encoded straight to JSON; the response_model only documents the shape.
+    stmt = select(*BALANCE_COLUMNS)
     if warehouse_id:
         stmt = stmt.where(StockBalance.warehouse_id == warehouse_id)
     if q:
@@ -29,19 +43,106 @@ def list_balances(
         stmt = stmt.join(Product, Product.id == StockBalance.product_id).where(
             (Product.sku.like(like)) | (Product.name.like(like)) | (Product.model.like(like))
         )
-    return list(db.execute(stmt).scalars().all())
+    return rows_response(db.execute(stmt))
+
+
+@router.get("/matrix", response_model=StockMatrixOut)
+def get_stock_matrix(
+    warehouse_id: Optional[List[int]] = Query(None),
+    q: Optional[str] = None,
+    in_stock: bool = False,
+    after_id: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=50000),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    # Repeat warehouse_id to pick columns (default: all warehouses); page with after_id=next_after_id.
+    return json_response(stock_matrix(db, warehouse_id, q, in_stock, after_id, limit))
 
 
 @router.get("/ledger", response_model=List[StockLedgerOut])
 def list_ledger(
     warehouse_id: Optional[int] = None,
     product_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
     db: Session = Depends(get_db),
     user=Depends(get_current_user),
 ):
-    stmt = select(StockLedger)
+    stmt = select(*LEDGER_COLUMNS)
     if warehouse_id:
         stmt = stmt.where(StockLedger.warehouse_id == warehouse_id)
     if product_id:
         stmt = stmt.where(StockLedger.product_id == product_id)
+    if date_from:
+        stmt = stmt.where(StockLedger.biz_date >= date_from)
+    if date_to:
+        stmt = stmt.where(StockLedger.biz_date <= date_to)
+    # closed periods are read from the archive files, oldest first; imported on first use
+    from app.services.archive import iter_ledger_results
+
+    rows = chain.from_iterable(iter_ledger_results(db, stmt, date_from, date_to))
+    return Response(content=rows_to_json(list(stmt.selected_columns.keys()), rows), media_type="application/json")
+
+
+@router.get("/alerts", response_model=List[StockAlertOut])
+def list_alerts(
+    warehouse_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    stmt = select(StockAlert)
+    if warehouse_id:
+        stmt = stmt.where(StockAlert.warehouse_id == warehouse_id)
+    if product_id:
+        stmt = stmt.where(StockAlert.product_id == product_id)
+    return [
+        StockAlertOut(
+            warehouse_id=alert.warehouse_id,
+            product_id=alert.product_id,
+            qty_on_hand=alert.qty_on_hand,
+            min_qty=alert.min_qty,
+            max_qty=alert.max_qty,
+            suggested_qty=suggested_qty(alert),
+            updated_at=alert.updated_at,
+        )
+        for alert in db.execute(stmt).scalars().all()
+    ]
+
+
+@router.get("/thresholds", response_model=List[StockThresholdOut])
+def list_thresholds(
+    warehouse_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    stmt = select(StockThreshold)
+    if warehouse_id:
+        stmt = stmt.where(StockThreshold.warehouse_id == warehouse_id)
+    if product_id:
+        stmt = stmt.where(StockThreshold.product_id == product_id)
     return list(db.execute(stmt).scalars().all())
+
+
+@router.put("/thresholds", response_model=List[StockThresholdOut])
+def put_thresholds(data: List[StockThresholdIn], db: Session = Depends(get_db), user=Depends(get_current_user)):
+    for item in data:
+        if item.max_qty is not None and item.max_qty < item.min_qty:
+            raise HTTPException(status_code=400, detail="max_qty must be >= min_qty")
+    with db_transaction(db):
+        thresholds = [
+            set_threshold(db, item.warehouse_id, item.product_id, item.min_qty, item.max_qty)
+            for item in data
+        ]
+    return thresholds
+
+
+@router.delete("/thresholds/{warehouse_id}/{product_id}")
+def remove_threshold(warehouse_id: int, product_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    with db_transaction(db):
+        found = delete_threshold(db, warehouse_id, product_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="Threshold not found")
+    return {"ok": True}
@@ -0,0 +1,82 @@
+﻿from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.api.routes.docs import doc_no_conflicts
+from app.core.deps import get_current_user
+from app.core.fastjson import rows_response
+from app.db.deps import db_transaction, get_db
+from app.schemas.schemas import StocktakeCountsIn, StocktakeCreate, StocktakeOut, StocktakeSNsIn
+from app.services.doc_numbers import doc_numbers
+from app.services.stocktake import (
+    STOCKTAKE,
+    StocktakeError,
+    create_stocktake,
+    get_stocktake,
+    record_counts,
+    record_sns,
+    stocktake_summary,
+    variance_stmt,
+)
+
+router = APIRouter(prefix="/api/stocktakes", tags=["stocktakes"])
+
+
+@router.post("", response_model=StocktakeOut)
+def create_stocktake_endpoint(data: StocktakeCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    # Snapshots the warehouse's balances and in-stock serials; post with POST /api/docs/{id}/post.
+    doc_no = data.doc_no or doc_numbers.next(STOCKTAKE, data.biz_date)
+    try:
+        with doc_no_conflicts(), db_transaction(db):
+            doc = create_stocktake(db, data.warehouse_id, data.biz_date, doc_no, data.remark, user.id)
+        return stocktake_summary(db, doc.id)
+    except StocktakeError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+
+
+@router.get("/{doc_id}", response_model=StocktakeOut)
+def get_stocktake_endpoint(doc_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    try:
+        return stocktake_summary(db, doc_id)
+    except StocktakeError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+
+
+@router.post("/{doc_id}/counts", response_model=StocktakeOut)
+def record_counts_endpoint(
+    doc_id: int,
+    data: StocktakeCountsIn,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    try:
+        with db_transaction(db):
+            record_counts(db, doc_id, [(item.product_id, item.qty) for item in data.items], data.accumulate)
+        return stocktake_summary(db, doc_id)
+    except StocktakeError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+
+
+@router.post("/{doc_id}/sns", response_model=StocktakeOut)
+def record_sns_endpoint(doc_id: int, data: StocktakeSNsIn, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    try:
+        with db_transaction(db):
+            record_sns(db, doc_id, data.sns, data.product_id)
+        return stocktake_summary(db, doc_id)
+    except StocktakeError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+
+
+@router.get("/{doc_id}/variance")
+def get_variance(doc_id: int, all: bool = False, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    # Only products with a difference (quantity or serials) unless all=true.
+    try:
+        get_stocktake(db, doc_id)
+    except StocktakeError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    stmt = variance_stmt(doc_id)
+    if not all:
+        columns = stmt.selected_columns
+        stmt = stmt.where((columns.diff_qty != 0) | (columns.sn_missing > 0) | (columns.sn_found > 0))
+    return rows_response(db.execute(stmt))
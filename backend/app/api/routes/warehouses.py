@@ -2,10 +2,12 @@
 
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from app.core.cache import response_cache
 from app.core.deps import get_current_user
 from app.db.deps import get_db
 from app.models import Warehouse
@@ -13,10 +15,16 @@ from app.schemas.schemas import WarehouseCreate, WarehouseOut
 
 router = APIRouter(prefix="/api/warehouses", tags=["warehouses"])
 
+_list_adapter = TypeAdapter(List[WarehouseOut])
+
 
 @router.get("", response_model=List[WarehouseOut])
-def list_warehouses(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    return list(db.execute(select(Warehouse)).scalars().all())
+def list_warehouses(request: Request, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    def build():
+        rows = db.execute(select(Warehouse)).scalars().all()
+        return _list_adapter.dump_json(_list_adapter.validate_python(rows))
+
+    return response_cache.respond("warehouses", request, build)
 
 
 @router.post("", response_model=WarehouseOut)
@@ -24,5 +32,6 @@ def create_warehouse(data: WarehouseCreate, db: Session = Depends(get_db), user=
     wh = Warehouse(**data.model_dump())
     db.add(wh)
     db.commit()
+    response_cache.bump("warehouses")
     db.refresh(wh)
     return wh
@@ -0,0 +1,105 @@
+﻿from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from app.db.session import engine
+from app.models import CacheGeneration
+
+MAX_ENTRIES = 512
+
+
+@dataclass
+class CachedBody:
+    generation: int
+    body: bytes
+    etag: str
+
+
+# Serialized JSON responses per (namespace, path, query); bumping a namespace generation invalidates them.
+# With shared=True the generations live in the cache_generations table, so a write handled by one
+# worker process invalidates the entries held by every other worker (one PK read per request). The app
+# always runs shared: how many workers uvicorn started is not visible from inside a worker.
+class ResponseCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, shared: bool = False):
+        self.max_entries = max_entries
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._generations: Dict[str, int] = defaultdict(int)
+        self._entries: "OrderedDict[tuple, CachedBody]" = OrderedDict()
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0, "not_modified": 0})
+
+    def bump(self, namespace: str):
+        if self.shared:
+            table = CacheGeneration.__table__
+            with engine.begin() as conn:
+                generation = conn.execute(
+                    insert(table)
+                    .values(namespace=namespace, generation=1)
+                    .on_conflict_do_update(
+                        index_elements=[table.c.namespace], set_={"generation": table.c.generation + 1}
+                    )
+                    .returning(table.c.generation)
+                ).scalar_one()
+            with self._lock:
+                self._generations[namespace] = max(self._generations[namespace], generation)
+            return
+        with self._lock:
+            self._generations[namespace] += 1
+
+    def _shared_generation(self, namespace: str) -> int:
+        with engine.connect() as conn:
+            generation = conn.execute(
+                select(CacheGeneration.generation).where(CacheGeneration.namespace == namespace)
+            ).scalar()
+        generation = generation or 0
+        with self._lock:
+            self._generations[namespace] = generation
+        return generation
+
+    def respond(self, namespace: str, request: Request, build: Callable[[], bytes]) -> Response:
+        key = (namespace, request.url.path, tuple(sorted(request.query_params.multi_items())))
+        shared_generation = self._shared_generation(namespace) if self.shared else None
+        with self._lock:
+            generation = self._generations[namespace] if shared_generation is None else shared_generation
+            entry = self._entries.get(key)
+            if entry is not None and entry.generation == generation:
+                self._entries.move_to_end(key)
+                self._stats[namespace]["hits"] += 1
+            else:
+                entry = None
+                self._stats[namespace]["misses"] += 1
+
+        if entry is None:
+            # generation is read before building, so a write racing the query leaves a stale, never-hit entry
+            body = build()
+            etag = f'"{namespace}-{generation}-{hashlib.sha1(body).hexdigest()[:16]}"'
+            entry = CachedBody(generation=generation, body=body, etag=etag)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        if request.headers.get("if-none-match") == entry.etag:
+            with self._lock:
+                self._stats[namespace]["not_modified"] += 1
+            return Response(status_code=304, headers={"ETag": entry.etag})
+        return Response(content=entry.body, media_type="application/json", headers={"ETag": entry.etag})
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                namespace: {**counters, "generation": self._generations[namespace]}
+                for namespace, counters in self._stats.items()
+            }
+
+
+response_cache = ResponseCache(shared=True)
@@ -1,15 +1,43 @@
 ﻿from __future__ import annotations
 
+import os
 from pathlib import Path
 
-BASE_DIR = Path(__file__).resolve().parents[3]
-DATA_DIR = BASE_DIR / "data"
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+BASE_DIR = BACKEND_DIR.parent
+# JXC_DATA_DIR points a process at another data directory (scripts/check_workers.py runs on a temp copy)
+DATA_DIR = Path(os.environ.get("JXC_DATA_DIR", BASE_DIR / "data"))
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH = DATA_DIR / "app.db"
+ARCHIVE_DIR = DATA_DIR / "archive"
 
 DATABASE_URL = f"sqlite+pysqlite:///{DB_PATH.as_posix()}"
 
 JWT_SECRET_KEY = "change-me"
 JWT_ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 8
+ACCESS_TOKEN_EXPIRE_MINUTES = 15
 REFRESH_TOKEN_EXPIRE_MINUTES = 60 * 24 * 30
+# how often each process reloads revoked token families (other workers' logouts become visible within this)
+TOKEN_REVOCATION_SYNC_SECONDS = 5
+# how often each process checks whether another worker changed products (scanner barcode table)
+PRODUCT_LOOKUP_SYNC_SECONDS = 5
+
+# pbkdf2_sha256 cost for new hashes; stored hashes with another cost are rehashed on next login
+PASSWORD_HASH_ROUNDS = int(os.environ.get("PASSWORD_HASH_ROUNDS", "29000"))
+# login hashing runs on its own pool; beyond workers + queue limit, logins get 503 instead of waiting
+LOGIN_HASH_WORKERS = 2
+LOGIN_HASH_QUEUE_LIMIT = 16
+# token buckets: (burst capacity, tokens refilled per second)
+LOGIN_RATE_PER_USERNAME = (5, 5 / 60)
+# per client address; behind a reverse proxy uvicorn must trust the proxy's X-Forwarded-For (README 9.1),
+# otherwise every login shares the proxy's bucket. LOGIN_RATE_PER_IP=off disables it.
+LOGIN_RATE_PER_IP = None if os.environ.get("LOGIN_RATE_PER_IP", "").lower() == "off" else (20, 1.0)
+
+JOB_THREAD_WORKERS = 2
+JOB_PROCESS_WORKERS = 2
+JOB_LEASE_SECONDS = 300
+# a running job renews its lease this often, independent of progress reports
+JOB_HEARTBEAT_SECONDS = 60
+
+# doc numbers reserved per round trip to doc_sequences; unused ones are skipped on restart
+DOC_NO_BLOCK_SIZE = 50
@@ -1,28 +1,49 @@
 ﻿from __future__ import annotations
 
 from datetime import datetime
+from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jose import JWTError
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.core.config import JWT_ALGORITHM, JWT_SECRET_KEY
+from app.core.security import decode_token
+from app.core.tokens import revoked_families
 from app.db.deps import get_db
 from app.models import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    return _user_from_token(db, token)
+
+
+def get_stream_user(
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+    token: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+) -> User:
+    # EventSource cannot send headers, so streams also accept ?token=
+    if not (header_token or token):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    return _user_from_token(db, header_token or token)
+
+
+def _user_from_token(db: Session, token: str) -> User:
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        payload = decode_token(token)
         username: str | None = payload.get("sub")
-        if not username:
+        if not username or payload.get("typ") != "access":
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    # in-memory check, see RevokedFamilies
+    if revoked_families.is_revoked(payload.get("fam", "")):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
 
     stmt = select(User).where(User.username == username)
     user = db.execute(stmt).scalar_one_or_none()
@@ -0,0 +1,50 @@
+﻿from __future__ import annotations
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, Sequence
+
+from fastapi import Response
+from sqlalchemy import Float, Integer, String, case, type_coerce
+
+from app.db.types import SCALE, Hundredths
+
+
+def json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+_encoder = json.JSONEncoder(default=json_default, separators=(",", ":"), ensure_ascii=False)
+
+
+def rows_to_json(keys: Sequence[str], rows: Iterable[Sequence]) -> bytes:
+    return _encoder.encode([dict(zip(keys, row)) for row in rows]).encode()
+
+
+def json_response(payload) -> Response:
+    return Response(content=_encoder.encode(payload).encode(), media_type="application/json")
+
+
+def rows_response(result) -> Response:
+    # result: a Core Result from a column projection; labels become the JSON keys
+    return Response(content=rows_to_json(list(result.keys()), result), media_type="application/json")
+
+
+# Projection helpers: skip SQLAlchemy's Date/Numeric result processing, the JSON output is the same.
+def raw_date(column):
+    return type_coerce(column, String).label(column.key)
+
+
+def raw_number(column):
+    if isinstance(column.type, Hundredths):
+        # scaled in SQL; whole quantities stay integers, as they were when stored as NUMERIC
+        stored = type_coerce(column, Integer)
+        return type_coerce(case((stored % SCALE == 0, stored // SCALE), else_=stored / float(SCALE)), Float).label(
+            column.key
+        )
+    return type_coerce(column, Float).label(column.key)
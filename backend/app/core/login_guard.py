@@ -0,0 +1,101 @@
+﻿from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Tuple, TypeVar
+
+from app.core.config import (
+    LOGIN_HASH_QUEUE_LIMIT,
+    LOGIN_HASH_WORKERS,
+    LOGIN_RATE_PER_IP,
+    LOGIN_RATE_PER_USERNAME,
+)
+
+T = TypeVar("T")
+
+MAX_BUCKETS = 10000
+LATENCY_SAMPLES = 500
+
+
+class LoginBusy(Exception):
+    pass
+
+
+class RateLimiter:
+    # In-memory token buckets keyed by e.g. username or client IP (per process).
+    def __init__(self, capacity: float, refill_per_second: float, max_keys: int = MAX_BUCKETS):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, key: str) -> float:
+        # Returns 0 when allowed, otherwise the seconds until a token is available.
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - stamp) * self.refill_per_second)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.refill_per_second
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0.0
+
+    def _prune(self, now: float):
+        # Buckets that have refilled completely carry no state worth keeping.
+        full_after = self.capacity / self.refill_per_second
+        for key, (_, stamp) in list(self._buckets.items()):
+            if now - stamp >= full_after:
+                del self._buckets[key]
+
+
+class HashExecutor:
+    # Bounded pool for password hashing, so login bursts cannot occupy the request threads.
+    def __init__(self, workers: int = LOGIN_HASH_WORKERS, queue_limit: int = LOGIN_HASH_QUEUE_LIMIT):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="login-hash")
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._lock = threading.Lock()
+        self._samples: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._count = 0
+        self._rejected = 0
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise LoginBusy("too many logins in progress")
+        try:
+            return await asyncio.wrap_future(self._pool.submit(self._timed, fn, *args))
+        finally:
+            self._slots.release()
+
+    def _timed(self, fn: Callable[..., T], *args) -> T:
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._count += 1
+                self._samples.append(elapsed)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count, rejected = self._count, self._rejected
+
+        def pct(p: float) -> float:
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2) if samples else 0.0
+
+        return {"count": count, "rejected": rejected, "p50_ms": pct(0.5), "p95_ms": pct(0.95), "max_ms": pct(1.0)}
+
+
+username_limiter = RateLimiter(*LOGIN_RATE_PER_USERNAME)
+ip_limiter = RateLimiter(*LOGIN_RATE_PER_IP) if LOGIN_RATE_PER_IP else None
+hash_executor = HashExecutor()
@@ -1,7 +1,7 @@
 ﻿from __future__ import annotations
 
 from datetime import datetime, timedelta
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
 
 from jose import jwt
 from passlib.context import CryptContext
@@ -10,10 +10,15 @@ from app.core.config import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     JWT_ALGORITHM,
     JWT_SECRET_KEY,
+    PASSWORD_HASH_ROUNDS,
     REFRESH_TOKEN_EXPIRE_MINUTES,
 )
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__rounds=PASSWORD_HASH_ROUNDS,
+)
 
 
 def hash_password(password: str) -> str:
@@ -24,15 +29,25 @@ def verify_password(password: str, password_hash: str) -> bool:
     return pwd_context.verify(password, password_hash)
 
 
-def create_token(subject: str, expires_minutes: int) -> str:
+def verify_and_update(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    # (valid, new hash when the stored one uses an outdated cost)
+    return pwd_context.verify_and_update(password, password_hash)
+
+
+def create_token(subject: str, expires_minutes: int, **claims: Any) -> str:
     expire = datetime.utcnow() + timedelta(minutes=expires_minutes)
-    payload: Dict[str, Any] = {"sub": subject, "exp": expire}
+    payload: Dict[str, Any] = {"sub": subject, "exp": expire, **claims}
     return jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
-def create_access_token(subject: str) -> str:
-    return create_token(subject, ACCESS_TOKEN_EXPIRE_MINUTES)
+def create_access_token(subject: str, family_id: str) -> str:
+    return create_token(subject, ACCESS_TOKEN_EXPIRE_MINUTES, fam=family_id, typ="access")
+
+
+def create_refresh_token(subject: str, family_id: str, jti: str) -> str:
+    return create_token(subject, REFRESH_TOKEN_EXPIRE_MINUTES, fam=family_id, jti=jti, typ="refresh")
 
 
-def create_refresh_token(subject: str) -> str:
-    return create_token(subject, REFRESH_TOKEN_EXPIRE_MINUTES)
+def decode_token(token: str) -> Dict[str, Any]:
+    # raises jose.JWTError on a bad signature or an expired token
+    return jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
@@ -0,0 +1,151 @@
+﻿from __future__ import annotations
+
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from jose import JWTError
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import ACCESS_TOKEN_EXPIRE_MINUTES, TOKEN_REVOCATION_SYNC_SECONDS
+from app.core.security import create_access_token, create_refresh_token, decode_token
+from app.db.session import engine
+from app.models import TokenFamily, User
+
+
+class TokenError(Exception):
+    pass
+
+
+class RevokedFamilies:
+    # Process-local view of revoked token families, checked on every request without a query.
+    # Revocations made by other worker processes are picked up by a periodic incremental reload keyed on
+    # revoked_seq, which follows commit order; revoked_at is stamped before the writer gets the lock, so
+    # a late commit can carry an earlier time than one already loaded.
+    # Entries older than the access-token lifetime are dropped: their access tokens have expired.
+    def __init__(self, sync_seconds: float = TOKEN_REVOCATION_SYNC_SECONDS):
+        self.sync_seconds = sync_seconds
+        self._lock = threading.Lock()
+        self._revoked: Dict[str, datetime] = {}
+        self._synced_at = float("-inf")
+        self._seq: Optional[int] = None
+
+    def add(self, family_id: str, revoked_at: datetime):
+        with self._lock:
+            self._revoked[family_id] = revoked_at
+
+    def is_revoked(self, family_id: str) -> bool:
+        if time.monotonic() - self._synced_at >= self.sync_seconds:
+            self._sync()
+        return family_id in self._revoked
+
+    def _sync(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._synced_at < self.sync_seconds:
+                return
+            horizon = datetime.utcnow() - timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+            with engine.connect() as conn:
+                if self._seq is None:
+                    # first load: the high-water mark first, so a revocation committed in between is
+                    # picked up by the next incremental read
+                    seq = conn.execute(select(func.max(TokenFamily.revoked_seq))).scalar() or 0
+                    rows = conn.execute(
+                        select(TokenFamily.id, TokenFamily.revoked_at).where(TokenFamily.revoked_at >= horizon)
+                    ).all()
+                else:
+                    seq = self._seq
+                    rows = conn.execute(
+                        select(TokenFamily.id, TokenFamily.revoked_at, TokenFamily.revoked_seq)
+                        .where(TokenFamily.revoked_seq > self._seq)
+                        .order_by(TokenFamily.revoked_seq)
+                    ).all()
+                    if rows:
+                        seq = rows[-1].revoked_seq
+            for family_id, revoked_at, *_ in rows:
+                self._revoked[family_id] = revoked_at
+            self._seq = seq
+            for family_id, revoked_at in list(self._revoked.items()):
+                if revoked_at < horizon:
+                    del self._revoked[family_id]
+            self._synced_at = now
+
+    def __len__(self):
+        return len(self._revoked)
+
+
+revoked_families = RevokedFamilies()
+
+
+def issue_tokens(db: Session, user: User) -> Tuple[str, str]:
+    # New family per login; returns (access_token, refresh_token).
+    family_id, jti = uuid.uuid4().hex, uuid.uuid4().hex
+    db.add(TokenFamily(id=family_id, user_id=user.id, current_jti=jti, created_at=datetime.utcnow()))
+    db.commit()
+    return (
+        create_access_token(user.username, family_id),
+        create_refresh_token(user.username, family_id, jti),
+    )
+
+
+def revoke_family(db: Session, family_id: str, reason: str):
+    now = datetime.utcnow()
+    db.execute(
+        update(TokenFamily)
+        .where(TokenFamily.id == family_id, TokenFamily.revoked_at.is_(None))
+        .values(
+            revoked_at=now,
+            revoke_reason=reason,
+            # evaluated by the UPDATE itself, i.e. while holding the write lock
+            revoked_seq=select(func.coalesce(func.max(TokenFamily.revoked_seq), 0) + 1).scalar_subquery(),
+        )
+    )
+    db.commit()
+    revoked_families.add(family_id, now)
+
+
+def _refresh_claims(refresh_token: str) -> Tuple[str, str]:
+    try:
+        payload = decode_token(refresh_token)
+    except JWTError:
+        raise TokenError("Invalid refresh token")
+    family_id, jti = payload.get("fam"), payload.get("jti")
+    if payload.get("typ") != "refresh" or not family_id or not jti:
+        raise TokenError("Invalid refresh token")
+    return family_id, jti
+
+
+def revoke_refresh_token(db: Session, refresh_token: str):
+    family_id, _ = _refresh_claims(refresh_token)
+    revoke_family(db, family_id, "logout")
+
+
+def rotate_refresh_token(db: Session, refresh_token: str) -> Tuple[str, str]:
+    family_id, jti = _refresh_claims(refresh_token)
+
+    family = db.get(TokenFamily, family_id)
+    if family is None or family.revoked_at is not None:
+        raise TokenError("Refresh token revoked")
+    user = db.get(User, family.user_id)
+    if user is None or not user.is_active:
+        raise TokenError("Inactive user")
+
+    # Compare-and-swap on current_jti: only the newest refresh token of a family can be used, once.
+    new_jti = uuid.uuid4().hex
+    rotated = db.execute(
+        update(TokenFamily)
+        .where(TokenFamily.id == family_id, TokenFamily.current_jti == jti, TokenFamily.revoked_at.is_(None))
+        .values(current_jti=new_jti, refreshed_at=datetime.utcnow())
+    ).rowcount
+    db.commit()
+    if not rotated:
+        # an already-rotated token came back: assume it leaked and end the whole session
+        revoke_family(db, family_id, "reuse")
+        raise TokenError("Refresh token reuse detected")
+    return (
+        create_access_token(user.username, family_id),
+        create_refresh_token(user.username, family_id, new_jti),
+    )
@@ -0,0 +1,37 @@
+﻿from __future__ import annotations
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from sqlalchemy import Integer
+from sqlalchemy.types import TypeDecorator
+
+SCALE = 100
+
+
+def to_hundredths(value) -> int:
+    if isinstance(value, int):
+        return value * SCALE
+    if not isinstance(value, Decimal):
+        # floats from the API: go through their shortest repr, not their binary expansion
+        value = Decimal(str(value))
+    return int((value * SCALE).to_integral_value(ROUND_HALF_UP))
+
+
+def from_hundredths(value) -> Decimal:
+    return Decimal(int(value)).scaleb(-2)
+
+
+class Hundredths(TypeDecorator):
+    # Quantities and amounts: Decimal with two places in Python, an INTEGER count of hundredths
+    # in SQLite, so balances, ledger sums and comparisons are exact integer arithmetic.
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_hundredths(value)
+
+    def process_literal_param(self, value, dialect):
+        return "NULL" if value is None else str(to_hundredths(value))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_hundredths(value)
@@ -1,5 +1,10 @@
 ﻿from __future__ import annotations
 
+import time
+
+_import_started = time.perf_counter()
+
+import logging
 from pathlib import Path
 
 from fastapi import FastAPI
@@ -7,12 +12,13 @@ from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from app.api.routes import auth, products, partners, warehouses, docs, stock, sns
-from app.core.security import hash_password
+from app.api.routes import auth, products, partners, warehouses, docs, stock, sns, events, metrics, jobs, exports, periods, stocktakes
 from app.core.config import BASE_DIR
-from app.db.base import Base
 from app.db.session import engine
-from app.models import User
+from app.services.jobs import job_runner
+
+# uvicorn configures this logger, so the startup timing shows up in its output
+logger = logging.getLogger("uvicorn.error")
 
 
 def create_app() -> FastAPI:
@@ -32,6 +38,12 @@ def create_app() -> FastAPI:
     app.include_router(docs.router)
     app.include_router(stock.router)
     app.include_router(sns.router)
+    app.include_router(events.router)
+    app.include_router(metrics.router)
+    app.include_router(jobs.router)
+    app.include_router(exports.router)
+    app.include_router(periods.router)
+    app.include_router(stocktakes.router)
 
     dist_path = BASE_DIR / "frontend" / "dist"
     web_path = Path(__file__).resolve().parent / "web"
@@ -47,28 +59,17 @@ def create_app() -> FastAPI:
 
     @app.on_event("startup")
     def on_startup():
-        Base.metadata.create_all(bind=engine)
-        with engine.begin() as conn:
-            admin = conn.execute(
-                User.__table__.select().where(User.__table__.c.username == "admin")
-            ).fetchone()
-            if admin is None:
-                conn.execute(
-                    User.__table__.insert().values(
-                        username="admin",
-                        password_hash=hash_password("admin123"),
-                        role="admin",
-                        is_active=True,
-                    )
-                )
-            else:
-                # Auto-migrate legacy bcrypt hash to pbkdf2 to avoid bcrypt backend issues.
-                if str(admin.password_hash).startswith(("$2a$", "$2b$", "$2y$")):
-                    conn.execute(
-                        User.__table__.update()
-                        .where(User.__table__.c.username == "admin")
-                        .values(password_hash=hash_password("admin123"))
-                    )
+        # Schema and admin bootstrap run once via `python -m app.manage migrate`, not in every worker.
+        with engine.connect() as conn:
+            if not engine.dialect.has_table(conn, "alembic_version"):
+                raise RuntimeError("database not initialized, run: python -m app.manage migrate")
+        job_runner.start()
+        app.state.startup_seconds = round(time.perf_counter() - _import_started, 3)
+        logger.info("worker ready in %.3fs", app.state.startup_seconds)
+
+    @app.on_event("shutdown")
+    def on_shutdown():
+        job_runner.shutdown()
 
     return app
 
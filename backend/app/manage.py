@@ -0,0 +1,130 @@
+﻿from __future__ import annotations
+
+# One-time deployment steps, run once before starting any worker:
+#
+#   cd backend && python -m app.manage migrate
+
+import argparse
+import logging
+
+from app.core.config import BACKEND_DIR
+
+logger = logging.getLogger("app.manage")
+
+
+def _alembic_config():
+    from alembic.config import Config
+
+    cfg = Config(str(BACKEND_DIR / "alembic.ini"))
+    cfg.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    return cfg
+
+
+def _run(cfg, engine, alembic_command, revision):
+    # runs an alembic command against engine's database rather than the configured one
+    with engine.connect() as conn:
+        cfg.attributes["connection"] = conn
+        try:
+            alembic_command(cfg, revision)
+        finally:
+            del cfg.attributes["connection"]
+
+
+# the schema the old create_all-at-startup code left behind corresponds to the first revision
+LEGACY_REVISION = "0001"
+
+
+def _adopt_legacy(cfg, engine):
+    # A database created by the old create_all-at-startup code: builds revision 0001 in a scratch
+    # database, adds the tables and indexes the legacy one lacks, and stamps it at 0001 so every
+    # later migration (new columns, the hundredths conversion) runs on it as usual.
+    from alembic import command
+    from sqlalchemy import create_engine, inspect
+
+    scratch = create_engine("sqlite://")
+    _run(cfg, scratch, command.upgrade, LEGACY_REVISION)
+    with scratch.connect() as conn:
+        baseline = conn.exec_driver_sql(
+            "SELECT type, name, sql FROM sqlite_master"
+            " WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite%' AND name != 'alembic_version'"
+        ).all()
+        baseline_columns = {
+            name: {column["name"] for column in inspect(conn).get_columns(name)}
+            for kind, name, _ in baseline
+            if kind == "table"
+        }
+    scratch.dispose()
+
+    existing = inspect(engine)
+    tables = set(existing.get_table_names())
+    for table, columns in baseline_columns.items():
+        if table in tables:
+            missing = columns - {column["name"] for column in existing.get_columns(table)}
+            if missing:
+                raise RuntimeError(f"cannot adopt database: {table} lacks columns {sorted(missing)}")
+    indexes = {index["name"] for table in tables for index in existing.get_indexes(table)}
+    with engine.begin() as conn:
+        for kind, name, sql in baseline:
+            if (kind == "table" and name not in tables) or (kind == "index" and name not in indexes):
+                conn.exec_driver_sql(sql)
+    _run(cfg, engine, command.stamp, LEGACY_REVISION)
+
+
+def migrate(engine=None):
+    from alembic import command
+    from sqlalchemy import inspect
+
+    if engine is None:
+        from app.db.session import engine
+
+    cfg = _alembic_config()
+    tables = set(inspect(engine).get_table_names())
+    if "docs" in tables and "alembic_version" not in tables:
+        logger.info("adopting existing database at revision %s", LEGACY_REVISION)
+        _adopt_legacy(cfg, engine)
+    _run(cfg, engine, command.upgrade, "head")
+    bootstrap(engine)
+
+
+def bootstrap(engine=None):
+    from app.core.security import hash_password
+    from app.models import User
+
+    if engine is None:
+        from app.db.session import engine
+
+    users = User.__table__
+    with engine.begin() as conn:
+        admin = conn.execute(users.select().where(users.c.username == "admin")).fetchone()
+        if admin is None:
+            conn.execute(
+                users.insert().values(
+                    username="admin",
+                    password_hash=hash_password("admin123"),
+                    role="admin",
+                    is_active=True,
+                )
+            )
+        elif str(admin.password_hash).startswith(("$2a$", "$2b$", "$2y$")):
+            # Auto-migrate legacy bcrypt hash to pbkdf2 to avoid bcrypt backend issues.
+            conn.execute(
+                users.update().where(users.c.username == "admin").values(password_hash=hash_password("admin123"))
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="upgrade the schema to head and create the admin user")
+    sub.add_parser("bootstrap", help="create the admin user only")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    if args.command == "migrate":
+        migrate()
+    else:
+        bootstrap()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,25 @@
     Partner,
     Product,
     User,
+    TokenFamily,
     Doc,
     DocLine,
+    DocSequence,
     StockBalance,
     StockLedger,
+    StockThreshold,
+    StockAlert,
     ProductSN,
     DocLineSN,
+    Stocktake,
+    StocktakeLine,
+    StocktakeSN,
+    WarrantyExpiryBucket,
+    PartnerSummary,
+    Job,
+    CacheGeneration,
+    PeriodClose,
+    ArchivePeriod,
 )
 
 __all__ = [
@@ -16,10 +29,23 @@ __all__ = [
     "Partner",
     "Product",
     "User",
+    "TokenFamily",
     "Doc",
     "DocLine",
+    "DocSequence",
     "StockBalance",
     "StockLedger",
+    "StockThreshold",
+    "StockAlert",
     "ProductSN",
     "DocLineSN",
+    "Stocktake",
+    "StocktakeLine",
+    "StocktakeSN",
+    "WarrantyExpiryBucket",
+    "PartnerSummary",
+    "Job",
+    "CacheGeneration",
+    "PeriodClose",
+    "ArchivePeriod",
 ]
@@ -1,6 +1,7 @@
 ﻿from __future__ import annotations
 
 from datetime import datetime, date
+from decimal import Decimal
 from typing import Optional
 
 from sqlalchemy import (
@@ -10,7 +11,7 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Integer,
-    Numeric,
+    JSON,
     String,
     UniqueConstraint,
     Index,
@@ -18,6 +19,7 @@ from sqlalchemy import (
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
+from app.db.types import Hundredths
 
 
 class Warehouse(Base):
@@ -47,7 +49,7 @@ class Product(Base):
     name: Mapped[str] = mapped_column(String(200), index=True)
     brand: Mapped[Optional[str]] = mapped_column(String(100), index=True)
     model: Mapped[Optional[str]] = mapped_column(String(100), index=True)
-    barcode: Mapped[Optional[str]] = mapped_column(String(100))
+    barcode: Mapped[Optional[str]] = mapped_column(String(100), index=True)
     unit: Mapped[Optional[str]] = mapped_column(String(20))
     track_sn: Mapped[bool] = mapped_column(Boolean, default=False)
     warranty_months: Mapped[Optional[int]] = mapped_column(Integer)
@@ -64,6 +66,21 @@ class User(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
 
 
+class TokenFamily(Base):
+    __tablename__ = "token_families"
+
+    # one row per login; every refresh rotates current_jti, reuse of an older refresh token revokes the family
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    current_jti: Mapped[str] = mapped_column(String(32))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    refreshed_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    revoked_at: Mapped[Optional[datetime]] = mapped_column(DateTime, index=True)
+    # 1, 2, ... in commit order (assigned under the write lock); workers sync revocations on it
+    revoked_seq: Mapped[Optional[int]] = mapped_column(Integer, index=True)
+    revoke_reason: Mapped[Optional[str]] = mapped_column(String(50))
+
+
 class Doc(Base):
     __tablename__ = "docs"
 
@@ -75,6 +92,8 @@ class Doc(Base):
     partner_id: Mapped[Optional[int]] = mapped_column(ForeignKey("partners.id"))
     from_wh_id: Mapped[Optional[int]] = mapped_column(ForeignKey("warehouses.id"))
     to_wh_id: Mapped[Optional[int]] = mapped_column(ForeignKey("warehouses.id"))
+    # original document of a return (SALES_RETURN -> SALES_OUT, PURCHASE_RETURN -> PURCHASE_IN)
+    ref_doc_id: Mapped[Optional[int]] = mapped_column(ForeignKey("docs.id"), index=True)
 
     status: Mapped[str] = mapped_column(String(20), index=True, default="DRAFT")
     remark: Mapped[Optional[str]] = mapped_column(String(500))
@@ -88,6 +107,17 @@ class Doc(Base):
 
     lines: Mapped[list["DocLine"]] = relationship(back_populates="doc", cascade="all, delete-orphan")
 
+    __table_args__ = (Index("ix_docs_partner_date", "partner_id", "biz_date"),)
+
+
+class DocSequence(Base):
+    __tablename__ = "doc_sequences"
+
+    doc_type: Mapped[str] = mapped_column(String(30), primary_key=True)
+    period: Mapped[str] = mapped_column(String(6), primary_key=True)
+    # first number not yet handed out to any process
+    next_value: Mapped[int] = mapped_column(Integer, default=1)
+
 
 class DocLine(Base):
     __tablename__ = "doc_lines"
@@ -96,9 +126,9 @@ class DocLine(Base):
     doc_id: Mapped[int] = mapped_column(ForeignKey("docs.id"), index=True)
     line_no: Mapped[int] = mapped_column(Integer)
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), index=True)
-    qty: Mapped[Numeric] = mapped_column(Numeric(18, 2))
-    unit_price: Mapped[Optional[Numeric]] = mapped_column(Numeric(18, 2))
-    amount: Mapped[Optional[Numeric]] = mapped_column(Numeric(18, 2))
+    qty: Mapped[Decimal] = mapped_column(Hundredths())
+    unit_price: Mapped[Optional[Decimal]] = mapped_column(Hundredths())
+    amount: Mapped[Optional[Decimal]] = mapped_column(Hundredths())
 
     from_wh_id: Mapped[Optional[int]] = mapped_column(ForeignKey("warehouses.id"), index=True)
     to_wh_id: Mapped[Optional[int]] = mapped_column(ForeignKey("warehouses.id"), index=True)
@@ -118,7 +148,31 @@ class StockBalance(Base):
 
     warehouse_id: Mapped[int] = mapped_column(ForeignKey("warehouses.id"), primary_key=True)
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), primary_key=True)
-    qty_on_hand: Mapped[Numeric] = mapped_column(Numeric(18, 2), default=0)
+    qty_on_hand: Mapped[Decimal] = mapped_column(Hundredths(), default=0)
+
+    # product-major lookups (stock matrix pages) next to the warehouse-major primary key
+    __table_args__ = (Index("ix_balance_product_wh", "product_id", "warehouse_id", "qty_on_hand"),)
+
+
+class StockThreshold(Base):
+    __tablename__ = "stock_thresholds"
+
+    warehouse_id: Mapped[int] = mapped_column(ForeignKey("warehouses.id"), primary_key=True)
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), primary_key=True)
+    min_qty: Mapped[Decimal] = mapped_column(Hundredths(), default=0)
+    max_qty: Mapped[Optional[Decimal]] = mapped_column(Hundredths())
+
+
+class StockAlert(Base):
+    __tablename__ = "stock_alerts"
+
+    warehouse_id: Mapped[int] = mapped_column(ForeignKey("warehouses.id"), primary_key=True)
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), primary_key=True)
+    qty_on_hand: Mapped[Decimal] = mapped_column(Hundredths(), default=0)
+    min_qty: Mapped[Decimal] = mapped_column(Hundredths(), default=0)
+    max_qty: Mapped[Optional[Decimal]] = mapped_column(Hundredths())
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
 class StockLedger(Base):
@@ -131,9 +185,9 @@ class StockLedger(Base):
     ref_line_id: Mapped[int] = mapped_column(ForeignKey("doc_lines.id"))
     ref_type: Mapped[str] = mapped_column(String(30))
     biz_date: Mapped[date] = mapped_column(Date)
-    in_qty: Mapped[Numeric] = mapped_column(Numeric(18, 2), default=0)
-    out_qty: Mapped[Numeric] = mapped_column(Numeric(18, 2), default=0)
-    unit_cost: Mapped[Optional[Numeric]] = mapped_column(Numeric(18, 2))
+    in_qty: Mapped[Decimal] = mapped_column(Hundredths(), default=0)
+    out_qty: Mapped[Decimal] = mapped_column(Hundredths(), default=0)
+    unit_cost: Mapped[Optional[Decimal]] = mapped_column(Hundredths())
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     __table_args__ = (
@@ -162,6 +216,12 @@ class ProductSN(Base):
     warranty_start: Mapped[Optional[date]] = mapped_column(Date)
     warranty_end: Mapped[Optional[date]] = mapped_column(Date)
 
+    __table_args__ = (
+        Index("ix_product_sns_warranty_end", "warranty_end"),
+        Index("ix_product_sns_in_doc", "in_doc_id"),
+        Index("ix_product_sns_out_doc", "out_doc_id"),
+    )
+
 
 class DocLineSN(Base):
     __tablename__ = "doc_line_sns"
@@ -175,3 +235,125 @@ class DocLineSN(Base):
         UniqueConstraint("line_id", "sn_id", name="uq_line_sn"),
         Index("ix_doc_line_sn", "doc_id", "sn_id"),
     )
+
+
+class Stocktake(Base):
+    __tablename__ = "stocktakes"
+
+    # snapshot header of a STOCKTAKE doc; counts are compared with the book quantities frozen here
+    doc_id: Mapped[int] = mapped_column(ForeignKey("docs.id"), primary_key=True)
+    warehouse_id: Mapped[int] = mapped_column(ForeignKey("warehouses.id"), index=True)
+    snapshot_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class StocktakeLine(Base):
+    __tablename__ = "stocktake_lines"
+
+    doc_id: Mapped[int] = mapped_column(ForeignKey("docs.id"), primary_key=True)
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), primary_key=True)
+    book_qty: Mapped[Decimal] = mapped_column(Hundredths(), default=0)
+    # NULL until counted; uncounted products count as zero when the stocktake is posted
+    counted_qty: Mapped[Optional[Decimal]] = mapped_column(Hundredths())
+
+
+class StocktakeSN(Base):
+    __tablename__ = "stocktake_sns"
+
+    doc_id: Mapped[int] = mapped_column(ForeignKey("docs.id"), primary_key=True)
+    sn_id: Mapped[int] = mapped_column(ForeignKey("product_sns.id"), primary_key=True)
+    in_book: Mapped[bool] = mapped_column(Boolean, default=False)
+    counted: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    # the serial's state before posting changed it (LOST or found); a reversal restores these
+    prior_status: Mapped[Optional[str]] = mapped_column(String(20))
+    prior_warehouse_id: Mapped[Optional[int]] = mapped_column(ForeignKey("warehouses.id"))
+    prior_in_doc_id: Mapped[Optional[int]] = mapped_column(ForeignKey("docs.id"))
+    prior_in_line_id: Mapped[Optional[int]] = mapped_column(ForeignKey("doc_lines.id"))
+    prior_in_date: Mapped[Optional[date]] = mapped_column(Date)
+    prior_out_doc_id: Mapped[Optional[int]] = mapped_column(ForeignKey("docs.id"))
+    prior_out_line_id: Mapped[Optional[int]] = mapped_column(ForeignKey("doc_lines.id"))
+    prior_out_date: Mapped[Optional[date]] = mapped_column(Date)
+
+
+class WarrantyExpiryBucket(Base):
+    __tablename__ = "warranty_expiry_buckets"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    expiry_date: Mapped[date] = mapped_column(Date)
+    partner_id: Mapped[Optional[int]] = mapped_column(ForeignKey("partners.id"))
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"))
+    sn_count: Mapped[int] = mapped_column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("expiry_date", "partner_id", "product_id", name="uq_warranty_bucket"),
+        Index("ix_warranty_bucket_partner_date", "partner_id", "expiry_date"),
+    )
+
+
+class PartnerSummary(Base):
+    __tablename__ = "partner_summaries"
+
+    # per partner, doc type and month (YYYYMM); kept up to date as docs are created, edited, posted and reversed
+    partner_id: Mapped[int] = mapped_column(ForeignKey("partners.id"), primary_key=True)
+    doc_type: Mapped[str] = mapped_column(String(30), primary_key=True)
+    period: Mapped[str] = mapped_column(String(6), primary_key=True)
+    open_count: Mapped[int] = mapped_column(Integer, default=0)
+    open_amount: Mapped[Decimal] = mapped_column(Hundredths(), default=0)
+    posted_count: Mapped[int] = mapped_column(Integer, default=0)
+    posted_amount: Mapped[Decimal] = mapped_column(Hundredths(), default=0)
+    last_biz_date: Mapped[Optional[date]] = mapped_column(Date)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50), index=True)
+    status: Mapped[str] = mapped_column(String(20), index=True, default="QUEUED")
+    params: Mapped[Optional[dict]] = mapped_column(JSON)
+    checkpoint: Mapped[Optional[dict]] = mapped_column(JSON)
+    result: Mapped[Optional[dict]] = mapped_column(JSON)
+    error: Mapped[Optional[str]] = mapped_column(String(1000))
+    progress_done: Mapped[int] = mapped_column(Integer, default=0)
+    progress_total: Mapped[Optional[int]] = mapped_column(Integer)
+
+    created_by: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id"))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    # set by each claim; writes from a runner whose lease was taken over no longer match
+    lease_token: Mapped[Optional[str]] = mapped_column(String(32))
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+
+class CacheGeneration(Base):
+    __tablename__ = "cache_generations"
+
+    # shared response-cache invalidation counters when running several worker processes
+    namespace: Mapped[str] = mapped_column(String(50), primary_key=True)
+    generation: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class PeriodClose(Base):
+    __tablename__ = "period_closes"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    cutoff: Mapped[date] = mapped_column(Date, unique=True, index=True)
+    status: Mapped[str] = mapped_column(String(20), default="CLOSING")
+    # no FK: the opening doc itself is archived by a later close
+    opening_doc_id: Mapped[Optional[int]] = mapped_column(Integer)
+    ledger_rows: Mapped[int] = mapped_column(Integer, default=0)
+    doc_count: Mapped[int] = mapped_column(Integer, default=0)
+    closed_by: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id"))
+    closed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class ArchivePeriod(Base):
+    __tablename__ = "archive_periods"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    period: Mapped[str] = mapped_column(String(7), unique=True)
+    file_name: Mapped[str] = mapped_column(String(200))
+    date_from: Mapped[date] = mapped_column(Date)
+    date_to: Mapped[date] = mapped_column(Date)
+    ledger_rows: Mapped[int] = mapped_column(Integer, default=0)
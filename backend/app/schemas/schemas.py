@@ -1,9 +1,22 @@
 ﻿from __future__ import annotations
 
 from datetime import date, datetime
-from typing import Optional, List
+from decimal import Decimal
+from typing import Annotated, Any, Dict, Optional, List
 
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import AfterValidator, BaseModel, Field, ConfigDict
+
+
+def _whole_hundredths(value: float) -> float:
+    # quantities are stored as integer hundredths (app.db.types.Hundredths); finer values would be rounded,
+    # e.g. 0.001 to 0
+    exact = Decimal(str(value))
+    if not exact.is_finite() or exact % Decimal("0.01"):
+        raise ValueError("must be a multiple of 0.01")
+    return value
+
+
+Qty = Annotated[float, AfterValidator(_whole_hundredths)]
 
 
 class WarehouseBase(BaseModel):
@@ -37,6 +50,34 @@ class PartnerOut(PartnerBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class PartnerSummaryOut(BaseModel):
+    partner_id: int
+    doc_type: str
+    period: Optional[str] = None
+    open_count: int
+    open_amount: float
+    posted_count: int
+    posted_amount: float
+    last_biz_date: Optional[date] = None
+
+
+class PartnerStatementDoc(BaseModel):
+    id: int
+    doc_no: str
+    doc_type: str
+    biz_date: date
+    status: str
+    amount: float
+
+
+class PartnerStatementOut(BaseModel):
+    partner_id: int
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    totals: List[PartnerSummaryOut]
+    docs: List[PartnerStatementDoc]
+
+
 class ProductBase(BaseModel):
     sku: str
     name: str
@@ -61,7 +102,7 @@ class ProductOut(ProductBase):
 class DocLineBase(BaseModel):
     line_no: int
     product_id: int
-    qty: float = Field(gt=0)
+    qty: Qty = Field(ge=0.01)
     unit_price: Optional[float] = None
     amount: Optional[float] = None
     from_wh_id: Optional[int] = None
@@ -73,6 +114,16 @@ class DocLineCreate(DocLineBase):
     pass
 
 
+class DocLinePatch(BaseModel):
+    product_id: Optional[int] = None
+    qty: Optional[Qty] = Field(default=None, ge=0.01)
+    unit_price: Optional[float] = None
+    amount: Optional[float] = None
+    from_wh_id: Optional[int] = None
+    to_wh_id: Optional[int] = None
+    remark: Optional[str] = None
+
+
 class DocLineOut(DocLineBase):
     id: int
     doc_id: int
@@ -86,11 +137,15 @@ class DocBase(BaseModel):
     partner_id: Optional[int] = None
     from_wh_id: Optional[int] = None
     to_wh_id: Optional[int] = None
+    # returns: the SALES_OUT / PURCHASE_IN being returned
+    ref_doc_id: Optional[int] = None
     status: Optional[str] = None
     remark: Optional[str] = None
 
 
 class DocCreate(DocBase):
+    # omitted: allocated by the server, e.g. SO-202610-000123
+    doc_no: Optional[str] = None
     lines: List[DocLineCreate]
 
 
@@ -125,6 +180,28 @@ class SNOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ScanIn(BaseModel):
+    code: str = Field(min_length=1)
+    sn: Optional[str] = None
+
+
+class ScanOut(BaseModel):
+    product_id: int
+    line_id: int
+    line_no: int
+    sn: Optional[SNOut] = None
+
+
+class WarrantySNOut(SNOut):
+    partner_id: Optional[int] = None
+
+
+class WarrantyBucketOut(BaseModel):
+    expiry_date: date
+    partner_id: Optional[int] = None
+    sn_count: int
+
+
 class StockBalanceOut(BaseModel):
     warehouse_id: int
     product_id: int
@@ -133,6 +210,39 @@ class StockBalanceOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class StockMatrixOut(BaseModel):
+    # columnar: qty[i][j] is product_ids[i] in warehouse_ids[j]
+    warehouse_ids: List[int]
+    product_ids: List[int]
+    skus: List[str]
+    names: List[str]
+    qty: List[List[float]]
+    next_after_id: Optional[int] = None
+
+
+class StockThresholdIn(BaseModel):
+    warehouse_id: int
+    product_id: int
+    min_qty: Qty = Field(ge=0)
+    max_qty: Optional[Qty] = Field(default=None, ge=0)
+
+
+class StockThresholdOut(StockThresholdIn):
+    model_config = ConfigDict(from_attributes=True)
+
+
+class StockAlertOut(BaseModel):
+    warehouse_id: int
+    product_id: int
+    qty_on_hand: float
+    min_qty: float
+    max_qty: Optional[float] = None
+    suggested_qty: float
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class StockLedgerOut(BaseModel):
     id: int
     warehouse_id: int
@@ -149,6 +259,127 @@ class StockLedgerOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class JobOut(BaseModel):
+    id: int
+    kind: str
+    status: str
+    progress_done: int = 0
+    progress_total: Optional[int] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_by: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class PeriodCloseIn(BaseModel):
+    cutoff: date
+
+
+class PeriodCloseOut(BaseModel):
+    id: int
+    cutoff: date
+    status: str
+    opening_doc_id: Optional[int] = None
+    ledger_rows: int = 0
+    doc_count: int = 0
+    closed_by: Optional[int] = None
+    closed_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ArchivePeriodOut(BaseModel):
+    period: str
+    file_name: str
+    date_from: date
+    date_to: date
+    ledger_rows: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class PeriodsOut(BaseModel):
+    closes: List[PeriodCloseOut]
+    archives: List[ArchivePeriodOut]
+
+
+class StocktakeCreate(BaseModel):
+    warehouse_id: int
+    biz_date: date
+    doc_no: Optional[str] = None
+    remark: Optional[str] = None
+
+
+class StocktakeCountIn(BaseModel):
+    product_id: int
+    qty: Qty = Field(ge=0)
+
+
+class StocktakeCountsIn(BaseModel):
+    items: List[StocktakeCountIn] = Field(min_length=1, max_length=10000)
+    accumulate: bool = False
+
+
+class StocktakeSNsIn(BaseModel):
+    sns: List[str] = Field(min_length=1, max_length=10000)
+    # required only for serials the system has not seen before
+    product_id: Optional[int] = None
+
+
+class StocktakeOut(BaseModel):
+    doc_id: int
+    doc_no: str
+    warehouse_id: int
+    biz_date: date
+    status: str
+    snapshot_at: datetime
+    products: int
+    products_counted: int
+    sns_in_book: int
+    sns_counted: int
+
+
+class DocCheckProblem(BaseModel):
+    # code: status / period / ref_doc / lines / product / warehouse / shortfall / return_exceeds / sn_count / sn
+    code: str
+    message: str
+    line_no: Optional[int] = None
+    product_id: Optional[int] = None
+    warehouse_id: Optional[int] = None
+    required: Optional[float] = None
+    available: Optional[float] = None
+    sn: Optional[str] = None
+    sn_status: Optional[str] = None
+    sn_warehouse_id: Optional[int] = None
+
+
+class DocCheckOut(BaseModel):
+    doc_id: int
+    doc_type: str
+    status: str
+    ok: bool
+    problems: List[DocCheckProblem]
+
+
+class DocBatchCreateIn(BaseModel):
+    docs: List[DocCreate] = Field(min_length=1, max_length=1000)
+
+
+class DocBatchCreateResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    doc_no: Optional[str] = None
+    error: Optional[str] = None
+
+
+class DocBatchPostIn(BaseModel):
+    doc_ids: List[int] = Field(min_length=1)
+
+
 class TokenOut(BaseModel):
     access_token: str
     refresh_token: str
@@ -158,3 +389,7 @@ class TokenOut(BaseModel):
 class LoginIn(BaseModel):
     username: str
     password: str
+
+
+class RefreshIn(BaseModel):
+    refresh_token: str
@@ -0,0 +1,322 @@
+﻿from __future__ import annotations
+
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import Column, Index, MetaData, Table, create_engine, func, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import ARCHIVE_DIR
+from app.db.deps import db_transaction
+from app.db.session import SessionLocal, engine
+from app.models import ArchivePeriod, Doc, DocLine, DocLineSN, PeriodClose, StockLedger
+from app.services.closing import OPENING, closed_through
+
+# PRAGMA user_version of archive files: 1 = quantities stored as integer hundredths (revision 0008)
+ARCHIVE_VERSION = 1
+
+
+class ArchiveError(Exception):
+    pass
+
+
+# Archive files hold plain copies of these tables (no foreign keys), one file per month.
+ARCHIVED_TABLES = (StockLedger.__table__, Doc.__table__, DocLine.__table__, DocLineSN.__table__)
+
+archive_metadata = MetaData()
+for _table in ARCHIVED_TABLES:
+    Table(
+        _table.name,
+        archive_metadata,
+        *[Column(c.name, c.type, primary_key=c.primary_key) for c in _table.columns],
+    )
+_ledger = archive_metadata.tables["stock_ledger"]
+Index("ix_ledger_wh_prod_date", _ledger.c.warehouse_id, _ledger.c.product_id, _ledger.c.biz_date)
+Index("ix_ledger_ref_doc", _ledger.c.ref_doc_id)
+Index("ix_doc_lines_doc_id", archive_metadata.tables["doc_lines"].c.doc_id)
+Index("ix_doc_line_sns_doc_id", archive_metadata.tables["doc_line_sns"].c.doc_id)
+
+# Posted docs in [:start, :end) that nothing left in the live database still points at.
+# Returns and the docs they reference stay live: return validation reads both.
+ARCHIVABLE_DOCS = """
+    SELECT d.id FROM main.docs d
+    WHERE d.status = 'POSTED' AND d.biz_date >= :start AND d.biz_date < :end
+      AND d.ref_doc_id IS NULL
+      AND NOT EXISTS (SELECT 1 FROM main.docs r WHERE r.ref_doc_id = d.id)
+      AND NOT EXISTS (SELECT 1 FROM main.product_sns s WHERE s.in_doc_id = d.id)
+      AND NOT EXISTS (SELECT 1 FROM main.product_sns s WHERE s.out_doc_id = d.id)
+      AND NOT EXISTS (
+          SELECT 1 FROM main.stock_ledger l WHERE l.ref_doc_id = d.id AND l.biz_date >= :cutoff
+      )
+"""
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def _has_tables(conn) -> bool:
+    return conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE type = 'table' LIMIT 1").first() is not None
+
+
+def archive_engine(file_name: str) -> Engine:
+    # An existing file in another format, e.g. one that was missing when revision 0008 converted the
+    # archives and so still holds plain decimals, is refused rather than read at the wrong scale.
+    with _engines_lock:
+        archive = _engines.get(file_name)
+        if archive is None:
+            ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+            archive = create_engine(f"sqlite+pysqlite:///{(ARCHIVE_DIR / file_name).as_posix()}", future=True)
+            with archive.connect() as conn:
+                version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+                if _has_tables(conn) and version != ARCHIVE_VERSION:
+                    archive.dispose()
+                    raise ArchiveError(
+                        f"archive {file_name} has format version {version}, expected {ARCHIVE_VERSION}; "
+                        "convert it with the archive step of migration 0008 before using it"
+                    )
+            _engines[file_name] = archive
+        return archive
+
+
+def ledger_archives(db: Session, date_from: Optional[date], date_to: Optional[date]) -> Optional[List[ArchivePeriod]]:
+    # None when the range lies entirely after the last close, i.e. only the live table is needed.
+    cutoff = closed_through(db)
+    if cutoff is None or (date_from is not None and date_from >= cutoff):
+        return None
+    stmt = select(ArchivePeriod).order_by(ArchivePeriod.period)
+    if date_from:
+        stmt = stmt.where(ArchivePeriod.date_to >= date_from)
+    if date_to:
+        stmt = stmt.where(ArchivePeriod.date_from <= date_to)
+    return list(db.execute(stmt).scalars().all())
+
+
+def iter_ledger_results(db: Session, stmt, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    # Runs a stock_ledger select against the archives the range needs (oldest first), then the live table.
+    # When archived detail is included the OPENING carry-forward rows would double count, so they are skipped.
+    archives = ledger_archives(db, date_from, date_to)
+    if archives is None:
+        yield db.execute(stmt)
+        return
+    stmt = stmt.where(StockLedger.ref_type != OPENING)
+    for period in archives:
+        with archive_engine(period.file_name).connect() as conn:
+            yield conn.execute(stmt)
+    yield db.execute(stmt)
+
+
+def _months(cutoff: date) -> List[str]:
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT substr(biz_date, 1, 7) FROM stock_ledger WHERE biz_date < :cutoff "
+                "UNION SELECT substr(biz_date, 1, 7) FROM docs WHERE status = 'POSTED' AND biz_date < :cutoff"
+            ),
+            {"cutoff": cutoff.isoformat()},
+        ).all()
+    return sorted(row[0] for row in rows)
+
+
+def _month_range(period: str, cutoff: date):
+    start = date.fromisoformat(f"{period}-01")
+    next_month = (start + timedelta(days=32)).replace(day=1)
+    return start, min(next_month, cutoff)
+
+
+def _prepare(archive: Engine):
+    # A new file gets the tables and the current format version. Files written before a column was
+    # added to the live tables get a plain ADD COLUMN (the copies have no constraints); files in an
+    # older format were refused by archive_engine.
+    with archive.begin() as conn:
+        if not _has_tables(conn):
+            archive_metadata.create_all(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {ARCHIVE_VERSION}")
+            return
+        for table in archive_metadata.sorted_tables:
+            present = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+            for column in table.columns:
+                if column.name not in present:
+                    conn.exec_driver_sql(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(archive.dialect)}"
+                    )
+
+
+def _copy_month(period: str, cutoff: date) -> int:
+    file_name = f"ledger-{period}.db"
+    _prepare(archive_engine(file_name))
+    start, end = _month_range(period, cutoff)
+    params = {"start": start.isoformat(), "end": end.isoformat(), "cutoff": cutoff.isoformat()}
+
+    def columns(table):
+        return ", ".join(c.name for c in table.columns)
+
+    ledger_cols = columns(StockLedger.__table__)
+    doc_cols = columns(Doc.__table__)
+    line_cols = columns(DocLine.__table__)
+    link_cols = columns(DocLineSN.__table__)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ATTACH DATABASE ? AS arc", ((ARCHIVE_DIR / file_name).as_posix(),))
+        conn.commit()
+        try:
+            # INSERT OR IGNORE keeps the copy idempotent if a close is retried.
+            copied = conn.execute(
+                text(
+                    f"INSERT OR IGNORE INTO arc.stock_ledger ({ledger_cols}) SELECT {ledger_cols} "
+                    "FROM main.stock_ledger WHERE biz_date >= :start AND biz_date < :end"
+                ),
+                params,
+            ).rowcount
+            conn.execute(
+                text(
+                    f"INSERT OR IGNORE INTO arc.docs ({doc_cols}) SELECT {doc_cols} FROM main.docs "
+                    f"WHERE id IN ({ARCHIVABLE_DOCS})"
+                ),
+                params,
+            )
+            conn.execute(
+                text(
+                    f"INSERT OR IGNORE INTO arc.doc_lines ({line_cols}) SELECT {line_cols} FROM main.doc_lines "
+                    f"WHERE doc_id IN ({ARCHIVABLE_DOCS})"
+                ),
+                params,
+            )
+            conn.execute(
+                text(
+                    f"INSERT OR IGNORE INTO arc.doc_line_sns ({link_cols}) SELECT {link_cols} FROM main.doc_line_sns "
+                    f"WHERE doc_id IN ({ARCHIVABLE_DOCS})"
+                ),
+                params,
+            )
+            conn.commit()
+        finally:
+            conn.exec_driver_sql("DETACH DATABASE arc")
+            conn.commit()
+
+    with SessionLocal() as db:
+        with db_transaction(db):
+            archive = db.execute(select(ArchivePeriod).where(ArchivePeriod.period == period)).scalar_one_or_none()
+            if archive is None:
+                archive = ArchivePeriod(period=period, file_name=file_name, date_from=start, date_to=start, ledger_rows=0)
+                db.add(archive)
+            archive.date_to = max(archive.date_to, end - timedelta(days=1))
+            archive.ledger_rows = archive.ledger_rows + copied
+    return copied
+
+
+def _add_opening(db: Session, cutoff: date, user_id: Optional[int]) -> Optional[Doc]:
+    nets = db.execute(
+        select(
+            StockLedger.warehouse_id,
+            StockLedger.product_id,
+            func.sum(StockLedger.in_qty) - func.sum(StockLedger.out_qty),
+        )
+        .where(StockLedger.biz_date < cutoff)
+        .group_by(StockLedger.warehouse_id, StockLedger.product_id)
+    ).all()
+    nets = [(wh, product, net) for wh, product, net in nets if net]
+    if not nets:
+        return None
+
+    now = datetime.utcnow()
+    doc = Doc(
+        doc_type=OPENING,
+        doc_no=f"OPEN-{cutoff:%Y%m%d}",
+        biz_date=cutoff,
+        status="POSTED",
+        remark="period close carry-forward",
+        created_by=user_id,
+        created_at=now,
+        posted_by=user_id,
+        posted_at=now,
+    )
+    db.add(doc)
+    db.flush()
+    lines = [
+        DocLine(
+            doc_id=doc.id,
+            line_no=line_no,
+            product_id=product,
+            qty=abs(net),
+            to_wh_id=wh if net > 0 else None,
+            from_wh_id=wh if net < 0 else None,
+        )
+        for line_no, (wh, product, net) in enumerate(nets, start=1)
+    ]
+    db.add_all(lines)
+    db.flush()
+    db.execute(
+        insert(StockLedger),
+        [
+            {
+                "warehouse_id": wh,
+                "product_id": product,
+                "ref_doc_id": doc.id,
+                "ref_line_id": line.id,
+                "ref_type": OPENING,
+                "biz_date": cutoff,
+                "in_qty": net if net > 0 else 0,
+                "out_qty": -net if net < 0 else 0,
+                "created_at": now,
+            }
+            for line, (wh, product, net) in zip(lines, nets)
+        ],
+    )
+    return doc
+
+
+def close_period(
+    cutoff: date,
+    user_id: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, int]:
+    # 1) record the close first so posting into the period is refused while it runs
+    with SessionLocal() as db:
+        with db_transaction(db):
+            close = db.execute(select(PeriodClose).where(PeriodClose.cutoff == cutoff)).scalar_one_or_none()
+            if close is not None and close.status == "CLOSED":
+                raise ArchiveError("period already closed")
+            if close is None:
+                latest = closed_through(db)
+                if latest is not None and cutoff <= latest:
+                    raise ArchiveError(f"cutoff must be after {latest.isoformat()}")
+                open_docs = db.execute(
+                    select(func.count(Doc.id)).where(
+                        Doc.status.in_(("DRAFT", "APPROVED")), Doc.biz_date < cutoff
+                    )
+                ).scalar_one()
+                if open_docs:
+                    raise ArchiveError(f"{open_docs} unposted docs dated before cutoff")
+                db.add(PeriodClose(cutoff=cutoff, status="CLOSING", closed_by=user_id, closed_at=datetime.utcnow()))
+
+    # 2) copy month by month into the archive files
+    months = _months(cutoff)
+    for done, period in enumerate(months, start=1):
+        _copy_month(period, cutoff)
+        if on_progress is not None:
+            on_progress(done, len(months) + 1)
+
+    # 3) one transaction on the live database: carry balances forward, then drop the copied rows
+    params = {"start": date.min.isoformat(), "end": cutoff.isoformat(), "cutoff": cutoff.isoformat()}
+    with SessionLocal() as db:
+        with db_transaction(db):
+            opening = _add_opening(db, cutoff, user_id)
+            ledger_rows = db.execute(
+                text("DELETE FROM stock_ledger WHERE biz_date < :cutoff"), params
+            ).rowcount
+            db.execute(text(f"DELETE FROM doc_line_sns WHERE doc_id IN ({ARCHIVABLE_DOCS})"), params)
+            # count snapshots are working data of posted stocktakes and are not archived
+            for table in ("stocktake_sns", "stocktake_lines", "stocktakes"):
+                db.execute(text(f"DELETE FROM {table} WHERE doc_id IN ({ARCHIVABLE_DOCS})"), params)
+            db.execute(text(f"DELETE FROM doc_lines WHERE doc_id IN ({ARCHIVABLE_DOCS})"), params)
+            doc_count = db.execute(text(f"DELETE FROM docs WHERE id IN ({ARCHIVABLE_DOCS})"), params).rowcount
+            close = db.execute(select(PeriodClose).where(PeriodClose.cutoff == cutoff)).scalar_one()
+            close.status = "CLOSED"
+            close.opening_doc_id = opening.id if opening else None
+            close.ledger_rows = ledger_rows
+            close.doc_count = doc_count
+            close.closed_at = datetime.utcnow()
+    if on_progress is not None:
+        on_progress(len(months) + 1, len(months) + 1)
+    return {"months": len(months), "ledger_rows": ledger_rows, "doc_count": doc_count}
@@ -0,0 +1,17 @@
+﻿from __future__ import annotations
+
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models import PeriodClose
+
+# What posting needs to know about closed periods. The archive files and the close itself live in
+# app.services.archive, which is only imported by the paths that read archives or run a close.
+OPENING = "OPENING"
+
+
+def closed_through(db: Session) -> Optional[date]:
+    return db.execute(select(func.max(PeriodClose.cutoff))).scalar()
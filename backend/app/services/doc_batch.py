@@ -0,0 +1,133 @@
+﻿from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.db.deps import db_transaction
+from app.models import Doc, DocLine, Partner, Product, Warehouse
+from app.schemas.schemas import DocCreate
+from app.services.doc_numbers import doc_numbers
+from app.services.events import emit
+from app.services.partner_summary import track_docs
+from app.services.stocktake import STOCKTAKE
+
+
+def _existing(db: Session, column, ids) -> set:
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return set()
+    return set(db.execute(select(column).where(column.in_(ids))).scalars().all())
+
+
+def validate_docs(db: Session, payloads: Sequence[DocCreate]) -> List[Optional[str]]:
+    # One IN query per referenced table for the whole batch; returns an error (or None) per payload.
+    product_ids = {line.product_id for data in payloads for line in data.lines}
+    wh_ids = {wh for data in payloads for wh in (data.from_wh_id, data.to_wh_id)}
+    wh_ids |= {wh for data in payloads for line in data.lines for wh in (line.from_wh_id, line.to_wh_id)}
+    doc_nos = [data.doc_no for data in payloads if data.doc_no]
+
+    products = _existing(db, Product.id, product_ids)
+    warehouses = _existing(db, Warehouse.id, wh_ids)
+    partners = _existing(db, Partner.id, {data.partner_id for data in payloads})
+    taken = _existing(db, Doc.doc_no, doc_nos)
+    ref_docs = _existing(db, Doc.id, {data.ref_doc_id for data in payloads})
+
+    errors: List[Optional[str]] = []
+    seen_nos = set()
+    for data in payloads:
+        error = None
+        line_nos = [line.line_no for line in data.lines]
+        missing_products = sorted({line.product_id for line in data.lines} - products)
+        doc_whs = {wh for wh in (data.from_wh_id, data.to_wh_id) if wh is not None}
+        doc_whs |= {wh for line in data.lines for wh in (line.from_wh_id, line.to_wh_id) if wh is not None}
+        missing_whs = sorted(doc_whs - warehouses)
+        if data.doc_type == STOCKTAKE:
+            error = "stocktakes are created via /api/stocktakes"
+        elif not data.lines:
+            error = "lines required"
+        elif len(set(line_nos)) != len(line_nos):
+            error = "duplicate line_no"
+        elif missing_products:
+            error = f"product not found: {missing_products}"
+        elif missing_whs:
+            error = f"warehouse not found: {missing_whs}"
+        elif data.partner_id is not None and data.partner_id not in partners:
+            error = "partner not found"
+        elif data.ref_doc_id is not None and data.ref_doc_id not in ref_docs:
+            error = "ref doc not found"
+        elif data.doc_no and (data.doc_no in taken or data.doc_no in seen_nos):
+            error = "doc_no already exists"
+        if data.doc_no:
+            seen_nos.add(data.doc_no)
+        errors.append(error)
+    return errors
+
+
+def create_docs(db: Session, payloads: Sequence[DocCreate], user_id: Optional[int]) -> List[Dict[str, Any]]:
+    # Invalid payloads are reported and skipped; the valid ones are inserted together.
+    # Call outside a transaction: doc number blocks are reserved on a separate connection.
+    errors = validate_docs(db, payloads)
+    results: List[Dict[str, Any]] = [
+        {"index": index, "id": None, "doc_no": data.doc_no, "error": error}
+        for index, (data, error) in enumerate(zip(payloads, errors))
+    ]
+    valid = [(result, data) for result, data in zip(results, payloads) if result["error"] is None]
+    if not valid:
+        return results
+
+    given = {data.doc_no for _, data in valid if data.doc_no}
+    for result, data in valid:
+        result["doc_no"] = data.doc_no or doc_numbers.next(data.doc_type, data.biz_date, given)
+
+    now = datetime.utcnow()
+    with db_transaction(db):
+        doc_ids = db.execute(
+            insert(Doc).returning(Doc.id, sort_by_parameter_order=True),
+            [
+                {
+                    "doc_type": data.doc_type,
+                    "doc_no": result["doc_no"],
+                    "biz_date": data.biz_date,
+                    "partner_id": data.partner_id,
+                    "from_wh_id": data.from_wh_id,
+                    "to_wh_id": data.to_wh_id,
+                    "ref_doc_id": data.ref_doc_id,
+                    "status": "DRAFT",
+                    "remark": data.remark,
+                    "created_by": user_id,
+                    "created_at": now,
+                }
+                for result, data in valid
+            ],
+        ).scalars().all()
+        db.execute(
+            insert(DocLine),
+            [
+                {
+                    "doc_id": doc_id,
+                    "line_no": line.line_no,
+                    "product_id": line.product_id,
+                    "qty": line.qty,
+                    "unit_price": line.unit_price,
+                    "amount": line.amount,
+                    "from_wh_id": line.from_wh_id,
+                    "to_wh_id": line.to_wh_id,
+                    "remark": line.remark,
+                }
+                for doc_id, (result, data) in zip(doc_ids, valid)
+                for line in data.lines
+            ],
+        )
+        track_docs(db, doc_ids)
+        for doc_id, (result, data) in zip(doc_ids, valid):
+            result["id"] = doc_id
+            emit(
+                db,
+                "doc",
+                {"id": doc_id, "doc_no": result["doc_no"], "doc_type": data.doc_type, "status": "DRAFT"},
+                key=doc_id,
+            )
+    return results
@@ -0,0 +1,95 @@
+﻿from __future__ import annotations
+
+import threading
+from datetime import date
+from typing import Collection, Dict, List, Tuple
+
+from sqlalchemy import Integer, cast, func, literal, select, true, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import DOC_NO_BLOCK_SIZE
+from app.db.session import engine
+from app.models import Doc, DocSequence
+
+DOC_PREFIXES = {
+    "PURCHASE_IN": "PI",
+    "SALES_OUT": "SO",
+    "TRANSFER": "TR",
+    "STOCKTAKE": "ST",
+    "SALES_RETURN": "SR",
+    "PURCHASE_RETURN": "PR",
+}
+DOC_NO_DIGITS = 6
+
+
+def doc_prefix(doc_type: str) -> str:
+    return DOC_PREFIXES.get(doc_type) or "".join(part[:1] for part in doc_type.split("_")).upper()
+
+
+def format_doc_no(doc_type: str, period: str, value: int) -> str:
+    return f"{doc_prefix(doc_type)}-{period}-{value:0{DOC_NO_DIGITS}d}"
+
+
+def _reserve(doc_type: str, period: str, size: int) -> int:
+    # One short write transaction on its own connection; returns the first number of the block.
+    # Must not run while the caller's session holds the SQLite write lock.
+    prefix = f"{doc_prefix(doc_type)}-{period}-"
+    seed = select(
+        literal(doc_type),
+        literal(period),
+        func.coalesce(func.max(cast(func.substr(Doc.doc_no, len(prefix) + 1), Integer)), 0) + 1,
+    ).where(Doc.doc_no.like(f"{prefix}%"), true())
+    with engine.begin() as conn:
+        # First use of a type/period starts after any numbers already entered by hand.
+        conn.execute(
+            insert(DocSequence)
+            .from_select(["doc_type", "period", "next_value"], seed)
+            .on_conflict_do_nothing()
+        )
+        end = conn.execute(
+            update(DocSequence)
+            .where(DocSequence.doc_type == doc_type, DocSequence.period == period)
+            .values(next_value=DocSequence.next_value + size)
+            .returning(DocSequence.next_value)
+        ).scalar_one()
+    return end - size
+
+
+def _in_use(doc_no: str) -> bool:
+    with engine.connect() as conn:
+        return conn.execute(select(Doc.id).where(Doc.doc_no == doc_no)).first() is not None
+
+
+def doc_no_conflict(exc: IntegrityError) -> bool:
+    # the unique index on docs.doc_no, as opposed to e.g. a foreign key failure
+    return "docs.doc_no" in str(exc.orig)
+
+
+class DocNumberAllocator:
+    # Hands out numbers from blocks reserved in doc_sequences, so most documents need no extra write.
+    # Blocks never overlap across processes; numbers left in a block at shutdown are skipped.
+    def __init__(self, block_size: int = DOC_NO_BLOCK_SIZE):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks: Dict[Tuple[str, str], List[int]] = {}
+
+    def next(self, doc_type: str, biz_date: date, taken: Collection[str] = ()) -> str:
+        # Numbers already used, e.g. typed in by hand after the block was reserved, are skipped;
+        # taken adds numbers about to be inserted alongside (a batch's own doc_no values).
+        period = f"{biz_date:%Y%m}"
+        key = (doc_type, period)
+        while True:
+            with self._lock:
+                block = self._blocks.get(key)
+                if block is None or block[0] >= block[1]:
+                    start = _reserve(doc_type, period, self.block_size)
+                    block = self._blocks[key] = [start, start + self.block_size]
+                value = block[0]
+                block[0] += 1
+            doc_no = format_doc_no(doc_type, period, value)
+            if doc_no not in taken and not _in_use(doc_no):
+                return doc_no
+
+
+doc_numbers = DocNumberAllocator()
@@ -0,0 +1,99 @@
+﻿from __future__ import annotations
+
+import asyncio
+import itertools
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+
+SUBSCRIBER_BUFFER = 1000
+
+# Queued in place of events a slow client missed; it should reload a snapshot.
+RESYNC = {"id": 0, "topic": "resync", "data": {}}
+
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, topics: Optional[Iterable[str]], maxsize: int):
+        self.loop = loop
+        self.topics = set(topics) if topics else None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def wants(self, topic: str) -> bool:
+        return self.topics is None or topic in self.topics
+
+    def put(self, item: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(RESYNC)
+
+
+class EventBus:
+    def __init__(self, buffer_size: int = SUBSCRIBER_BUFFER):
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._subscribers: set[Subscriber] = set()
+        self._seq = itertools.count(1)
+
+    def subscribe(self, topics: Optional[Iterable[str]] = None) -> Subscriber:
+        sub = Subscriber(asyncio.get_running_loop(), topics, self.buffer_size)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, topic: str, data: Dict[str, Any]):
+        with self._lock:
+            subscribers = [sub for sub in self._subscribers if sub.wants(topic)]
+            item = {"id": next(self._seq), "topic": topic, "data": data}
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.put, item)
+            except RuntimeError:
+                # loop already closed; the stream's finally block will unsubscribe
+                pass
+
+
+event_bus = EventBus()
+
+
+def emit(db: Session, topic: str, data: Dict[str, Any], key: Any = None):
+    # Held on the session until commit; repeated keys within a transaction keep the latest state only.
+    pending = db.info.setdefault("pending_events", {})
+    if key is None:
+        key = object()
+    pending.pop((topic, key), None)
+    pending[(topic, key)] = data
+
+
+def emit_doc(db: Session, doc):
+    emit(
+        db,
+        "doc",
+        {"id": doc.id, "doc_no": doc.doc_no, "doc_type": doc.doc_type, "status": doc.status},
+        key=doc.id,
+    )
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_pending(session: Session):
+    pending = session.info.pop("pending_events", None)
+    if pending:
+        for (topic, _), data in pending.items():
+            event_bus.publish(topic, data)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction):
+    session.info.pop("pending_events", None)
@@ -0,0 +1,166 @@
+﻿from __future__ import annotations
+
+import csv
+import io
+import json
+import zlib
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence
+
+from sqlalchemy import select
+
+from app.core.config import DATA_DIR
+from app.core.fastjson import json_default
+from app.db.session import SessionLocal
+from app.models import ProductSN, StockBalance, StockLedger
+from app.services.archive import iter_ledger_results
+from app.services.jobs import JobContext, job_handler
+from app.services.projections import BALANCE_COLUMNS, LEDGER_COLUMNS, SN_COLUMNS
+
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_DIR = DATA_DIR / "exports"
+FORMATS = {"csv": "csv", "columnar": "cols.jsonl"}
+
+
+class ExportError(Exception):
+    pass
+
+
+@dataclass
+class ExportFilters:
+    warehouse_id: Optional[int] = None
+    product_id: Optional[int] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+
+    def to_params(self) -> Dict[str, Any]:
+        return json.loads(json.dumps(self.__dict__, default=json_default))
+
+    @classmethod
+    def from_params(cls, params: Dict[str, Any]) -> "ExportFilters":
+        return cls(
+            warehouse_id=params.get("warehouse_id"),
+            product_id=params.get("product_id"),
+            date_from=date.fromisoformat(params["date_from"]) if params.get("date_from") else None,
+            date_to=date.fromisoformat(params["date_to"]) if params.get("date_to") else None,
+        )
+
+
+def _statement(dataset: str, filters: ExportFilters):
+    if dataset == "ledger":
+        table, columns, date_column, order = StockLedger, LEDGER_COLUMNS, StockLedger.biz_date, StockLedger.id
+    elif dataset == "balances":
+        table, columns, date_column, order = StockBalance, BALANCE_COLUMNS, None, None
+    elif dataset == "sns":
+        table, columns, date_column, order = ProductSN, SN_COLUMNS, ProductSN.in_date, ProductSN.id
+    else:
+        raise ExportError(f"unknown dataset: {dataset}")
+
+    stmt = select(*columns)
+    if filters.warehouse_id:
+        stmt = stmt.where(table.warehouse_id == filters.warehouse_id)
+    if filters.product_id:
+        stmt = stmt.where(table.product_id == filters.product_id)
+    if date_column is not None and filters.date_from:
+        stmt = stmt.where(date_column >= filters.date_from)
+    if date_column is not None and filters.date_to:
+        stmt = stmt.where(date_column <= filters.date_to)
+    if order is not None:
+        stmt = stmt.order_by(order)
+    return stmt
+
+
+def check_request(dataset: str, fmt: str):
+    if fmt not in FORMATS:
+        raise ExportError(f"unknown format: {fmt}")
+    _statement(dataset, ExportFilters())
+
+
+def iter_chunks(dataset: str, filters: ExportFilters, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    # Yields (column names, rows) chunks; the session reads through the cursor in chunk_rows batches.
+    # Ledger exports reaching into closed periods also read the archive files.
+    with SessionLocal() as db:
+        stmt = _statement(dataset, filters).execution_options(yield_per=chunk_rows)
+        if dataset == "ledger":
+            results = iter_ledger_results(db, stmt, filters.date_from, filters.date_to)
+        else:
+            results = iter([db.execute(stmt)])
+        for result in results:
+            keys = list(result.keys())
+            for rows in result.partitions():
+                if rows:
+                    yield keys, rows
+
+
+def _encode_csv(keys: Sequence[str], rows, header: bool) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(keys)
+    writer.writerows(rows)
+    return buf.getvalue().encode()
+
+
+def _encode_columnar(keys: Sequence[str], rows, header: bool) -> bytes:
+    # One JSON object per chunk holding a value list per column.
+    block = {"columns": list(keys), "rows": len(rows), "data": [list(col) for col in zip(*rows)]}
+    return (json.dumps(block, default=json_default, separators=(",", ":")) + "\n").encode()
+
+
+def iter_export(
+    dataset: str,
+    fmt: str,
+    filters: ExportFilters,
+    compress: bool = True,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> Iterator[bytes]:
+    encode = _encode_csv if fmt == "csv" else _encode_columnar
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    written = 0
+    for keys, rows in iter_chunks(dataset, filters):
+        data = encode(keys, rows, written == 0)
+        written += len(rows)
+        if gz is not None:
+            data = gz.compress(data)
+        if data:
+            yield data
+        if on_progress is not None:
+            on_progress(written)
+    if written == 0 and fmt == "csv":
+        data = _encode_csv(list(_statement(dataset, filters).selected_columns.keys()), [], True)
+        yield gz.compress(data) if gz is not None else data
+    if gz is not None:
+        yield gz.flush()
+
+
+def export_filename(dataset: str, fmt: str, compress: bool = True) -> str:
+    return f"{dataset}.{FORMATS[fmt]}" + (".gz" if compress else "")
+
+
+@job_handler("export", executor="process")
+def export_job(ctx: JobContext):
+    dataset = ctx.params["dataset"]
+    fmt = ctx.params.get("format", "csv")
+    filters = ExportFilters.from_params(ctx.params.get("filters") or {})
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    path = EXPORT_DIR / f"export-{ctx.job_id}-{export_filename(dataset, fmt)}"
+
+    # A resumed export starts over and rewrites the file.
+    progress = {"rows": 0}
+
+    def on_progress(rows: int):
+        progress["rows"] = rows
+        ctx.progress(rows)
+
+    with open(path, "wb") as fh:
+        for data in iter_export(dataset, fmt, filters, on_progress=on_progress):
+            fh.write(data)
+    return {"rows": progress["rows"], "file": path.name}
+
+
+def export_path(name: str):
+    path = (EXPORT_DIR / name).resolve()
+    if path.parent != EXPORT_DIR.resolve() or not path.exists():
+        raise ExportError("export file not found")
+    return path
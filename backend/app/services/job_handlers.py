@@ -0,0 +1,66 @@
+﻿from __future__ import annotations
+
+from datetime import date
+
+from app.db.deps import db_transaction
+from app.db.session import SessionLocal
+from app.services.archive import close_period
+from app.services.jobs import JobContext, job_handler
+from app.services.post_doc import PostError, post_doc
+from app.services.sn_link import SNError, link_sns
+
+SN_IMPORT_CHUNK = 500
+
+
+@job_handler("post_docs")
+def post_docs_job(ctx: JobContext):
+    doc_ids = ctx.params["doc_ids"]
+    state = ctx.checkpoint or {"next": 0, "posted": 0, "errors": {}}
+    ctx.progress(state["next"], total=len(doc_ids))
+
+    for index in range(state["next"], len(doc_ids)):
+        doc_id = doc_ids[index]
+        with SessionLocal() as db:
+            try:
+                with db_transaction(db):
+                    post_doc(db, doc_id, ctx.params.get("user_id"))
+                    # the checkpoint commits with the post, so a resumed job never posts or counts a doc twice
+                    posted = {**state, "next": index + 1, "posted": state["posted"] + 1}
+                    ctx.progress(index + 1, checkpoint=posted, db=db)
+                state = posted
+            except PostError as exc:
+                # nothing was written; a resume may retry the doc and records the same error
+                state["errors"][str(doc_id)] = str(exc)
+                state["next"] = index + 1
+    ctx.progress(state["next"], checkpoint=state)
+    return {"posted": state["posted"], "errors": state["errors"]}
+
+
+@job_handler("import_sns")
+def import_sns_job(ctx: JobContext):
+    doc_id = ctx.params["doc_id"]
+    line_id = ctx.params["line_id"]
+    sns = ctx.params["sns"]
+    offset = (ctx.checkpoint or {}).get("offset", 0)
+    ctx.progress(offset, total=len(sns))
+
+    while offset < len(sns):
+        chunk = sns[offset : offset + SN_IMPORT_CHUNK]
+        with SessionLocal() as db:
+            try:
+                with db_transaction(db):
+                    link_sns(db, doc_id, line_id, chunk)
+            except SNError as exc:
+                raise SNError(f"{exc} (after {offset} imported)") from exc
+        offset += len(chunk)
+        ctx.progress(offset, checkpoint={"offset": offset})
+    return {"imported": len(sns)}
+
+
+@job_handler("close_period")
+def close_period_job(ctx: JobContext):
+    # Resuming re-runs the close; copies are idempotent and the live delete is a single transaction.
+    def on_progress(done: int, total: int):
+        ctx.progress(done, total=total)
+
+    return close_period(date.fromisoformat(ctx.params["cutoff"]), ctx.params.get("user_id"), on_progress)
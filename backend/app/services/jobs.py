@@ -0,0 +1,245 @@
+﻿from __future__ import annotations
+
+import importlib
+import logging
+import threading
+import uuid
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import JOB_HEARTBEAT_SECONDS, JOB_LEASE_SECONDS, JOB_PROCESS_WORKERS, JOB_THREAD_WORKERS
+from app.db.deps import db_transaction
+from app.db.session import SessionLocal, engine
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Modules that register job handlers; imported lazily, and again inside process workers.
+HANDLER_MODULES = ("app.services.job_handlers", "app.services.exports")
+
+
+class JobError(Exception):
+    pass
+
+
+@dataclass
+class JobHandler:
+    fn: Callable[["JobContext"], Optional[Dict[str, Any]]]
+    executor: str = "thread"
+
+
+_handlers: Dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str, executor: str = "thread"):
+    # executor="process" for CPU-bound work; the handler must be a module-level function.
+    def register(fn):
+        _handlers[kind] = JobHandler(fn=fn, executor=executor)
+        return fn
+
+    return register
+
+
+def _load_handlers():
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+def get_handler(kind: str) -> JobHandler:
+    _load_handlers()
+    handler = _handlers.get(kind)
+    if handler is None:
+        raise JobError(f"unknown job kind: {kind}")
+    return handler
+
+
+class JobContext:
+    def __init__(self, job_id: int, params: Dict[str, Any], checkpoint: Optional[Dict[str, Any]], lease_token: str):
+        self.job_id = job_id
+        self.params = params
+        self.checkpoint = checkpoint
+        self.lease_token = lease_token
+
+    def progress(
+        self,
+        done: int,
+        total: Optional[int] = None,
+        checkpoint: Optional[Dict[str, Any]] = None,
+        db: Optional[Session] = None,
+    ):
+        # Call after each committed chunk, or pass the chunk's session to save the resume point in the same
+        # transaction. Raises JobError once another runner has claimed the job (rolling back that chunk).
+        values: Dict[str, Any] = {"progress_done": done, "heartbeat_at": datetime.utcnow()}
+        if total is not None:
+            values["progress_total"] = total
+        if checkpoint is not None:
+            values["checkpoint"] = checkpoint
+        stmt = update(Job).where(Job.id == self.job_id, Job.lease_token == self.lease_token).values(**values)
+        if db is not None:
+            updated = db.execute(stmt).rowcount
+        else:
+            with engine.begin() as conn:
+                updated = conn.execute(stmt).rowcount
+        if not updated:
+            raise JobError(f"job {self.job_id} was claimed by another runner")
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+
+
+def _claim(job_id: int) -> Optional[Job]:
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=JOB_LEASE_SECONDS)
+    with SessionLocal() as db:
+        with db_transaction(db):
+            claimed = db.execute(
+                update(Job)
+                .where(
+                    Job.id == job_id,
+                    or_(
+                        Job.status == "QUEUED",
+                        and_(Job.status == "RUNNING", Job.heartbeat_at < stale_before),
+                    ),
+                )
+                .values(status="RUNNING", started_at=now, heartbeat_at=now, lease_token=uuid.uuid4().hex)
+            ).rowcount
+        if not claimed:
+            return None
+        job = db.get(Job, job_id)
+        db.expunge(job)
+        return job
+
+
+def _finish(job: Job, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+    with engine.begin() as conn:
+        conn.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.lease_token == job.lease_token)
+            .values(status=status, result=result, error=error, finished_at=datetime.utcnow())
+        )
+
+
+def _keep_lease(job: Job, stop: threading.Event):
+    # One step of a handler (e.g. archiving a month) can outlast the lease between progress() calls;
+    # without this another worker would take the job for abandoned and run it a second time. The token
+    # stops a stalled runner from extending the lease of whoever claimed the job after it.
+    while not stop.wait(JOB_HEARTBEAT_SECONDS):
+        try:
+            with engine.begin() as conn:
+                renewed = conn.execute(
+                    update(Job)
+                    .where(Job.id == job.id, Job.status == "RUNNING", Job.lease_token == job.lease_token)
+                    .values(heartbeat_at=datetime.utcnow())
+                ).rowcount
+            if not renewed:
+                return
+        except Exception:
+            logger.exception("job %s lease renewal failed", job.id)
+
+
+def run_job(job_id: int):
+    job = _claim(job_id)
+    if job is None:
+        return
+    stop = threading.Event()
+    threading.Thread(target=_keep_lease, args=(job, stop), name=f"job-{job.id}-lease", daemon=True).start()
+    try:
+        handler = get_handler(job.kind)
+        result = handler.fn(JobContext(job.id, job.params or {}, job.checkpoint, job.lease_token))
+    except Exception as exc:
+        logger.exception("job %s (%s) failed", job.id, job.kind)
+        _finish(job, "FAILED", error=str(exc)[:1000])
+    else:
+        _finish(job, "DONE", result=result)
+    finally:
+        stop.set()
+
+
+def _process_initializer():
+    # Connections inherited from the parent must not be reused in the child.
+    engine.dispose(close=False)
+
+
+class JobRunner:
+    def __init__(self, thread_workers: int = JOB_THREAD_WORKERS, process_workers: int = JOB_PROCESS_WORKERS):
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self._lock = threading.Lock()
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[Executor] = None
+        self._stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+
+    def _executor(self, kind: str) -> Executor:
+        with self._lock:
+            if get_handler(kind).executor == "process":
+                if self._processes is None:
+                    # imported here: multiprocessing is only needed once a process job runs
+                    import multiprocessing
+                    from concurrent.futures import ProcessPoolExecutor
+
+                    self._processes = ProcessPoolExecutor(
+                        max_workers=self.process_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_process_initializer,
+                    )
+                return self._processes
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="job")
+            return self._threads
+
+    def dispatch(self, job: Job):
+        self._executor(job.kind).submit(run_job, job.id)
+
+    def resume(self):
+        # Queued jobs, plus running ones whose worker stopped renewing the lease (e.g. after a restart).
+        stale_before = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+        with SessionLocal() as db:
+            jobs = db.execute(
+                select(Job).where(
+                    or_(
+                        Job.status == "QUEUED",
+                        and_(Job.status == "RUNNING", Job.heartbeat_at < stale_before),
+                    )
+                )
+            ).scalars().all()
+            for job in jobs:
+                self.dispatch(job)
+
+    def _sweep(self):
+        while not self._stop.wait(JOB_LEASE_SECONDS):
+            try:
+                self.resume()
+            except Exception:
+                logger.exception("job sweep failed")
+
+    def start(self):
+        self._stop.clear()
+        self.resume()
+        self._sweeper = threading.Thread(target=self._sweep, name="job-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def shutdown(self):
+        self._stop.set()
+        with self._lock:
+            for executor in (self._threads, self._processes):
+                if executor is not None:
+                    executor.shutdown(wait=False, cancel_futures=True)
+            self._threads = self._processes = None
+
+
+job_runner = JobRunner()
+
+
+def submit_job(db: Session, kind: str, params: Dict[str, Any], user_id: Optional[int] = None) -> Job:
+    get_handler(kind)
+    with db_transaction(db):
+        job = Job(kind=kind, status="QUEUED", params=params, created_by=user_id, created_at=datetime.utcnow())
+        db.add(job)
+    db.refresh(job)
+    job_runner.dispatch(job)
+    return job
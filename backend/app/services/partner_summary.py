@@ -0,0 +1,130 @@
+﻿from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import Integer, cast, func, select, type_coerce, update
+from sqlalchemy.dialects.sqlite import insert as upsert
+from sqlalchemy.orm import Session
+
+from app.db.types import SCALE, Hundredths
+from app.models import Doc, DocLine, PartnerSummary
+
+SummaryKey = Tuple[int, str, str]
+
+
+def line_amount():
+    # a line without amount is valued at qty * unit_price; that product of two hundredths is
+    # scaled back down (rounded half away from zero) before it joins the stored amounts
+    product = type_coerce(DocLine.qty, Integer) * type_coerce(DocLine.unit_price, Integer)
+    priced = type_coerce(cast(func.round(product / float(SCALE)), Integer), Hundredths())
+    return func.coalesce(DocLine.amount, priced, 0)
+
+
+def doc_amount():
+    # correlated per-doc total, for selects over docs
+    return (
+        select(func.coalesce(func.sum(line_amount()), 0))
+        .where(DocLine.doc_id == Doc.id)
+        .correlate(Doc)
+        .scalar_subquery()
+    )
+
+
+def _period_bounds(period: str) -> Tuple[date, date]:
+    year, month = int(period[:4]), int(period[4:])
+    start = date(year, month, 1)
+    end = date(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+
+def _doc_rows(db: Session, doc_ids: Sequence[int]):
+    return db.execute(
+        select(Doc.partner_id, Doc.doc_type, Doc.biz_date, Doc.status, doc_amount()).where(
+            Doc.id.in_(doc_ids), Doc.partner_id.is_not(None), Doc.status != "VOID"
+        )
+    ).all()
+
+
+def _apply(db: Session, doc_ids: Sequence[int], sign: int) -> Dict[SummaryKey, date]:
+    # One upsert for the docs' contributions; returns the latest biz_date per summary row touched.
+    totals: Dict[SummaryKey, list] = {}
+    latest: Dict[SummaryKey, date] = {}
+    for partner_id, doc_type, biz_date, status, amount in _doc_rows(db, doc_ids):
+        key = (partner_id, doc_type, f"{biz_date:%Y%m}")
+        total = totals.setdefault(key, [0, Decimal(0), 0, Decimal(0)])
+        offset = 2 if status == "POSTED" else 0
+        total[offset] += sign
+        total[offset + 1] += sign * Decimal(str(amount))
+        latest[key] = max(latest.get(key, biz_date), biz_date)
+    if not totals:
+        return latest
+
+    stmt = upsert(PartnerSummary)
+    existing_date, new_date = PartnerSummary.last_biz_date, stmt.excluded.last_biz_date
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PartnerSummary.partner_id, PartnerSummary.doc_type, PartnerSummary.period],
+        set_={
+            "open_count": PartnerSummary.open_count + stmt.excluded.open_count,
+            "open_amount": PartnerSummary.open_amount + stmt.excluded.open_amount,
+            "posted_count": PartnerSummary.posted_count + stmt.excluded.posted_count,
+            "posted_amount": PartnerSummary.posted_amount + stmt.excluded.posted_amount,
+            # two-argument max() is NULL if either side is
+            "last_biz_date": func.max(func.coalesce(existing_date, new_date), func.coalesce(new_date, existing_date)),
+        },
+    )
+    db.execute(
+        stmt,
+        [
+            {
+                "partner_id": partner_id,
+                "doc_type": doc_type,
+                "period": period,
+                "open_count": open_count,
+                "open_amount": open_amount,
+                "posted_count": posted_count,
+                "posted_amount": posted_amount,
+                "last_biz_date": latest[(partner_id, doc_type, period)] if sign > 0 else None,
+            }
+            for (partner_id, doc_type, period), (open_count, open_amount, posted_count, posted_amount) in totals.items()
+        ],
+    )
+    return latest
+
+
+def track_docs(db: Session, doc_ids: Sequence[int]):
+    # Adds docs as they are now; pair with untrack_docs around any change to partner, type, date,
+    # status or line amounts. VOID docs and docs without a partner are not counted.
+    _apply(db, doc_ids, 1)
+
+
+def untrack_docs(db: Session, doc_ids: Sequence[int]):
+    # Removes the docs' current contribution. last_biz_date is re-read from the other docs of the
+    # month only where a removed doc held it (ix_docs_partner_date).
+    removed: List[int] = list(doc_ids)
+    for (partner_id, doc_type, period), biz_date in _apply(db, removed, -1).items():
+        start, end = _period_bounds(period)
+        remaining = (
+            select(func.max(Doc.biz_date))
+            .where(
+                Doc.partner_id == partner_id,
+                Doc.biz_date >= start,
+                Doc.biz_date < end,
+                Doc.doc_type == doc_type,
+                Doc.status != "VOID",
+                Doc.id.not_in(removed),
+            )
+            .scalar_subquery()
+        )
+        db.execute(
+            update(PartnerSummary)
+            .where(
+                PartnerSummary.partner_id == partner_id,
+                PartnerSummary.doc_type == doc_type,
+                PartnerSummary.period == period,
+                PartnerSummary.last_biz_date <= biz_date,
+            )
+            .values(last_biz_date=remaining)
+            .execution_options(synchronize_session=False)
+        )
@@ -0,0 +1,154 @@
+﻿from __future__ import annotations
+
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Doc, DocLine, DocLineSN, Product, ProductSN, StockBalance
+from app.services.closing import closed_through
+from app.services.returns import RETURN_TYPES, return_problems
+from app.services.stocktake import STOCKTAKE
+
+OPEN_STATUSES = ("DRAFT", "APPROVED")
+
+# doc type -> serial states a line may carry when posting; outbound serials must also be in the source warehouse
+SN_STATES = {
+    "PURCHASE_IN": ("LOCKED", "IN_STOCK"),
+    "SALES_OUT": ("IN_STOCK",),
+    "TRANSFER": ("IN_STOCK",),
+}
+
+
+def _line_whs(doc: Doc, line: DocLine) -> Tuple:
+    return line.from_wh_id or doc.from_wh_id, line.to_wh_id or doc.to_wh_id
+
+
+def line_problems(db: Session, doc: Doc, lines: Sequence[DocLine]) -> List[dict]:
+    # Validates every line of a PURCHASE_IN / SALES_OUT / TRANSFER in a fixed number of queries
+    # (products, balances, serials) and returns all problems in line order. Outbound quantities are
+    # summed per warehouse and product, so two lines drawing on the same balance are checked together;
+    # a shortfall is reported once, on the first of those lines.
+    lines = sorted(lines, key=lambda line: line.line_no)
+    doc_products = select(DocLine.product_id).where(DocLine.doc_id == doc.id)
+    products = dict(db.execute(select(Product.id, Product.track_sn).where(Product.id.in_(doc_products))).all())
+    outbound = doc.doc_type in ("SALES_OUT", "TRANSFER")
+
+    demand: Dict[Tuple[int, int], Decimal] = defaultdict(Decimal)
+    first_line: Dict[Tuple[int, int], int] = {}
+    for line in lines:
+        from_wh, _ = _line_whs(doc, line)
+        if outbound and from_wh and line.product_id in products:
+            key = (from_wh, line.product_id)
+            demand[key] += line.qty
+            first_line.setdefault(key, line.id)
+    available: Dict[Tuple[int, int], Decimal] = {}
+    if demand:
+        available = {
+            (wh_id, product_id): qty
+            for wh_id, product_id, qty in db.execute(
+                select(StockBalance.warehouse_id, StockBalance.product_id, StockBalance.qty_on_hand).where(
+                    StockBalance.product_id.in_(doc_products),
+                    StockBalance.warehouse_id.in_({wh_id for wh_id, _ in demand}),
+                )
+            ).all()
+        }
+
+    linked: Dict[int, List] = defaultdict(list)
+    if any(products.values()):
+        for row in db.execute(
+            select(DocLineSN.line_id, ProductSN.sn, ProductSN.status, ProductSN.warehouse_id)
+            .join(ProductSN, ProductSN.id == DocLineSN.sn_id)
+            .where(DocLineSN.doc_id == doc.id)
+            .order_by(DocLineSN.line_id, ProductSN.sn)
+        ).all():
+            linked[row.line_id].append(row)
+
+    problems: List[dict] = []
+    for line in lines:
+        where = {"line_no": line.line_no, "product_id": line.product_id}
+        if line.product_id not in products:
+            problems.append({"code": "product", "message": "product not found", **where})
+            continue
+        from_wh, to_wh = _line_whs(doc, line)
+        if doc.doc_type == "PURCHASE_IN" and not to_wh:
+            problems.append({"code": "warehouse", "message": "to_wh_id required", **where})
+            continue
+        if doc.doc_type == "SALES_OUT" and not from_wh:
+            problems.append({"code": "warehouse", "message": "from_wh_id required", **where})
+            continue
+        if doc.doc_type == "TRANSFER" and (not from_wh or not to_wh or from_wh == to_wh):
+            problems.append({"code": "warehouse", "message": "invalid transfer warehouses", **where})
+            continue
+        if doc.doc_type not in SN_STATES:
+            continue
+
+        key = (from_wh, line.product_id)
+        if outbound and first_line.get(key) == line.id:
+            on_hand = available.get(key, Decimal(0))
+            if on_hand < demand[key]:
+                problems.append(
+                    {
+                        "code": "shortfall",
+                        "message": "insufficient stock",
+                        "warehouse_id": from_wh,
+                        "required": demand[key],
+                        "available": on_hand,
+                        **where,
+                    }
+                )
+
+        if not products[line.product_id]:
+            continue
+        sns = linked.get(line.id, [])
+        if len(sns) != line.qty:
+            problems.append(
+                {
+                    "code": "sn_count",
+                    "message": "SN count must equal qty",
+                    "required": line.qty,
+                    "available": len(sns),
+                    **where,
+                }
+            )
+        for sn in sns:
+            if sn.status in SN_STATES[doc.doc_type] and (not outbound or sn.warehouse_id == from_wh):
+                continue
+            problems.append(
+                {
+                    "code": "sn",
+                    "message": "sn not in stock" if outbound else "sn status invalid",
+                    "sn": sn.sn,
+                    "sn_status": sn.status,
+                    "sn_warehouse_id": sn.warehouse_id,
+                    **where,
+                }
+            )
+    return problems
+
+
+def check_doc(db: Session, doc: Doc) -> dict:
+    # Dry run of post_doc: read-only, so it runs on a plain session without taking the write lock,
+    # and reports every problem instead of stopping at the first.
+    problems: List[dict] = []
+    if doc.status not in OPEN_STATUSES:
+        problems.append({"code": "status", "message": f"doc is {doc.status}"})
+    closed = closed_through(db)
+    if closed is not None and doc.biz_date < closed:
+        problems.append({"code": "period", "message": f"period closed through {closed.isoformat()}"})
+    # stocktake lines come from the count snapshot at posting time; only the header checks apply
+    if not problems and doc.doc_type != STOCKTAKE:
+        lines = db.execute(select(DocLine).where(DocLine.doc_id == doc.id)).scalars().all()
+        if doc.doc_type in RETURN_TYPES:
+            problems = return_problems(db, doc, lines)
+        else:
+            problems = line_problems(db, doc, lines)
+    return {
+        "doc_id": doc.id,
+        "doc_type": doc.doc_type,
+        "status": doc.status,
+        "ok": not problems,
+        "problems": problems,
+    }
@@ -1,27 +1,25 @@
 ﻿from __future__ import annotations
 
 from datetime import datetime, timedelta
-from typing import Iterable
 
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.models import Doc, DocLine, Product, StockBalance, StockLedger, ProductSN, DocLineSN
+from app.services.closing import closed_through
+from app.services.events import emit, emit_doc
+from app.services.partner_summary import track_docs, untrack_docs
+from app.services.post_check import line_problems
+from app.services.returns import RETURN_TYPES, ReturnError, post_return
+from app.services.stock_alerts import check_threshold
+from app.services.stocktake import STOCKTAKE, StocktakeError, post_stocktake
+from app.services.warranty import add_expiring
 
 
 class PostError(Exception):
     pass
 
 
-def _get_balance(db: Session, wh_id: int, product_id: int):
-    stmt = select(StockBalance).where(
-        StockBalance.warehouse_id == wh_id,
-        StockBalance.product_id == product_id,
-    )
-    balance = db.execute(stmt).scalar_one_or_none()
-    return balance.qty_on_hand if balance else 0
-
-
 def _inc_balance(db: Session, wh_id: int, product_id: int, qty):
     stmt = select(StockBalance).where(
         StockBalance.warehouse_id == wh_id,
@@ -32,6 +30,13 @@ def _inc_balance(db: Session, wh_id: int, product_id: int, qty):
         balance = StockBalance(warehouse_id=wh_id, product_id=product_id, qty_on_hand=0)
         db.add(balance)
     balance.qty_on_hand = balance.qty_on_hand + qty
+    check_threshold(db, wh_id, product_id, balance.qty_on_hand)
+    emit(
+        db,
+        "balance",
+        {"warehouse_id": wh_id, "product_id": product_id, "qty_on_hand": float(balance.qty_on_hand)},
+        key=(wh_id, product_id),
+    )
 
 
 def _dec_balance(db: Session, wh_id: int, product_id: int, qty):
@@ -59,11 +64,6 @@ def _load_line_sns(db: Session, line_id: int):
     return list(db.execute(stmt).scalars().all())
 
 
-def _ensure_sn_count(line: DocLine, sns: Iterable[ProductSN]):
-    if len(list(sns)) != int(line.qty):
-        raise PostError("SN count must equal qty")
-
-
 def post_doc(db: Session, doc_id: int, user_id: int):
     doc = db.get(Doc, doc_id)
     if doc is None:
@@ -75,51 +75,31 @@ def post_doc(db: Session, doc_id: int, user_id: int):
     if doc.status not in ("APPROVED", "DRAFT"):
         raise PostError("doc status not allowed")
 
-    lines = db.execute(select(DocLine).where(DocLine.doc_id == doc_id)).scalars().all()
-
-    # 1) validations
-    for line in lines:
-        product = db.get(Product, line.product_id)
-        if product is None:
-            raise PostError("product not found")
+    closed = closed_through(db)
+    if closed is not None and doc.biz_date < closed:
+        raise PostError(f"period closed through {closed.isoformat()}")
+
+    if doc.doc_type == STOCKTAKE:
+        # lines are generated from the count snapshot rather than entered
+        try:
+            post_stocktake(db, doc)
+        except StocktakeError as exc:
+            raise PostError(str(exc)) from exc
+        return _mark_posted(db, doc, user_id)
+
+    if doc.doc_type in RETURN_TYPES:
+        try:
+            post_return(db, doc)
+        except ReturnError as exc:
+            raise PostError(str(exc)) from exc
+        return _mark_posted(db, doc, user_id)
 
-        if doc.doc_type == "PURCHASE_IN":
-            wh = line.to_wh_id or doc.to_wh_id
-            if not wh:
-                raise PostError("to_wh_id required")
-            if product.track_sn:
-                sns = _load_line_sns(db, line.id)
-                _ensure_sn_count(line, sns)
-                for sn in sns:
-                    if sn.status not in ("LOCKED", "IN_STOCK"):
-                        raise PostError("sn status invalid")
+    lines = db.execute(select(DocLine).where(DocLine.doc_id == doc_id)).scalars().all()
 
-        if doc.doc_type == "SALES_OUT":
-            wh = line.from_wh_id or doc.from_wh_id
-            if not wh:
-                raise PostError("from_wh_id required")
-            if _get_balance(db, wh, line.product_id) < line.qty:
-                raise PostError("insufficient stock")
-            if product.track_sn:
-                sns = _load_line_sns(db, line.id)
-                _ensure_sn_count(line, sns)
-                for sn in sns:
-                    if sn.status != "IN_STOCK" or sn.warehouse_id != wh:
-                        raise PostError("sn not in stock")
-
-        if doc.doc_type == "TRANSFER":
-            from_wh = line.from_wh_id or doc.from_wh_id
-            to_wh = line.to_wh_id or doc.to_wh_id
-            if not from_wh or not to_wh or from_wh == to_wh:
-                raise PostError("invalid transfer warehouses")
-            if _get_balance(db, from_wh, line.product_id) < line.qty:
-                raise PostError("insufficient stock")
-            if product.track_sn:
-                sns = _load_line_sns(db, line.id)
-                _ensure_sn_count(line, sns)
-                for sn in sns:
-                    if sn.status != "IN_STOCK" or sn.warehouse_id != from_wh:
-                        raise PostError("sn not in stock")
+    # 1) validations: all lines in batched queries, shared with the dry run (GET /api/docs/{id}/check)
+    problems = line_problems(db, doc, lines)
+    if problems:
+        raise PostError(problems[0]["message"])
 
     # 2) apply
     for line in lines:
@@ -142,15 +122,21 @@ def post_doc(db: Session, doc_id: int, user_id: int):
             _add_ledger(db, wh, line, doc, in_qty=0, out_qty=line.qty)
             _dec_balance(db, wh, line.product_id, line.qty)
             if product.track_sn:
-                for sn in _load_line_sns(db, line.id):
+                warranty_end = None
+                if product.warranty_months:
+                    warranty_end = doc.biz_date + timedelta(days=30 * product.warranty_months)
+                sns = _load_line_sns(db, line.id)
+                for sn in sns:
                     sn.status = "OUT_STOCK"
                     sn.warehouse_id = wh
                     sn.out_doc_id = doc.id
                     sn.out_line_id = line.id
                     sn.out_date = doc.biz_date
                     sn.warranty_start = doc.biz_date
-                    if product.warranty_months:
-                        sn.warranty_end = doc.biz_date + timedelta(days=30 * product.warranty_months)
+                    if warranty_end:
+                        sn.warranty_end = warranty_end
+                if warranty_end and sns:
+                    add_expiring(db, warranty_end, doc.partner_id, product.id, len(sns))
 
         elif doc.doc_type == "TRANSFER":
             from_wh = line.from_wh_id or doc.from_wh_id
@@ -164,7 +150,15 @@ def post_doc(db: Session, doc_id: int, user_id: int):
                     sn.status = "IN_STOCK"
                     sn.warehouse_id = to_wh
 
+    return _mark_posted(db, doc, user_id)
+
+
+def _mark_posted(db: Session, doc: Doc, user_id: int) -> Doc:
+    untrack_docs(db, [doc.id])
     doc.status = "POSTED"
     doc.posted_by = user_id
     doc.posted_at = datetime.utcnow()
+    db.flush()
+    track_docs(db, [doc.id])
+    emit_doc(db, doc)
     return doc
@@ -0,0 +1,108 @@
+﻿from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from app.core.config import PRODUCT_LOOKUP_SYNC_SECONDS
+from app.models import CacheGeneration, Product
+
+# the response-cache namespace the product routes bump
+GENERATION_NAMESPACE = "products"
+
+
+@dataclass(frozen=True)
+class ProductRef:
+    id: int
+    track_sn: bool
+
+
+class ProductLookup:
+    # Process-local barcode/SKU -> product table for scanners; a hit costs no query. The product routes
+    # patch it in the worker that made the change. Other workers compare the shared "products" generation
+    # (cache_generations) at most every sync_seconds and reload when it moved, so they may resolve a
+    # replaced code for up to that long. One thread rebuilds the table outside the lock and swaps it in;
+    # scans meanwhile use the old one. A miss falls back to the indexed columns.
+    def __init__(self, sync_seconds: float = PRODUCT_LOOKUP_SYNC_SECONDS):
+        self.sync_seconds = sync_seconds
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._codes: Optional[Dict[str, ProductRef]] = None
+        self._by_id: Dict[int, tuple] = {}
+        self._generation: Optional[int] = None
+        self._checked_at = float("-inf")
+
+    def _build(self, db: Session) -> Tuple[Dict[str, ProductRef], Dict[int, tuple]]:
+        codes: Dict[str, ProductRef] = {}
+        by_id: Dict[int, tuple] = {}
+        for product_id, sku, barcode, track_sn in db.execute(
+            select(Product.id, Product.sku, Product.barcode, Product.track_sn)
+        ).all():
+            ref = ProductRef(product_id, bool(track_sn))
+            keys = tuple(code for code in (barcode, sku) if code)
+            for code in keys:
+                codes.setdefault(code, ref)
+            by_id[product_id] = keys
+        return codes, by_id
+
+    def _refresh(self, db: Session):
+        # the first load is waited for; after that a scan arriving mid-refresh keeps the current table
+        if not self._refreshing.acquire(blocking=self._codes is None):
+            return
+        try:
+            if self._codes is not None and time.monotonic() - self._checked_at < self.sync_seconds:
+                return
+            self._checked_at = time.monotonic()
+            # read before building: a change committed during the build moves it again and is reloaded next time
+            generation = db.execute(
+                select(CacheGeneration.generation).where(CacheGeneration.namespace == GENERATION_NAMESPACE)
+            ).scalar()
+            generation = generation or 0
+            if self._codes is not None and generation == self._generation:
+                return
+            codes, by_id = self._build(db)
+            with self._lock:
+                self._codes, self._by_id, self._generation = codes, by_id, generation
+        finally:
+            self._refreshing.release()
+
+    def put(self, product: Product):
+        with self._lock:
+            if self._codes is None:
+                return
+            for code in self._by_id.pop(product.id, ()):
+                current = self._codes.get(code)
+                if current is not None and current.id == product.id:
+                    del self._codes[code]
+            ref = ProductRef(product.id, bool(product.track_sn))
+            keys = tuple(code for code in (product.barcode, product.sku) if code)
+            for code in keys:
+                self._codes[code] = ref
+            self._by_id[product.id] = keys
+
+    def resolve(self, db: Session, code: str) -> Optional[ProductRef]:
+        if self._codes is None or time.monotonic() - self._checked_at >= self.sync_seconds:
+            self._refresh(db)
+        with self._lock:
+            ref = self._codes.get(code)
+        if ref is not None:
+            return ref
+        # barcode first, like the table above
+        row = db.execute(
+            select(Product.id, Product.track_sn)
+            .where(or_(Product.barcode == code, Product.sku == code))
+            .order_by((Product.barcode == code).desc())
+            .limit(1)
+        ).first()
+        if row is None:
+            return None
+        product = db.get(Product, row.id)
+        self.put(product)
+        return ProductRef(row.id, bool(row.track_sn))
+
+
+product_lookup = ProductLookup()
@@ -0,0 +1,42 @@
+﻿from __future__ import annotations
+
+from app.core.fastjson import raw_date, raw_number
+from app.models import ProductSN, StockBalance, StockLedger
+
+# Column projections for large read paths (list endpoints and exports); rows are
+# encoded directly instead of being hydrated into ORM objects.
+LEDGER_COLUMNS = (
+    StockLedger.id,
+    StockLedger.warehouse_id,
+    StockLedger.product_id,
+    StockLedger.ref_doc_id,
+    StockLedger.ref_line_id,
+    StockLedger.ref_type,
+    raw_date(StockLedger.biz_date),
+    raw_number(StockLedger.in_qty),
+    raw_number(StockLedger.out_qty),
+    raw_number(StockLedger.unit_cost),
+    StockLedger.created_at,
+)
+
+BALANCE_COLUMNS = (
+    StockBalance.warehouse_id,
+    StockBalance.product_id,
+    raw_number(StockBalance.qty_on_hand),
+)
+
+SN_COLUMNS = (
+    ProductSN.id,
+    ProductSN.product_id,
+    ProductSN.sn,
+    ProductSN.status,
+    ProductSN.warehouse_id,
+    ProductSN.in_doc_id,
+    ProductSN.in_line_id,
+    raw_date(ProductSN.in_date),
+    ProductSN.out_doc_id,
+    ProductSN.out_line_id,
+    raw_date(ProductSN.out_date),
+    raw_date(ProductSN.warranty_start),
+    raw_date(ProductSN.warranty_end),
+)
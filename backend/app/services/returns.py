@@ -0,0 +1,254 @@
+﻿from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Doc, DocLine, DocLineSN, Product, ProductSN, StockBalance, StockLedger
+from app.services.stock_writes import add_ledger_rows, apply_balance_deltas
+from app.services.warranty import release_expiring
+
+# return type -> type of the document it returns against
+RETURN_TYPES = {"SALES_RETURN": "SALES_OUT", "PURCHASE_RETURN": "PURCHASE_IN"}
+
+
+class ReturnError(Exception):
+    pass
+
+
+def _line_wh(doc: Doc, line: DocLine):
+    if doc.doc_type == "SALES_RETURN":
+        return line.to_wh_id or doc.to_wh_id
+    return line.from_wh_id or doc.from_wh_id
+
+
+def returnable_qty(db: Session, original: Doc, return_type: str) -> Dict[int, Decimal]:
+    # Per product: quantity the original moved minus what posted returns already took back, summed
+    # from the ledger rows of those docs in one aggregate (per archive file once the period is closed).
+    return_ids = db.execute(
+        select(Doc.id).where(Doc.ref_doc_id == original.id, Doc.doc_type == return_type, Doc.status == "POSTED")
+    ).scalars().all()
+    if original.doc_type == "SALES_OUT":
+        moved, back = StockLedger.out_qty, StockLedger.in_qty
+    else:
+        moved, back = StockLedger.in_qty, StockLedger.out_qty
+    stmt = (
+        select(
+            StockLedger.product_id,
+            func.sum(case((StockLedger.ref_doc_id == original.id, moved), else_=0)),
+            func.sum(case((StockLedger.ref_doc_id != original.id, back), else_=0)),
+        )
+        .where(StockLedger.ref_doc_id.in_([original.id, *return_ids]))
+        .group_by(StockLedger.product_id)
+    )
+    # imported here: the archive machinery is only loaded once a return or ledger read needs it
+    from app.services.archive import iter_ledger_results
+
+    available: Dict[int, Decimal] = defaultdict(Decimal)
+    for result in iter_ledger_results(db, stmt, date_from=original.biz_date):
+        for product_id, moved_qty, back_qty in result:
+            available[product_id] += Decimal(str(moved_qty or 0)) - Decimal(str(back_qty or 0))
+    return available
+
+
+def return_problems(db: Session, doc: Doc, lines: List[DocLine]) -> List[dict]:
+    # Everything that blocks posting the return, in line order; a ref doc that cannot be returned
+    # against is reported on its own since the other checks depend on it.
+    sales = doc.doc_type == "SALES_RETURN"
+    original_type = RETURN_TYPES[doc.doc_type]
+    original = db.get(Doc, doc.ref_doc_id) if doc.ref_doc_id else None
+    if original is None:
+        return [{"code": "ref_doc", "message": "ref_doc_id required"}]
+    if original.doc_type != original_type or original.status != "POSTED":
+        return [{"code": "ref_doc", "message": f"ref doc must be a posted {original_type}"}]
+    if doc.biz_date < original.biz_date:
+        return [{"code": "ref_doc", "message": "return dated before the original doc"}]
+    if not lines:
+        return [{"code": "lines", "message": "lines required"}]
+    products = {
+        product.id: product
+        for product in db.execute(
+            select(Product).where(Product.id.in_({line.product_id for line in lines}))
+        ).scalars().all()
+    }
+
+    problems: List[dict] = []
+    requested: Dict[int, Decimal] = defaultdict(Decimal)
+    # purchase returns take stock out of from_wh: quantities per (warehouse, product) and their first line
+    outgoing: Dict[Tuple[int, int], Decimal] = defaultdict(Decimal)
+    first_line: Dict[Tuple[int, int], int] = {}
+    for line in lines:
+        where = {"line_no": line.line_no, "product_id": line.product_id}
+        if line.product_id not in products:
+            problems.append({"code": "product", "message": "product not found", **where})
+            continue
+        wh_id = _line_wh(doc, line)
+        if not wh_id:
+            message = "to_wh_id required" if sales else "from_wh_id required"
+            problems.append({"code": "warehouse", "message": message, **where})
+        elif not sales:
+            outgoing[(wh_id, line.product_id)] += Decimal(str(line.qty))
+            first_line.setdefault((wh_id, line.product_id), line.line_no)
+        requested[line.product_id] += Decimal(str(line.qty))
+    available = returnable_qty(db, original, doc.doc_type)
+    for product_id, qty in requested.items():
+        if qty > available.get(product_id, 0):
+            problems.append(
+                {
+                    "code": "return_exceeds",
+                    "message": f"return exceeds qty posted on {original.doc_no}: product {product_id}",
+                    "product_id": product_id,
+                    "required": qty,
+                    "available": available.get(product_id, Decimal(0)),
+                }
+            )
+    if outgoing:
+        on_hand = {
+            (wh_id, product_id): qty
+            for wh_id, product_id, qty in db.execute(
+                select(StockBalance.warehouse_id, StockBalance.product_id, StockBalance.qty_on_hand).where(
+                    StockBalance.product_id.in_({product_id for _, product_id in outgoing}),
+                    StockBalance.warehouse_id.in_({wh_id for wh_id, _ in outgoing}),
+                )
+            ).all()
+        }
+        for (wh_id, product_id), qty in outgoing.items():
+            if qty > on_hand.get((wh_id, product_id), 0):
+                problems.append(
+                    {
+                        "code": "shortfall",
+                        "message": "insufficient stock",
+                        "line_no": first_line[(wh_id, product_id)],
+                        "product_id": product_id,
+                        "warehouse_id": wh_id,
+                        "required": qty,
+                        "available": on_hand.get((wh_id, product_id), Decimal(0)),
+                    }
+                )
+
+    linked: Dict[int, List] = defaultdict(list)
+    for row in db.execute(
+        select(
+            DocLineSN.line_id,
+            ProductSN.sn,
+            ProductSN.status,
+            ProductSN.warehouse_id,
+            ProductSN.in_doc_id,
+            ProductSN.out_doc_id,
+        )
+        .join(ProductSN, ProductSN.id == DocLineSN.sn_id)
+        .where(DocLineSN.doc_id == doc.id)
+    ).all():
+        linked[row.line_id].append(row)
+    for line in lines:
+        product = products.get(line.product_id)
+        if product is None or not product.track_sn:
+            continue
+        sns = linked.get(line.id, [])
+        if len(sns) != line.qty:
+            problems.append(
+                {
+                    "code": "sn_count",
+                    "message": "SN count must equal qty",
+                    "line_no": line.line_no,
+                    "product_id": line.product_id,
+                    "required": line.qty,
+                    "available": len(sns),
+                }
+            )
+        for sn in sns:
+            if sales:
+                valid = sn.status == "OUT_STOCK" and sn.out_doc_id == original.id
+            else:
+                valid = sn.status == "IN_STOCK" and sn.in_doc_id == original.id and sn.warehouse_id == _line_wh(doc, line)
+            if not valid:
+                problems.append(
+                    {
+                        "code": "sn",
+                        "message": f"sn not from {original.doc_no}",
+                        "line_no": line.line_no,
+                        "product_id": line.product_id,
+                        "sn": sn.sn,
+                        "sn_status": sn.status,
+                        "sn_warehouse_id": sn.warehouse_id,
+                    }
+                )
+    return problems
+
+
+def post_return(db: Session, doc: Doc):
+    sales = doc.doc_type == "SALES_RETURN"
+    lines = db.execute(select(DocLine).where(DocLine.doc_id == doc.id)).scalars().all()
+
+    # 1) validations: ref doc, warehouses, quantities against the original, serials
+    problems = return_problems(db, doc, lines)
+    if problems:
+        raise ReturnError(problems[0]["message"])
+    original = db.get(Doc, doc.ref_doc_id)
+
+    # 2) apply: ledger and balances in bulk
+    now = datetime.utcnow()
+    add_ledger_rows(
+        db,
+        [
+            {
+                "warehouse_id": _line_wh(doc, line),
+                "product_id": line.product_id,
+                "ref_doc_id": doc.id,
+                "ref_line_id": line.id,
+                "ref_type": doc.doc_type,
+                "biz_date": doc.biz_date,
+                "in_qty": line.qty if sales else 0,
+                "out_qty": 0 if sales else line.qty,
+                "created_at": now,
+            }
+            for line in lines
+        ],
+    )
+    levels = apply_balance_deltas(
+        db, [((_line_wh(doc, line), line.product_id), line.qty if sales else -line.qty) for line in lines]
+    )
+    short = sorted(product_id for (_, product_id), qty in levels.items() if qty < 0)
+    if short:
+        raise ReturnError(f"insufficient stock: products {short[:20]}")
+
+    # 3) serials: one UPDATE for the whole doc
+    sn_ids = select(DocLineSN.sn_id).where(DocLineSN.doc_id == doc.id)
+    if sales:
+        release_expiring(db, sn_ids, original.partner_id)
+        line_wh = (
+            select(func.coalesce(DocLine.to_wh_id, doc.to_wh_id))
+            .join(DocLineSN, DocLineSN.line_id == DocLine.id)
+            .where(DocLineSN.doc_id == doc.id, DocLineSN.sn_id == ProductSN.id)
+            .scalar_subquery()
+        )
+        db.execute(
+            update(ProductSN)
+            .where(ProductSN.id.in_(sn_ids))
+            .values(
+                status="IN_STOCK",
+                warehouse_id=line_wh,
+                out_doc_id=None,
+                out_line_id=None,
+                out_date=None,
+                warranty_start=None,
+                warranty_end=None,
+            )
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        line_id = (
+            select(DocLineSN.line_id)
+            .where(DocLineSN.doc_id == doc.id, DocLineSN.sn_id == ProductSN.id)
+            .scalar_subquery()
+        )
+        db.execute(
+            update(ProductSN)
+            .where(ProductSN.id.in_(sn_ids))
+            .values(status="RETURNED", out_doc_id=doc.id, out_line_id=line_id, out_date=doc.biz_date)
+            .execution_options(synchronize_session=False)
+        )
@@ -0,0 +1,225 @@
+﻿from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, func, insert, literal, not_, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Doc, DocLine, DocLineSN, Product, ProductSN, StockLedger, StocktakeSN
+from app.services.closing import OPENING, closed_through
+from app.services.events import emit_doc
+from app.services.partner_summary import untrack_docs
+from app.services.post_doc import PostError
+from app.services.stock_writes import apply_balance_deltas
+from app.services.stocktake import PRIOR_SN_COLUMNS, STOCKTAKE
+from app.services.warranty import add_expiring, release_expiring
+
+REVERSAL = "REVERSAL"
+
+LEDGER_COLUMNS = (
+    "warehouse_id",
+    "product_id",
+    "ref_doc_id",
+    "ref_line_id",
+    "ref_type",
+    "biz_date",
+    "in_qty",
+    "out_qty",
+    "created_at",
+)
+
+
+def _line_sn(doc_id: int):
+    # the DocLineSN row of the serial being updated, for correlated subqueries
+    return and_(DocLineSN.doc_id == doc_id, DocLineSN.sn_id == ProductSN.id)
+
+
+def _moved_since_posting(doc: Doc):
+    # Serials of the doc that are no longer where posting left them; None for doc types without serials.
+    if doc.doc_type == STOCKTAKE:
+        return (
+            select(ProductSN.sn)
+            .where(
+                or_(
+                    and_(ProductSN.out_doc_id == doc.id, ProductSN.status != "LOST"),
+                    and_(ProductSN.in_doc_id == doc.id, ProductSN.status != "IN_STOCK"),
+                )
+            )
+        )
+    to_wh = func.coalesce(DocLine.to_wh_id, doc.to_wh_id)
+    posted = {
+        "PURCHASE_IN": and_(ProductSN.status == "IN_STOCK", ProductSN.in_doc_id == doc.id),
+        "SALES_OUT": and_(ProductSN.status == "OUT_STOCK", ProductSN.out_doc_id == doc.id),
+        "TRANSFER": and_(ProductSN.status == "IN_STOCK", ProductSN.warehouse_id == to_wh),
+        "SALES_RETURN": and_(
+            ProductSN.status == "IN_STOCK", ProductSN.out_doc_id.is_(None), ProductSN.warehouse_id == to_wh
+        ),
+        "PURCHASE_RETURN": and_(ProductSN.status == "RETURNED", ProductSN.out_doc_id == doc.id),
+    }.get(doc.doc_type)
+    if posted is None:
+        return None
+    return (
+        select(ProductSN.sn)
+        .select_from(DocLineSN)
+        .join(ProductSN, ProductSN.id == DocLineSN.sn_id)
+        .join(DocLine, DocLine.id == DocLineSN.line_id)
+        .where(DocLineSN.doc_id == doc.id, not_(posted))
+    )
+
+
+def _restore_sns(db: Session, doc: Doc):
+    # Puts the doc's serials back in the state they had before posting, one UPDATE per state change.
+    sn_ids = select(DocLineSN.sn_id).where(DocLineSN.doc_id == doc.id)
+    linked = ProductSN.id.in_(sn_ids)
+    if doc.doc_type == "PURCHASE_IN":
+        values = dict(status="LOCKED", warehouse_id=None, in_doc_id=None, in_line_id=None, in_date=None)
+        statements = [update(ProductSN).where(linked).values(**values)]
+    elif doc.doc_type == "SALES_OUT":
+        release_expiring(db, sn_ids, doc.partner_id)
+        values = dict(
+            status="IN_STOCK", out_doc_id=None, out_line_id=None, out_date=None, warranty_start=None, warranty_end=None
+        )
+        statements = [update(ProductSN).where(linked).values(**values)]
+    elif doc.doc_type == "TRANSFER":
+        from_wh = (
+            select(func.coalesce(DocLine.from_wh_id, doc.from_wh_id))
+            .join(DocLineSN, DocLineSN.line_id == DocLine.id)
+            .where(_line_sn(doc.id))
+            .scalar_subquery()
+        )
+        statements = [update(ProductSN).where(linked).values(warehouse_id=from_wh)]
+    elif doc.doc_type == "SALES_RETURN":
+        statements = _restore_sale(db, doc, sn_ids)
+    elif doc.doc_type == "PURCHASE_RETURN":
+        values = dict(status="IN_STOCK", out_doc_id=None, out_line_id=None, out_date=None)
+        statements = [update(ProductSN).where(linked).values(**values)]
+    elif doc.doc_type == STOCKTAKE:
+        snapshot = and_(
+            StocktakeSN.doc_id == doc.id, StocktakeSN.sn_id == ProductSN.id, StocktakeSN.prior_status.is_not(None)
+        )
+        statements = [
+            # back to the state recorded when the stocktake was posted
+            update(ProductSN)
+            .where(snapshot)
+            .values({name: getattr(StocktakeSN, f"prior_{name}") for name in PRIOR_SN_COLUMNS}),
+            # stocktakes posted before that state was recorded: lost serials were IN_STOCK here and
+            # found ones are treated as never seen before
+            update(ProductSN)
+            .where(ProductSN.out_doc_id == doc.id, ProductSN.status == "LOST")
+            .values(status="IN_STOCK", out_doc_id=None, out_line_id=None, out_date=None),
+            update(ProductSN)
+            .where(ProductSN.in_doc_id == doc.id, ProductSN.status == "IN_STOCK")
+            .values(status="LOCKED", warehouse_id=None, in_doc_id=None, in_line_id=None, in_date=None),
+        ]
+    else:
+        statements = []
+    for stmt in statements:
+        db.execute(stmt.execution_options(synchronize_session=False))
+
+
+def _restore_sale(db: Session, doc: Doc, sn_ids):
+    # Undoing a sales return: the serials are sold again on the original SALES_OUT, with the
+    # warranty it gave them and their warranty buckets.
+    original = db.get(Doc, doc.ref_doc_id)
+    sale_line = select(DocLineSN.line_id).where(_line_sn(original.id)).limit(1).scalar_subquery()
+    sale_wh = (
+        select(func.coalesce(DocLine.from_wh_id, original.from_wh_id))
+        .join(DocLineSN, DocLineSN.line_id == DocLine.id)
+        .where(_line_sn(original.id))
+        .limit(1)
+        .scalar_subquery()
+    )
+    statements = [
+        update(ProductSN)
+        .where(ProductSN.id.in_(sn_ids))
+        .values(
+            status="OUT_STOCK",
+            warehouse_id=sale_wh,
+            out_doc_id=original.id,
+            out_line_id=sale_line,
+            out_date=original.biz_date,
+            warranty_start=original.biz_date,
+        )
+    ]
+    counts = db.execute(
+        select(Product.id, Product.warranty_months, func.count(ProductSN.id))
+        .join(ProductSN, ProductSN.product_id == Product.id)
+        .where(ProductSN.id.in_(sn_ids), Product.warranty_months > 0)
+        .group_by(Product.id, Product.warranty_months)
+    ).all()
+    for product_id, months, count in counts:
+        warranty_end = original.biz_date + timedelta(days=30 * months)
+        statements.append(
+            update(ProductSN)
+            .where(ProductSN.id.in_(sn_ids), ProductSN.product_id == product_id)
+            .values(warranty_end=warranty_end)
+        )
+        add_expiring(db, warranty_end, original.partner_id, product_id, count)
+    return statements
+
+
+def reverse_doc(db: Session, doc_id: int, biz_date: Optional[date] = None) -> Doc:
+    # Red-ink reversal of a posted doc: its ledger rows are written again with negated quantities
+    # (ref_type REVERSAL, same doc and lines), balances move back in one upsert, serials are restored
+    # and the doc becomes VOID. Runs inside the caller's transaction.
+    doc = db.get(Doc, doc_id)
+    if doc is None:
+        raise PostError("doc not found")
+    if doc.status != "POSTED":
+        raise PostError("only POSTED docs can be reversed")
+    if doc.doc_type == OPENING:
+        raise PostError("opening balances cannot be reversed")
+    biz_date = biz_date or doc.biz_date
+    if biz_date < doc.biz_date:
+        raise PostError("reversal dated before the doc")
+    closed = closed_through(db)
+    if closed is not None and doc.biz_date < closed:
+        raise PostError(f"period closed through {closed.isoformat()}")
+    returns = db.execute(
+        select(func.count(Doc.id)).where(Doc.ref_doc_id == doc.id, Doc.status == "POSTED")
+    ).scalar_one()
+    if returns:
+        raise PostError("doc has posted returns; reverse those first")
+    moved = _moved_since_posting(doc)
+    if moved is not None:
+        sns = db.execute(moved.limit(10)).scalars().all()
+        if sns:
+            raise PostError(f"sn changed since posting: {sns}")
+
+    # one aggregate over ix_ledger_ref_doc gives the net movement to undo per balance
+    nets = db.execute(
+        select(
+            StockLedger.warehouse_id,
+            StockLedger.product_id,
+            func.sum(StockLedger.in_qty) - func.sum(StockLedger.out_qty),
+        )
+        .where(StockLedger.ref_doc_id == doc.id)
+        .group_by(StockLedger.warehouse_id, StockLedger.product_id)
+    ).all()
+    db.execute(
+        insert(StockLedger).from_select(
+            LEDGER_COLUMNS,
+            select(
+                StockLedger.warehouse_id,
+                StockLedger.product_id,
+                StockLedger.ref_doc_id,
+                StockLedger.ref_line_id,
+                literal(REVERSAL),
+                literal(biz_date, StockLedger.biz_date.type),
+                -StockLedger.in_qty,
+                -StockLedger.out_qty,
+                literal(datetime.utcnow(), StockLedger.created_at.type),
+            ).where(StockLedger.ref_doc_id == doc.id),
+        )
+    )
+    levels = apply_balance_deltas(db, [((wh_id, product_id), -net) for wh_id, product_id, net in nets])
+    short = sorted(product_id for (_, product_id), qty in levels.items() if qty < 0)
+    if short:
+        raise PostError(f"insufficient stock to reverse: products {short[:20]}")
+
+    _restore_sns(db, doc)
+    untrack_docs(db, [doc.id])
+    doc.status = "VOID"
+    emit_doc(db, doc)
+    return doc
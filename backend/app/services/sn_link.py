@@ -0,0 +1,62 @@
+﻿from __future__ import annotations
+
+from typing import Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import DocLine, DocLineSN, Product, ProductSN
+from app.services.events import emit
+from app.services.returns import RETURN_TYPES
+
+# a sales return scans serials that were sold; every other doc scans new or in-stock ones
+LINKABLE_STATUSES = {"SALES_RETURN": ("OUT_STOCK",)}
+DEFAULT_LINKABLE = ("LOCKED", "IN_STOCK")
+
+
+class SNError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def load_sn_line(db: Session, doc_id: int, line_id: int):
+    line = db.get(DocLine, line_id)
+    if line is None or line.doc_id != doc_id:
+        raise SNError("Line not found", status_code=404)
+
+    product = db.get(Product, line.product_id)
+    if product is None or not product.track_sn:
+        raise SNError("Product does not track SN")
+    return line, product
+
+
+def link_sns(db: Session, doc_id: int, line_id: int, sn_codes: Iterable[str]) -> List[ProductSN]:
+    line, product = load_sn_line(db, doc_id, line_id)
+    doc_type = line.doc.doc_type
+    linkable = LINKABLE_STATUSES.get(doc_type, DEFAULT_LINKABLE)
+
+    created = []
+    for sn_code in sn_codes:
+        existing = db.execute(select(ProductSN).where(ProductSN.sn == sn_code)).scalar_one_or_none()
+        if existing:
+            if existing.product_id != product.id:
+                raise SNError("SN product mismatch")
+            if existing.status not in linkable:
+                raise SNError("SN status invalid")
+            sn_obj = existing
+        elif doc_type in RETURN_TYPES:
+            # returned goods must be serials the system already knows
+            raise SNError(f"SN not found: {sn_code}", status_code=404)
+        else:
+            sn_obj = ProductSN(product_id=product.id, sn=sn_code, status="LOCKED")
+            db.add(sn_obj)
+            db.flush()
+        link = db.execute(
+            select(DocLineSN).where(DocLineSN.line_id == line_id, DocLineSN.sn_id == sn_obj.id)
+        ).scalar_one_or_none()
+        if link is None:
+            db.add(DocLineSN(doc_id=doc_id, line_id=line_id, sn_id=sn_obj.id))
+        created.append(sn_obj)
+    emit(db, "sn", {"doc_id": doc_id, "line_id": line_id, "sns": [sn_obj.sn for sn_obj in created]})
+    return created
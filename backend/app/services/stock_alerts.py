@@ -0,0 +1,118 @@
+﻿from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from app.models import StockAlert, StockBalance, StockThreshold
+from app.services.events import emit
+
+# keys per threshold query; keeps the bound parameters well under SQLite's variable limit
+THRESHOLD_KEYS_PER_QUERY = 500
+
+
+def check_threshold(db: Session, wh_id: int, product_id: int, qty_on_hand):
+    threshold = db.get(StockThreshold, (wh_id, product_id))
+    if threshold is None:
+        return
+    _apply_threshold(db, threshold, db.get(StockAlert, (wh_id, product_id)), qty_on_hand)
+
+
+def check_thresholds(db: Session, levels: Dict[Tuple[int, int], object]):
+    # Bulk form for postings that touch many balances: only the thresholds of the touched
+    # (warehouse, product) keys are read, with their alerts, in one query per chunk of keys. The
+    # filter is one product IN list per warehouse so each key is a primary-key search; a row-value
+    # IN would scan the table.
+    keys = sorted(levels)
+    for start in range(0, len(keys), THRESHOLD_KEYS_PER_QUERY):
+        by_wh: Dict[int, List[int]] = defaultdict(list)
+        for wh_id, product_id in keys[start : start + THRESHOLD_KEYS_PER_QUERY]:
+            by_wh[wh_id].append(product_id)
+        rows = db.execute(
+            select(StockThreshold, StockAlert)
+            .outerjoin(
+                StockAlert,
+                (StockAlert.warehouse_id == StockThreshold.warehouse_id)
+                & (StockAlert.product_id == StockThreshold.product_id),
+            )
+            .where(
+                or_(
+                    *(
+                        (StockThreshold.warehouse_id == wh_id) & StockThreshold.product_id.in_(product_ids)
+                        for wh_id, product_ids in by_wh.items()
+                    )
+                )
+            )
+        ).all()
+        for threshold, alert in rows:
+            _apply_threshold(db, threshold, alert, levels[(threshold.warehouse_id, threshold.product_id)])
+
+
+def _apply_threshold(db: Session, threshold: StockThreshold, alert, qty_on_hand):
+    wh_id, product_id = threshold.warehouse_id, threshold.product_id
+    if qty_on_hand < threshold.min_qty:
+        if alert is None:
+            alert = StockAlert(warehouse_id=wh_id, product_id=product_id, created_at=datetime.utcnow())
+            db.add(alert)
+        alert.qty_on_hand = qty_on_hand
+        alert.min_qty = threshold.min_qty
+        alert.max_qty = threshold.max_qty
+        alert.updated_at = datetime.utcnow()
+        _emit_alert(db, alert, active=True)
+    elif alert is not None:
+        db.delete(alert)
+        _emit_alert(db, alert, active=False)
+
+
+def _emit_alert(db: Session, alert: StockAlert, active: bool):
+    emit(
+        db,
+        "alert",
+        {
+            "warehouse_id": alert.warehouse_id,
+            "product_id": alert.product_id,
+            "qty_on_hand": float(alert.qty_on_hand),
+            "min_qty": float(alert.min_qty),
+            "active": active,
+        },
+        key=(alert.warehouse_id, alert.product_id),
+    )
+
+
+def set_threshold(db: Session, wh_id: int, product_id: int, min_qty, max_qty=None) -> StockThreshold:
+    threshold = db.get(StockThreshold, (wh_id, product_id))
+    if threshold is None:
+        threshold = StockThreshold(warehouse_id=wh_id, product_id=product_id)
+        db.add(threshold)
+    threshold.min_qty = min_qty
+    threshold.max_qty = max_qty
+    db.flush()
+
+    balance = db.execute(
+        select(StockBalance.qty_on_hand).where(
+            StockBalance.warehouse_id == wh_id,
+            StockBalance.product_id == product_id,
+        )
+    ).scalar_one_or_none()
+    check_threshold(db, wh_id, product_id, balance or 0)
+    return threshold
+
+
+def delete_threshold(db: Session, wh_id: int, product_id: int) -> bool:
+    threshold = db.get(StockThreshold, (wh_id, product_id))
+    if threshold is None:
+        return False
+    alert = db.get(StockAlert, (wh_id, product_id))
+    if alert is not None:
+        db.delete(alert)
+        _emit_alert(db, alert, active=False)
+    db.delete(threshold)
+    return True
+
+
+def suggested_qty(alert: StockAlert):
+    target = alert.max_qty if alert.max_qty is not None else alert.min_qty
+    return max(target - alert.qty_on_hand, 0)
@@ -0,0 +1,65 @@
+﻿from __future__ import annotations
+
+from typing import Any, Dict, Optional, Sequence
+
+from sqlalchemy import exists, select, true
+from sqlalchemy.orm import Session
+
+from app.core.fastjson import raw_number
+from app.models import Product, StockBalance, Warehouse
+
+
+def stock_matrix(
+    db: Session,
+    warehouse_ids: Optional[Sequence[int]] = None,
+    q: Optional[str] = None,
+    in_stock: bool = False,
+    after_id: Optional[int] = None,
+    limit: int = 1000,
+) -> Dict[str, Any]:
+    # Product x warehouse grid for one keyset page of products: one query for the page, one for
+    # its balances (ix_balance_product_wh), pivoted in a single pass into a columnar layout.
+    wh_stmt = select(Warehouse.id).order_by(Warehouse.id)
+    if warehouse_ids:
+        wh_stmt = wh_stmt.where(Warehouse.id.in_(set(warehouse_ids)))
+    wh_ids = db.execute(wh_stmt).scalars().all()
+    in_warehouses = StockBalance.warehouse_id.in_(wh_ids) if warehouse_ids else true()
+
+    page = select(Product.id, Product.sku, Product.name)
+    if after_id:
+        page = page.where(Product.id > after_id)
+    if q:
+        like = f"%{q}%"
+        page = page.where((Product.sku.like(like)) | (Product.name.like(like)) | (Product.model.like(like)))
+    if in_stock:
+        page = page.where(
+            exists().where(StockBalance.product_id == Product.id, StockBalance.qty_on_hand != 0, in_warehouses)
+        )
+    page = page.order_by(Product.id).limit(limit)
+    products = db.execute(page).all()
+
+    rows = {}
+    matrix = []
+    for i, (product_id, _, _) in enumerate(products):
+        rows[product_id] = i
+        matrix.append([0.0] * len(wh_ids))
+    if products and wh_ids:
+        cols = {wh_id: j for j, wh_id in enumerate(wh_ids)}
+        # the ids and warehouses already read, not the page query again: without a transaction around the
+        # reads, a product or warehouse added in between would have no row or column
+        balances = db.execute(
+            select(StockBalance.product_id, StockBalance.warehouse_id, raw_number(StockBalance.qty_on_hand)).where(
+                StockBalance.product_id.in_(list(rows)), StockBalance.warehouse_id.in_(wh_ids)
+            )
+        )
+        for product_id, wh_id, qty in balances:
+            matrix[rows[product_id]][cols[wh_id]] = qty
+
+    return {
+        "warehouse_ids": list(wh_ids),
+        "product_ids": [row[0] for row in products],
+        "skus": [row[1] for row in products],
+        "names": [row[2] for row in products],
+        "qty": matrix,
+        "next_after_id": products[-1][0] if len(products) == limit else None,
+    }
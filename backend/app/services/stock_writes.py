@@ -0,0 +1,53 @@
+﻿from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.dialects.sqlite import insert as upsert
+from sqlalchemy.orm import Session
+
+from app.models import StockBalance, StockLedger
+from app.services.events import emit
+from app.services.stock_alerts import check_thresholds
+
+BalanceKey = Tuple[int, int]
+
+
+def add_ledger_rows(db: Session, rows: List[Dict[str, Any]]):
+    # One executemany for a whole document instead of an ORM object per movement.
+    if rows:
+        db.execute(insert(StockLedger), rows)
+
+
+def apply_balance_deltas(db: Session, deltas: Iterable[Tuple[BalanceKey, Any]]) -> Dict[BalanceKey, Decimal]:
+    # Set-based counterpart of post_doc's per-line balance updates: one upsert per document that
+    # returns the new quantities, then the threshold check and events for every balance touched.
+    # Balance rows already loaded into the session are not refreshed; post through one path per session.
+    totals: Dict[BalanceKey, Decimal] = {}
+    for key, qty in deltas:
+        totals[key] = totals.get(key, Decimal(0)) + Decimal(str(qty))
+    totals = {key: qty for key, qty in totals.items() if qty}
+    if not totals:
+        return {}
+
+    stmt = upsert(StockBalance)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StockBalance.warehouse_id, StockBalance.product_id],
+        set_={"qty_on_hand": StockBalance.qty_on_hand + stmt.excluded.qty_on_hand},
+    ).returning(StockBalance.warehouse_id, StockBalance.product_id, StockBalance.qty_on_hand)
+    rows = db.execute(
+        stmt,
+        [{"warehouse_id": wh_id, "product_id": product_id, "qty_on_hand": qty} for (wh_id, product_id), qty in totals.items()],
+    ).all()
+    levels = {(wh_id, product_id): qty for wh_id, product_id, qty in rows}
+
+    check_thresholds(db, levels)
+    for (wh_id, product_id), qty in levels.items():
+        emit(
+            db,
+            "balance",
+            {"warehouse_id": wh_id, "product_id": product_id, "qty_on_hand": float(qty)},
+            key=(wh_id, product_id),
+        )
+    return levels
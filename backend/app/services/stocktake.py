@@ -0,0 +1,404 @@
+﻿from __future__ import annotations
+
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, case, false, func, insert, literal, or_, select, true, type_coerce, update
+from sqlalchemy.dialects.sqlite import insert as upsert
+from sqlalchemy.orm import Session
+
+from app.db.types import SCALE, Hundredths
+from app.models import (
+    Doc,
+    DocLine,
+    DocLineSN,
+    Product,
+    ProductSN,
+    StockBalance,
+    Stocktake,
+    StocktakeLine,
+    StocktakeSN,
+    Warehouse,
+)
+from app.services.closing import closed_through
+from app.services.events import emit_doc
+from app.services.stock_writes import add_ledger_rows, apply_balance_deltas
+
+STOCKTAKE = "STOCKTAKE"
+OPEN_STATUSES = ("DRAFT", "APPROVED")
+# serial states a counter may find on the shelf; anything else belongs to another doc or warehouse
+SCANNABLE_SN_STATUSES = ("IN_STOCK", "LOCKED", "LOST")
+# ProductSN columns posting may change, copied to StocktakeSN.prior_<name> first
+PRIOR_SN_COLUMNS = (
+    "status",
+    "warehouse_id",
+    "in_doc_id",
+    "in_line_id",
+    "in_date",
+    "out_doc_id",
+    "out_line_id",
+    "out_date",
+)
+
+
+class StocktakeError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def get_stocktake(db: Session, doc_id: int) -> Tuple[Doc, Stocktake]:
+    header = db.get(Stocktake, doc_id)
+    if header is None:
+        raise StocktakeError("Stocktake not found", status_code=404)
+    return db.get(Doc, doc_id), header
+
+
+def _open_stocktake(db: Session, doc_id: int) -> Tuple[Doc, Stocktake]:
+    doc, header = get_stocktake(db, doc_id)
+    if doc.status not in OPEN_STATUSES:
+        raise StocktakeError("Stocktake already posted")
+    return doc, header
+
+
+def create_stocktake(
+    db: Session,
+    warehouse_id: int,
+    biz_date: date,
+    doc_no: str,
+    remark: Optional[str],
+    user_id: Optional[int],
+) -> Doc:
+    if db.get(Warehouse, warehouse_id) is None:
+        raise StocktakeError("Warehouse not found", status_code=404)
+    closed = closed_through(db)
+    if closed is not None and biz_date < closed:
+        raise StocktakeError(f"period closed through {closed.isoformat()}")
+    open_count = db.execute(
+        select(func.count(Stocktake.doc_id))
+        .join(Doc, Doc.id == Stocktake.doc_id)
+        .where(Stocktake.warehouse_id == warehouse_id, Doc.status.in_(OPEN_STATUSES))
+    ).scalar_one()
+    if open_count:
+        raise StocktakeError("Warehouse already has an open stocktake")
+
+    now = datetime.utcnow()
+    doc = Doc(
+        doc_type=STOCKTAKE,
+        doc_no=doc_no,
+        biz_date=biz_date,
+        from_wh_id=warehouse_id,
+        to_wh_id=warehouse_id,
+        status="DRAFT",
+        remark=remark,
+        created_by=user_id,
+        created_at=now,
+    )
+    db.add(doc)
+    db.flush()
+    db.add(Stocktake(doc_id=doc.id, warehouse_id=warehouse_id, snapshot_at=now))
+
+    # Freeze the book side with two INSERT ... SELECTs; nothing is read into Python.
+    db.execute(
+        insert(StocktakeLine).from_select(
+            ["doc_id", "product_id", "book_qty"],
+            select(literal(doc.id), StockBalance.product_id, StockBalance.qty_on_hand).where(
+                StockBalance.warehouse_id == warehouse_id, StockBalance.qty_on_hand != 0
+            ),
+        )
+    )
+    db.execute(
+        insert(StocktakeSN).from_select(
+            ["doc_id", "sn_id", "in_book", "counted"],
+            select(literal(doc.id), ProductSN.id, true(), false()).where(
+                ProductSN.status == "IN_STOCK", ProductSN.warehouse_id == warehouse_id
+            ),
+        )
+    )
+    emit_doc(db, doc)
+    return doc
+
+
+def record_counts(db: Session, doc_id: int, items: Iterable[Tuple[int, float]], accumulate: bool = False) -> int:
+    # Quantities for products without serials. accumulate=True adds to earlier counts (several
+    # counters on one product); otherwise the latest count replaces the previous one.
+    _open_stocktake(db, doc_id)
+    totals: Dict[int, Decimal] = {}
+    for product_id, qty in items:
+        qty = Decimal(str(qty))
+        totals[product_id] = totals.get(product_id, Decimal(0)) + qty if accumulate else qty
+    if not totals:
+        return 0
+
+    tracked = dict(db.execute(select(Product.id, Product.track_sn).where(Product.id.in_(totals))).all())
+    missing = sorted(set(totals) - set(tracked))
+    if missing:
+        raise StocktakeError(f"product not found: {missing[:20]}")
+    serial = sorted(product_id for product_id, track_sn in tracked.items() if track_sn)
+    if serial:
+        raise StocktakeError(f"products tracking SN are counted by scanning serials: {serial[:20]}")
+
+    stmt = upsert(StocktakeLine)
+    counted = stmt.excluded.counted_qty
+    if accumulate:
+        counted = func.coalesce(StocktakeLine.counted_qty, 0) + counted
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[StocktakeLine.doc_id, StocktakeLine.product_id],
+            set_={"counted_qty": counted},
+        ),
+        [
+            {"doc_id": doc_id, "product_id": product_id, "book_qty": 0, "counted_qty": qty}
+            for product_id, qty in totals.items()
+        ],
+    )
+    return len(totals)
+
+
+def record_sns(db: Session, doc_id: int, sn_codes: Sequence[str], product_id: Optional[int] = None) -> int:
+    # Scanned serials, validated as one batch. Serials not known yet need product_id and are
+    # created LOCKED, like link_sns does; they become IN_STOCK when the stocktake is posted.
+    _, header = _open_stocktake(db, doc_id)
+    codes = list(dict.fromkeys(sn_codes))
+    if not codes:
+        return 0
+
+    existing = {
+        row.sn: row
+        for row in db.execute(
+            select(ProductSN.id, ProductSN.sn, ProductSN.product_id, ProductSN.status, ProductSN.warehouse_id).where(
+                ProductSN.sn.in_(codes)
+            )
+        ).all()
+    }
+    new_codes = [code for code in codes if code not in existing]
+    errors: List[str] = []
+    if new_codes:
+        product = db.get(Product, product_id) if product_id is not None else None
+        if product_id is None:
+            errors.append(f"unknown SN, product_id required: {new_codes[:10]}")
+        elif product is None or not product.track_sn:
+            raise StocktakeError("Product does not track SN")
+    held = set(
+        db.execute(
+            select(DocLineSN.sn_id)
+            .join(Doc, Doc.id == DocLineSN.doc_id)
+            .where(DocLineSN.sn_id.in_([row.id for row in existing.values()]), Doc.status.in_(OPEN_STATUSES))
+        ).scalars().all()
+    )
+    for row in existing.values():
+        if product_id is not None and row.product_id != product_id:
+            errors.append(f"{row.sn}: SN product mismatch")
+        elif row.status not in SCANNABLE_SN_STATUSES:
+            errors.append(f"{row.sn}: SN status invalid")
+        elif row.status == "IN_STOCK" and row.warehouse_id != header.warehouse_id:
+            errors.append(f"{row.sn}: SN in stock at another warehouse")
+        elif row.status == "LOCKED" and row.id in held:
+            errors.append(f"{row.sn}: SN linked to an open doc")
+    if errors:
+        raise StocktakeError("; ".join(errors[:10]))
+
+    sn_ids = [row.id for row in existing.values()]
+    product_ids = {row.product_id for row in existing.values()}
+    if new_codes:
+        sn_ids += db.execute(
+            insert(ProductSN).returning(ProductSN.id, sort_by_parameter_order=True),
+            [{"product_id": product_id, "sn": code, "status": "LOCKED"} for code in new_codes],
+        ).scalars().all()
+        product_ids.add(product_id)
+
+    stmt = upsert(StocktakeSN)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[StocktakeSN.doc_id, StocktakeSN.sn_id],
+            set_={"counted": True},
+        ),
+        [{"doc_id": doc_id, "sn_id": sn_id, "in_book": False, "counted": True} for sn_id in sn_ids],
+    )
+    # every product seen gets a variance row, even without book stock
+    db.execute(
+        upsert(StocktakeLine).on_conflict_do_nothing(),
+        [{"doc_id": doc_id, "product_id": pid, "book_qty": 0} for pid in product_ids],
+    )
+    return len(sn_ids)
+
+
+def variance_stmt(doc_id: int):
+    # Counted minus book per product, all in SQL. Serial-tracked products count their scanned
+    # serials; any other product that was never counted counts as zero.
+    sns = (
+        select(
+            ProductSN.product_id,
+            func.sum(case((StocktakeSN.counted == true(), 1), else_=0)).label("counted"),
+            func.sum(case((and_(StocktakeSN.in_book == true(), StocktakeSN.counted == false()), 1), else_=0)).label(
+                "missing"
+            ),
+            func.sum(case((and_(StocktakeSN.in_book == false(), StocktakeSN.counted == true()), 1), else_=0)).label(
+                "found"
+            ),
+        )
+        .join(ProductSN, ProductSN.id == StocktakeSN.sn_id)
+        .where(StocktakeSN.doc_id == doc_id)
+        .group_by(ProductSN.product_id)
+        .subquery()
+    )
+    counted = case(
+        # a serial count is a whole quantity: scale it to hundredths like the stored ones
+        (Product.track_sn == true(), type_coerce(func.coalesce(sns.c.counted, 0) * SCALE, Hundredths())),
+        else_=func.coalesce(StocktakeLine.counted_qty, 0),
+    )
+    return (
+        select(
+            StocktakeLine.product_id,
+            Product.sku,
+            Product.name,
+            StocktakeLine.book_qty,
+            counted.label("counted_qty"),
+            (counted - StocktakeLine.book_qty).label("diff_qty"),
+            func.coalesce(sns.c.missing, 0).label("sn_missing"),
+            func.coalesce(sns.c.found, 0).label("sn_found"),
+        )
+        .join(Product, Product.id == StocktakeLine.product_id)
+        .outerjoin(sns, sns.c.product_id == StocktakeLine.product_id)
+        .where(StocktakeLine.doc_id == doc_id)
+        .order_by(StocktakeLine.product_id)
+    )
+
+
+def stocktake_summary(db: Session, doc_id: int) -> dict:
+    doc, header = get_stocktake(db, doc_id)
+    products, products_counted = db.execute(
+        select(func.count(), func.count(StocktakeLine.counted_qty)).where(StocktakeLine.doc_id == doc_id)
+    ).one()
+    sns_in_book, sns_counted = db.execute(
+        select(
+            func.coalesce(func.sum(case((StocktakeSN.in_book == true(), 1), else_=0)), 0),
+            func.coalesce(func.sum(case((StocktakeSN.counted == true(), 1), else_=0)), 0),
+        ).where(StocktakeSN.doc_id == doc_id)
+    ).one()
+    return {
+        "doc_id": doc.id,
+        "doc_no": doc.doc_no,
+        "warehouse_id": header.warehouse_id,
+        "biz_date": doc.biz_date,
+        "status": doc.status,
+        "snapshot_at": header.snapshot_at,
+        "products": products,
+        "products_counted": products_counted,
+        "sns_in_book": sns_in_book,
+        "sns_counted": sns_counted,
+    }
+
+
+def post_stocktake(db: Session, doc: Doc) -> Dict[str, int]:
+    # The variance becomes the doc's lines (gain: to_wh_id, loss: from_wh_id), written with one
+    # insert each for lines and ledger, one balance upsert and two serial UPDATEs.
+    header = db.get(Stocktake, doc.id)
+    if header is None:
+        raise StocktakeError("stocktake snapshot not found")
+    wh = header.warehouse_id
+
+    variance = variance_stmt(doc.id)
+    rows = db.execute(variance.where(variance.selected_columns.diff_qty != 0)).all()
+    diffs = [(row.product_id, row.diff_qty) for row in rows]
+    now = datetime.utcnow()
+
+    if diffs:
+        line_ids = db.execute(
+            insert(DocLine).returning(DocLine.id, sort_by_parameter_order=True),
+            [
+                {
+                    "doc_id": doc.id,
+                    "line_no": line_no,
+                    "product_id": product_id,
+                    "qty": abs(diff),
+                    "to_wh_id": wh if diff > 0 else None,
+                    "from_wh_id": wh if diff < 0 else None,
+                }
+                for line_no, (product_id, diff) in enumerate(diffs, start=1)
+            ],
+        ).scalars().all()
+        add_ledger_rows(
+            db,
+            [
+                {
+                    "warehouse_id": wh,
+                    "product_id": product_id,
+                    "ref_doc_id": doc.id,
+                    "ref_line_id": line_id,
+                    "ref_type": doc.doc_type,
+                    "biz_date": doc.biz_date,
+                    "in_qty": max(diff, 0),
+                    "out_qty": max(-diff, 0),
+                    "created_at": now,
+                }
+                for line_id, (product_id, diff) in zip(line_ids, diffs)
+            ],
+        )
+        levels = apply_balance_deltas(db, [((wh, product_id), diff) for product_id, diff in diffs])
+        short = sorted(product_id for (_, product_id), qty in levels.items() if qty < 0)
+        if short:
+            # stock moved out after the snapshot; the count no longer covers it
+            raise StocktakeError(f"insufficient stock after adjustment: {short[:20]}")
+
+    # Serials: in the book but not found -> LOST; found but not in the book -> IN_STOCK here.
+    line_of_product = (
+        select(DocLine.id)
+        .where(DocLine.doc_id == doc.id, DocLine.product_id == ProductSN.product_id)
+        .scalar_subquery()
+    )
+    missing = select(StocktakeSN.sn_id).where(
+        StocktakeSN.doc_id == doc.id, StocktakeSN.in_book == true(), StocktakeSN.counted == false()
+    )
+    found = select(StocktakeSN.sn_id).where(
+        StocktakeSN.doc_id == doc.id, StocktakeSN.in_book == false(), StocktakeSN.counted == true()
+    )
+    lost_filter = and_(ProductSN.id.in_(missing), ProductSN.status == "IN_STOCK", ProductSN.warehouse_id == wh)
+    found_filter = and_(ProductSN.id.in_(found), ProductSN.status.in_(("LOCKED", "LOST")))
+
+    # link before the status changes below, while both filters still match
+    db.execute(
+        insert(DocLineSN).from_select(
+            ["doc_id", "line_id", "sn_id"],
+            select(literal(doc.id), DocLine.id, ProductSN.id)
+            .join(DocLine, and_(DocLine.doc_id == doc.id, DocLine.product_id == ProductSN.product_id))
+            .where(lost_filter | found_filter),
+        )
+    )
+    # the serials' state before this posting, kept on their snapshot rows for a reversal
+    db.execute(
+        update(StocktakeSN)
+        .where(
+            StocktakeSN.doc_id == doc.id,
+            ProductSN.id == StocktakeSN.sn_id,
+            or_(
+                and_(
+                    StocktakeSN.in_book == true(),
+                    StocktakeSN.counted == false(),
+                    ProductSN.status == "IN_STOCK",
+                    ProductSN.warehouse_id == wh,
+                ),
+                and_(
+                    StocktakeSN.in_book == false(),
+                    StocktakeSN.counted == true(),
+                    ProductSN.status.in_(("LOCKED", "LOST")),
+                ),
+            ),
+        )
+        .values({f"prior_{name}": getattr(ProductSN, name) for name in PRIOR_SN_COLUMNS})
+        .execution_options(synchronize_session=False)
+    )
+    lost_count = db.execute(
+        update(ProductSN)
+        .where(lost_filter)
+        .values(status="LOST", out_doc_id=doc.id, out_line_id=line_of_product, out_date=doc.biz_date)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    found_count = db.execute(
+        update(ProductSN)
+        .where(found_filter)
+        .values(status="IN_STOCK", warehouse_id=wh, in_doc_id=doc.id, in_line_id=line_of_product, in_date=doc.biz_date)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return {"lines": len(diffs), "sn_lost": lost_count, "sn_found": found_count}
@@ -0,0 +1,58 @@
+﻿from __future__ import annotations
+
+from datetime import date
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models import Doc, ProductSN, WarrantyExpiryBucket
+
+
+def add_expiring(db: Session, expiry_date: date, partner_id: int | None, product_id: int, count: int):
+    stmt = select(WarrantyExpiryBucket).where(
+        WarrantyExpiryBucket.expiry_date == expiry_date,
+        WarrantyExpiryBucket.partner_id == partner_id,
+        WarrantyExpiryBucket.product_id == product_id,
+    )
+    bucket = db.execute(stmt).scalar_one_or_none()
+    if bucket is None:
+        bucket = WarrantyExpiryBucket(
+            expiry_date=expiry_date, partner_id=partner_id, product_id=product_id, sn_count=0
+        )
+        db.add(bucket)
+        db.flush()
+    bucket.sn_count = bucket.sn_count + count
+    if bucket.sn_count <= 0:
+        db.delete(bucket)
+
+
+def release_expiring(db: Session, sn_ids, partner_id: int | None):
+    # Takes serials out of the buckets; call before their warranty fields are cleared.
+    for expiry_date, product_id, count in db.execute(
+        select(ProductSN.warranty_end, ProductSN.product_id, func.count(ProductSN.id))
+        .where(ProductSN.id.in_(sn_ids), ProductSN.warranty_end.is_not(None))
+        .group_by(ProductSN.warranty_end, ProductSN.product_id)
+    ).all():
+        add_expiring(db, expiry_date, partner_id, product_id, -count)
+
+
+def rebuild_buckets(db: Session) -> int:
+    # Recompute from product_sns, e.g. for serials posted before buckets existed.
+    db.execute(delete(WarrantyExpiryBucket))
+    source = (
+        select(
+            ProductSN.warranty_end,
+            Doc.partner_id,
+            ProductSN.product_id,
+            func.count(ProductSN.id),
+        )
+        .join(Doc, Doc.id == ProductSN.out_doc_id)
+        .where(ProductSN.status == "OUT_STOCK", ProductSN.warranty_end.is_not(None))
+        .group_by(ProductSN.warranty_end, Doc.partner_id, ProductSN.product_id)
+    )
+    db.execute(
+        insert(WarrantyExpiryBucket).from_select(
+            ["expiry_date", "partner_id", "product_id", "sn_count"], source
+        )
+    )
+    return db.execute(select(func.count()).select_from(WarrantyExpiryBucket)).scalar_one()
@@ -7,12 +7,44 @@
 const qs = (id) => document.getElementById(id)
 const qsa = (sel) => document.querySelectorAll(sel)
 
-async function request(path, options = {}) {
+const AUTH_PATHS = ['/api/auth/login', '/api/auth/refresh', '/api/auth/logout']
+let refreshing = null
+
+// Access tokens are short-lived; trade the refresh token for a new pair (one refresh at a time).
+function refreshTokens() {
+  const refreshToken = localStorage.getItem('refresh_token')
+  if (!refreshToken) return Promise.resolve(false)
+  if (!refreshing) {
+    refreshing = fetch('/api/auth/refresh', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ refresh_token: refreshToken })
+    })
+      .then(async (res) => {
+        if (!res.ok) return false
+        const data = await res.json()
+        state.token = data.access_token
+        localStorage.setItem('access_token', data.access_token)
+        localStorage.setItem('refresh_token', data.refresh_token)
+        return true
+      })
+      .catch(() => false)
+      .finally(() => {
+        refreshing = null
+      })
+  }
+  return refreshing
+}
+
+async function request(path, options = {}, retried = false) {
   const headers = options.headers || {}
   if (state.token) headers['Authorization'] = `Bearer ${state.token}`
   if (!headers['Content-Type'] && options.body) headers['Content-Type'] = 'application/json'
 
   const res = await fetch(path, { ...options, headers })
+  if (res.status === 401 && !retried && !AUTH_PATHS.includes(path)) {
+    if (await refreshTokens()) return request(path, options, true)
+  }
   if (!res.ok) {
     const msg = await res.text()
     throw new Error(msg || res.statusText)
@@ -85,6 +117,10 @@ async function loadMe() {
 }
 
 function logout() {
+  const refreshToken = localStorage.getItem('refresh_token')
+  if (refreshToken) {
+    request('/api/auth/logout', { method: 'POST', body: JSON.stringify({ refresh_token: refreshToken }) }).catch(() => {})
+  }
   state.token = ''
   state.user = null
   localStorage.removeItem('access_token')
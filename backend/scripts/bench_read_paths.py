@@ -0,0 +1,108 @@
+﻿from __future__ import annotations
+
+# Compare the ORM + Pydantic read path with the column-projection path used by
+# /api/stock/ledger, /api/stock/balances and /api/sns.
+#
+#   cd backend && python -m scripts.bench_read_paths --rows 200000
+#   python backend/scripts/bench_read_paths.py --rows 200000
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import List
+
+# run as a file, sys.path starts at scripts/ rather than backend/, which holds app
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app.api.routes.sns import list_sns
+from app.api.routes.stock import list_balances, list_ledger
+from app.db.base import Base
+from app.models import Doc, DocLine, Product, ProductSN, StockBalance, StockLedger, Warehouse
+from app.schemas.schemas import SNOut, StockBalanceOut, StockLedgerOut
+
+
+def seed(db: Session, rows: int):
+    db.execute(insert(Warehouse), [{"id": i, "name": f"W{i}"} for i in range(1, 11)])
+    db.execute(insert(Product), [{"id": i, "sku": f"SKU{i}", "name": f"P{i}", "track_sn": True} for i in range(1, 1001)])
+    db.execute(insert(Doc), [{"id": 1, "doc_type": "PURCHASE_IN", "doc_no": "BENCH", "biz_date": date(2026, 1, 1), "status": "POSTED"}])
+    db.execute(insert(DocLine), [{"id": 1, "doc_id": 1, "line_no": 1, "product_id": 1, "qty": 1}])
+    now = datetime.utcnow()
+    db.execute(
+        insert(StockLedger),
+        [
+            {
+                "warehouse_id": random.randint(1, 10),
+                "product_id": random.randint(1, 1000),
+                "ref_doc_id": 1,
+                "ref_line_id": 1,
+                "ref_type": "PURCHASE_IN",
+                "biz_date": date(2026, 1, 1) + timedelta(days=i % 365),
+                "in_qty": random.randint(1, 50),
+                "out_qty": 0,
+                "created_at": now,
+            }
+            for i in range(rows)
+        ],
+    )
+    db.execute(
+        insert(StockBalance),
+        [{"warehouse_id": w, "product_id": p, "qty_on_hand": random.randint(0, 500)} for w in range(1, 11) for p in range(1, 1001)],
+    )
+    db.execute(
+        insert(ProductSN),
+        [
+            {"product_id": random.randint(1, 1000), "sn": f"SN{i:09d}", "status": "IN_STOCK", "warehouse_id": 1, "in_doc_id": 1, "in_date": date(2026, 1, 1)}
+            for i in range(rows)
+        ],
+    )
+    db.commit()
+
+
+def orm_path(db: Session, model, out_schema) -> bytes:
+    adapter = TypeAdapter(List[out_schema])
+    rows = db.execute(select(model)).scalars().all()
+    return adapter.dump_json(adapter.validate_python(rows))
+
+
+def timed(label: str, rows: int, fn):
+    start = time.perf_counter()
+    body = fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<10} {elapsed * 1000:9.1f} ms  {rows / elapsed:12,.0f} rows/s  {len(body):,} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite+pysqlite:///{Path(tmp) / 'bench.db'}", future=True)
+        Base.metadata.create_all(engine)
+        with Session(engine) as db:
+            seed(db, args.rows)
+            cases = [
+                ("ledger", args.rows, StockLedger, StockLedgerOut, lambda: list_ledger(db=db, user=None).body),
+                ("balances", 10_000, StockBalance, StockBalanceOut, lambda: list_balances(db=db, user=None).body),
+                ("sns", args.rows, ProductSN, SNOut, lambda: list_sns(db=db, user=None).body),
+            ]
+            for name, rows, model, out_schema, projection in cases:
+                print(name)
+                db.expunge_all()
+                timed("orm", rows, lambda: orm_path(db, model, out_schema))
+                db.expunge_all()
+                timed("projection", rows, projection)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
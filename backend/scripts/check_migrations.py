@@ -0,0 +1,112 @@
+﻿from __future__ import annotations
+
+# Runs `app.manage migrate` on a fresh database and on a copy of the pre-migration schema
+# (scripts/legacy_schema.sql) and checks both end at head with the schema the models describe, and
+# that the legacy quantities read back unchanged after the hundredths conversion. Any difference
+# fails the run (exit 1). Run after adding a migration:
+#
+#   cd backend && python -m scripts.check_migrations
+#   python backend/scripts/check_migrations.py
+
+import sqlite3
+import sys
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from typing import List
+
+# run as a file, sys.path starts at scripts/ rather than backend/, which holds app
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.db.base import Base
+from app.manage import _alembic_config, migrate
+from app.models import DocLine, StockBalance, StockLedger
+
+LEGACY_SCHEMA = Path(__file__).with_name("legacy_schema.sql")
+
+# rows written the way the old code stored them, as plain decimals
+LEGACY_ROWS = [
+    "INSERT INTO warehouses (id, name) VALUES (1, 'W1')",
+    "INSERT INTO products (id, sku, name, track_sn, is_active) VALUES (1, 'SKU1', 'P1', 0, 1)",
+    "INSERT INTO docs (id, doc_type, doc_no, biz_date, to_wh_id, status, created_at)"
+    " VALUES (1, 'PURCHASE_IN', 'PI1', '2026-01-05', 1, 'POSTED', '2026-01-05 09:00:00')",
+    "INSERT INTO doc_lines (id, doc_id, line_no, product_id, qty, unit_price, amount)"
+    " VALUES (1, 1, 1, 1, 2.5, 3.1, 7.75)",
+    "INSERT INTO stock_ledger"
+    " (warehouse_id, product_id, ref_doc_id, ref_line_id, ref_type, biz_date, in_qty, out_qty, created_at)"
+    " VALUES (1, 1, 1, 1, 'PURCHASE_IN', '2026-01-05', 2.5, 0, '2026-01-05 09:00:00')",
+    "INSERT INTO stock_balances (warehouse_id, product_id, qty_on_hand) VALUES (1, 1, 2.5)",
+]
+# what the models must read back once the hundredths conversion has run
+LEGACY_VALUES = [
+    (DocLine.qty, Decimal("2.5")),
+    (DocLine.unit_price, Decimal("3.1")),
+    (DocLine.amount, Decimal("7.75")),
+    (StockLedger.in_qty, Decimal("2.5")),
+    (StockBalance.qty_on_hand, Decimal("2.5")),
+]
+
+
+def create_legacy(path: Path):
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(LEGACY_SCHEMA.read_text(encoding="utf-8"))
+        with conn:
+            for statement in LEGACY_ROWS:
+                conn.execute(statement)
+    finally:
+        conn.close()
+
+
+def problems(engine) -> List[str]:
+    head = ScriptDirectory.from_config(_alembic_config()).get_current_head()
+    with engine.connect() as conn:
+        context = MigrationContext.configure(conn)
+        current = context.get_current_revision()
+        found = [f"at revision {current}, head is {head}"] if current != head else []
+        found += [f"schema differs from the models: {diff}" for diff in compare_metadata(context, Base.metadata)]
+    return found
+
+
+def value_problems(engine) -> List[str]:
+    found = []
+    with Session(engine) as db:
+        for column, expected in LEGACY_VALUES:
+            value = db.execute(select(column)).scalar_one()
+            if value != expected:
+                found.append(f"{column} reads {value}, expected {expected}")
+    return found
+
+
+def main():
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, legacy in (("fresh database", False), ("pre-migration database", True)):
+            path = Path(tmp) / f"{name.split()[0]}.db"
+            if legacy:
+                create_legacy(path)
+            engine = create_engine(f"sqlite+pysqlite:///{path}", future=True)
+            try:
+                migrate(engine)
+                found = problems(engine)
+                if legacy:
+                    found += value_problems(engine)
+            finally:
+                engine.dispose()
+            print(f"{'FAIL' if found else 'ok':<4}  {name}")
+            for problem in found:
+                print(f"        {problem}")
+            failures += bool(found)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+﻿from __future__ import annotations
+
+# Runs the hot read/write paths against a seeded database, captures every statement they issue
+# and checks its EXPLAIN QUERY PLAN: a SCAN of one of the large tables fails the run (exit 1).
+# Run after model or query changes:
+#
+#   cd backend && python -m scripts.check_query_plans --rows 20000
+#   python backend/scripts/check_query_plans.py --rows 20000
+
+import argparse
+import re
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+# run as a file, sys.path starts at scripts/ rather than backend/, which holds app
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import Session
+
+from app.api.routes.partners import get_partner_statement
+from app.api.routes.sns import import_sns, list_sns, scan_code
+from app.api.routes.stock import list_balances, list_ledger
+from app.db.base import Base
+from app.models import Doc, DocLine, DocLineSN, Partner, Product, ProductSN, StockBalance, StockLedger, Warehouse
+from app.schemas.schemas import ScanIn
+from app.services.post_check import check_doc, line_problems
+from app.services.post_doc import _load_line_sns
+from app.services.product_lookup import product_lookup
+from app.services.returns import returnable_qty
+from app.services.stock_alerts import check_thresholds
+from app.services.stock_matrix import stock_matrix
+
+# tables that grow with the business; a full scan of any of them is a regression
+LARGE_TABLES = {
+    "docs",
+    "doc_lines",
+    "doc_line_sns",
+    "products",
+    "product_sns",
+    "stock_balances",
+    "stock_ledger",
+    "partner_summaries",
+    "stock_thresholds",
+    "stock_alerts",
+}
+
+WAREHOUSES = 10
+PRODUCTS = 2000
+
+# SQLite >= 3.36 prints "SCAN d" (the alias, if any); older versions print "SCAN TABLE docs AS d"
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?")
+# SQLAlchemy always writes table aliases with AS
+_ALIAS = re.compile(r"(?:\bFROM|\bJOIN|,)\s+(\w+)\s+AS\s+(\w+)", re.IGNORECASE)
+
+# statements the check must flag, run before the real cases so a parser that stops matching fails loudly
+KNOWN_SCANS = [
+    "SELECT d.id FROM docs AS d WHERE d.remark LIKE '%x%'",
+    "SELECT docs.id FROM docs WHERE docs.remark LIKE '%x%'",
+    "SELECT l.id FROM docs AS d JOIN doc_lines AS l ON l.doc_id = d.id WHERE l.remark LIKE '%x%'",
+]
+# plan lines in the pre-3.36 format -> the table they scan
+LEGACY_PLAN_LINES = {
+    "SCAN TABLE docs": "docs",
+    "SCAN TABLE docs AS d": "docs",
+    "SCAN TABLE doc_lines AS l USING INDEX ix_doc_lines_doc_id": "doc_lines",
+}
+
+
+def seed(db: Session, rows: int):
+    docs = max(rows // 10, 10)
+    db.execute(insert(Warehouse), [{"id": i, "name": f"W{i}"} for i in range(1, WAREHOUSES + 1)])
+    db.execute(insert(Partner), [{"id": i, "type": "CUSTOMER", "name": f"C{i}"} for i in range(1, 51)])
+    db.execute(
+        insert(Product),
+        [
+            {"id": i, "sku": f"SKU{i}", "name": f"P{i}", "barcode": f"69{i:08d}", "track_sn": True, "warranty_months": 12}
+            for i in range(1, PRODUCTS + 1)
+        ],
+    )
+    db.execute(
+        insert(Doc),
+        [
+            {
+                "id": i,
+                "doc_type": "PURCHASE_IN" if i % 2 else "SALES_OUT",
+                "doc_no": f"D{i:08d}",
+                "biz_date": date(2026, 1, 1) + timedelta(days=i % 365),
+                "partner_id": i % 50 + 1,
+                "to_wh_id": i % WAREHOUSES + 1,
+                "from_wh_id": i % WAREHOUSES + 1,
+                "status": "POSTED",
+            }
+            for i in range(1, docs + 1)
+        ],
+    )
+    db.execute(
+        insert(DocLine),
+        [
+            {"id": i, "doc_id": (i - 1) // 10 + 1, "line_no": (i - 1) % 10 + 1, "product_id": i % PRODUCTS + 1, "qty": 1, "amount": 10}
+            for i in range(1, docs * 10 + 1)
+        ],
+    )
+    now = datetime.utcnow()
+    db.execute(
+        insert(StockLedger),
+        [
+            {
+                "warehouse_id": i % WAREHOUSES + 1,
+                "product_id": i % PRODUCTS + 1,
+                "ref_doc_id": (i - 1) // 10 % docs + 1,
+                "ref_line_id": (i - 1) % (docs * 10) + 1,
+                "ref_type": "PURCHASE_IN",
+                "biz_date": date(2026, 1, 1) + timedelta(days=i % 365),
+                "in_qty": 1,
+                "out_qty": 0,
+                "created_at": now,
+            }
+            for i in range(1, rows + 1)
+        ],
+    )
+    db.execute(
+        insert(StockBalance),
+        [{"warehouse_id": w, "product_id": p, "qty_on_hand": 5} for w in range(1, WAREHOUSES + 1) for p in range(1, PRODUCTS + 1)],
+    )
+    db.execute(
+        insert(ProductSN),
+        [
+            {
+                "id": i,
+                "product_id": i % PRODUCTS + 1,
+                "sn": f"SN{i:09d}",
+                "status": "IN_STOCK",
+                "warehouse_id": i % WAREHOUSES + 1,
+                "in_doc_id": (i - 1) % docs + 1,
+                "in_date": date(2026, 1, 1),
+            }
+            for i in range(1, rows + 1)
+        ],
+    )
+    db.execute(
+        insert(DocLineSN),
+        [{"doc_id": (i - 1) % docs + 1, "line_id": (i - 1) % (docs * 10) + 1, "sn_id": i} for i in range(1, rows + 1)],
+    )
+    db.commit()
+
+
+def cases(db: Session) -> List[Tuple[str, Callable]]:
+    # The filters each path is expected to serve from an index; unfiltered listings scan by design.
+    draft = Doc(doc_type="PURCHASE_IN", doc_no="CHECK-PI", biz_date=date(2026, 6, 1), to_wh_id=1, status="DRAFT")
+    db.add(draft)
+    db.flush()
+    line = DocLine(doc_id=draft.id, line_no=1, product_id=7, qty=5)
+    db.add(line)
+    db.commit()
+    sales = db.get(Doc, 2)
+    # the scanner table is loaded in one pass on first use; only the lookups after that are hot
+    product_lookup.resolve(db, "SKU1")
+    return [
+        ("list_ledger wh+product+dates", lambda: list_ledger(3, 7, date(2026, 2, 1), date(2026, 3, 1), db=db, user=None)),
+        ("list_ledger wh+dates", lambda: list_ledger(3, None, date(2026, 2, 1), date(2026, 2, 2), db=db, user=None)),
+        ("list_balances wh", lambda: list_balances(3, None, db=db, user=None)),
+        ("check_doc", lambda: check_doc(db, draft)),
+        ("line_problems SALES_OUT", lambda: line_problems(db, sales, sales.lines)),
+        ("_load_line_sns", lambda: _load_line_sns(db, 15)),
+        ("list_sns sn", lambda: list_sns("SN000000042", None, None, None, db=db, user=None)),
+        ("list_sns product", lambda: list_sns(None, None, None, 7, db=db, user=None)),
+        ("import_sns", lambda: import_sns(draft.id, line.id, {"sns": ["CHECK-1", "CHECK-2"]}, db=db, user=None)),
+        ("scan_code", lambda: scan_code(draft.id, ScanIn(code="6900000007"), db=db, user=None)),
+        ("product lookup miss", lambda: product_lookup.resolve(db, "NO-SUCH-CODE")),
+        ("stock_matrix page", lambda: stock_matrix(db, [1, 2, 3], None, False, 500, 100)),
+        ("partner statement", lambda: get_partner_statement(5, date(2026, 2, 1), date(2026, 2, 28), None, db=db, user=None)),
+        ("returnable_qty", lambda: returnable_qty(db, db.get(Doc, 2), "SALES_RETURN")),
+        ("check_thresholds", lambda: check_thresholds(db, {(3, 7): 1, (3, 8): 1, (4, 7): 1})),
+    ]
+
+
+def scanned_table(detail: str, statement: str) -> Optional[str]:
+    # the table a plan line scans in full, with aliases mapped back to table names; None for searches
+    match = _SCAN.match(detail)
+    if match is None:
+        return None
+    if match.group(2):
+        return match.group(1)
+    aliases = {alias: table for table, alias in _ALIAS.findall(statement)}
+    return aliases.get(match.group(1), match.group(1))
+
+
+def large_scans(conn, statement: str, parameters) -> List[str]:
+    plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return [row[-1] for row in plan if scanned_table(row[-1], statement) in LARGE_TABLES]
+
+
+def self_check(engine) -> List[str]:
+    found = []
+    with engine.connect() as conn:
+        for statement in KNOWN_SCANS:
+            if not large_scans(conn, statement, ()):
+                found.append(f"full scan not detected: {statement}")
+    for detail, table in LEGACY_PLAN_LINES.items():
+        if scanned_table(detail, "") != table:
+            found.append(f"plan line {detail!r} not read as a scan of {table}")
+    return found
+
+
+def check(engine, db: Session) -> int:
+    captured: List[Tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH", "INSERT")):
+            captured.append((statement, parameters[0] if executemany else parameters))
+
+    failures = 0
+    for name, run in cases(db):
+        captured.clear()
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            run()
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+            db.rollback()
+        scans = []
+        with engine.connect() as conn:
+            for statement, parameters in captured:
+                scans += [(detail, " ".join(statement.split())) for detail in large_scans(conn, statement, parameters)]
+        print(f"{'FAIL' if scans else 'ok':<4}  {name}  ({len(captured)} statements)")
+        for detail, statement in scans:
+            print(f"        {detail}\n          {statement[:200]}")
+        failures += bool(scans)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite+pysqlite:///{Path(tmp) / 'plans.db'}", future=True)
+        Base.metadata.create_all(engine)
+        with Session(engine) as db:
+            seed(db, args.rows)
+            broken = self_check(engine)
+            print(f"{'FAIL' if broken else 'ok':<4}  self-check  ({len(KNOWN_SCANS)} known scans)")
+            for problem in broken:
+                print(f"        {problem}")
+            failures = bool(broken) + check(engine, db)
+        engine.dispose()
+    if failures:
+        print(f"{failures} path(s) scan a large table")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+﻿from __future__ import annotations
+
+# Starts `uvicorn app.main:app --workers 2` on a temporary data directory (JXC_DATA_DIR) and checks that a
+# write handled by one worker is visible to every worker. One keep-alive connection is pinned to each
+# worker; the cached product list and the barcode scan are read through every connection before and
+# after a product's name and barcode are changed through the first one. The list must show the change
+# at once, the scan within PRODUCT_LOOKUP_SYNC_SECONDS. Fails (exit 1) on any stale read.
+#
+#   cd backend && python -m scripts.check_workers
+#   python backend/scripts/check_workers.py
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# migrate and uvicorn run from backend/, wherever the script is started
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.core.config import PRODUCT_LOOKUP_SYNC_SECONDS
+
+SKU = "CHECK-WORKERS"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Worker:
+    # a keep-alive connection stays on the worker process that accepted it
+    def __init__(self, port: int, token: Optional[str] = None):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        self.token = token
+        self.pid: Optional[int] = None
+
+    def call(self, method: str, path: str, body: Optional[dict] = None):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        self.conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = self.conn.getresponse()
+        data = response.read()
+        return response.status, json.loads(data) if data else None
+
+    def ok(self, method: str, path: str, body: Optional[dict] = None):
+        status, data = self.call(method, path, body)
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} answered {status}: {data}")
+        return data
+
+
+def login(port: int, server: subprocess.Popen, timeout: float) -> str:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {server.returncode}")
+        worker = Worker(port)
+        try:
+            return worker.ok("POST", "/api/auth/login", {"username": "admin", "password": "admin123"})["access_token"]
+        except ConnectionError:
+            time.sleep(0.2)
+        finally:
+            worker.conn.close()
+    raise RuntimeError("uvicorn did not start")
+
+
+def connect_workers(port: int, token: str, count: int, attempts: int = 200) -> List[Worker]:
+    by_pid: Dict[int, Worker] = {}
+    for _ in range(attempts):
+        worker = Worker(port, token)
+        worker.pid = worker.ok("GET", "/api/metrics")["pid"]
+        if worker.pid in by_pid:
+            worker.conn.close()
+        else:
+            by_pid[worker.pid] = worker
+        if len(by_pid) == count:
+            return list(by_pid.values())
+    raise RuntimeError(f"{attempts} connections reached {len(by_pid)} of {count} workers")
+
+
+def stale_lists(workers: List[Worker], name: str) -> List[str]:
+    found = []
+    for worker in workers:
+        products = {p["sku"]: p["name"] for p in worker.ok("GET", "/api/products")}
+        if products.get(SKU) != name:
+            found.append(f"worker {worker.pid}: /api/products shows {products.get(SKU)!r}, expected {name!r}")
+    return found
+
+
+def stale_scans(workers: List[Worker], doc_id: int, barcode: str, old: str) -> List[str]:
+    found = []
+    for worker in workers:
+        # the old code first: a miss on the new one would patch the map and hide a stale entry
+        for code, expected in ((old, 404), (barcode, 200)):
+            status, _ = worker.call("POST", f"/api/docs/{doc_id}/scan", {"code": code})
+            if status != expected:
+                found.append(f"worker {worker.pid}: scan {code} answered {status}, expected {expected}")
+    return found
+
+
+def run(count: int, timeout: float) -> List[str]:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "JXC_DATA_DIR": tmp}
+        env.pop("WEB_CONCURRENCY", None)
+        subprocess.run([sys.executable, "-m", "app.manage", "migrate"], cwd=BACKEND_DIR, env=env, check=True)
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(count)]
+            + ["--timeout-keep-alive", "60", "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=env,
+        )
+        workers: List[Worker] = []
+        try:
+            workers = connect_workers(port, login(port, server, timeout), count)
+            first = workers[0]
+            warehouse = first.ok("POST", "/api/warehouses", {"name": "check-workers"})
+            product = first.ok("POST", "/api/products", {"sku": SKU, "name": "created", "barcode": "BC-1"})
+            doc = first.ok(
+                "POST",
+                "/api/docs",
+                {
+                    "doc_type": "PURCHASE_IN",
+                    "biz_date": time.strftime("%Y-%m-%d"),
+                    "to_wh_id": warehouse["id"],
+                    "lines": [{"line_no": 1, "product_id": product["id"], "qty": 1}],
+                },
+            )
+            # fill every worker's list cache and barcode map first, so a missed invalidation shows up as a stale hit
+            found = stale_lists(workers, "created") + stale_scans(workers, doc["id"], "BC-1", "BC-2")
+            first.ok("PUT", f"/api/products/{product['id']}", {"sku": SKU, "name": "updated", "barcode": "BC-2"})
+            found += stale_lists(workers, "updated")
+            # the barcode table is rechecked every PRODUCT_LOOKUP_SYNC_SECONDS; the list cache at once
+            time.sleep(PRODUCT_LOOKUP_SYNC_SECONDS + 0.5)
+            found += stale_scans(workers, doc["id"], "BC-2", "BC-1")
+            return found
+        finally:
+            for worker in workers:
+                worker.conn.close()
+            server.terminate()
+            server.wait(timeout=timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+    found = run(args.workers, args.timeout)
+    print(f"{'FAIL' if found else 'ok':<4}  {args.workers} workers")
+    for problem in found:
+        print(f"        {problem}")
+    if found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+-- Schema of a database created by the create_all-at-startup code, before migrations existed
+-- (the shipped data/app.db). scripts/check_migrations.py adopts a copy of it.
+
+CREATE TABLE warehouses (
+	id INTEGER NOT NULL, 
+	code VARCHAR(50), 
+	name VARCHAR(100) NOT NULL, 
+	location VARCHAR(200), 
+	PRIMARY KEY (id), 
+	UNIQUE (code), 
+	UNIQUE (name)
+);
+CREATE TABLE partners (
+	id INTEGER NOT NULL, 
+	type VARCHAR(20) NOT NULL, 
+	name VARCHAR(100) NOT NULL, 
+	phone VARCHAR(50), 
+	address VARCHAR(200), 
+	PRIMARY KEY (id)
+);
+CREATE INDEX ix_partners_name ON partners (name);
+CREATE INDEX ix_partners_type ON partners (type);
+CREATE TABLE products (
+	id INTEGER NOT NULL, 
+	sku VARCHAR(100) NOT NULL, 
+	name VARCHAR(200) NOT NULL, 
+	brand VARCHAR(100), 
+	model VARCHAR(100), 
+	barcode VARCHAR(100), 
+	unit VARCHAR(20), 
+	track_sn BOOLEAN NOT NULL, 
+	warranty_months INTEGER, 
+	is_active BOOLEAN NOT NULL, 
+	PRIMARY KEY (id)
+);
+CREATE INDEX ix_products_name ON products (name);
+CREATE UNIQUE INDEX ix_products_sku ON products (sku);
+CREATE INDEX ix_products_brand ON products (brand);
+CREATE INDEX ix_products_model ON products (model);
+CREATE TABLE users (
+	id INTEGER NOT NULL, 
+	username VARCHAR(50) NOT NULL, 
+	password_hash VARCHAR(255) NOT NULL, 
+	role VARCHAR(20) NOT NULL, 
+	is_active BOOLEAN NOT NULL, 
+	PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE TABLE docs (
+	id INTEGER NOT NULL, 
+	doc_type VARCHAR(30) NOT NULL, 
+	doc_no VARCHAR(50) NOT NULL, 
+	biz_date DATE NOT NULL, 
+	partner_id INTEGER, 
+	from_wh_id INTEGER, 
+	to_wh_id INTEGER, 
+	status VARCHAR(20) NOT NULL, 
+	remark VARCHAR(500), 
+	created_by INTEGER, 
+	created_at DATETIME NOT NULL, 
+	approved_by INTEGER, 
+	approved_at DATETIME, 
+	posted_by INTEGER, 
+	posted_at DATETIME, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(partner_id) REFERENCES partners (id), 
+	FOREIGN KEY(from_wh_id) REFERENCES warehouses (id), 
+	FOREIGN KEY(to_wh_id) REFERENCES warehouses (id), 
+	FOREIGN KEY(created_by) REFERENCES users (id), 
+	FOREIGN KEY(approved_by) REFERENCES users (id), 
+	FOREIGN KEY(posted_by) REFERENCES users (id)
+);
+CREATE INDEX ix_docs_doc_type ON docs (doc_type);
+CREATE INDEX ix_docs_biz_date ON docs (biz_date);
+CREATE INDEX ix_docs_status ON docs (status);
+CREATE UNIQUE INDEX ix_docs_doc_no ON docs (doc_no);
+CREATE TABLE stock_balances (
+	warehouse_id INTEGER NOT NULL, 
+	product_id INTEGER NOT NULL, 
+	qty_on_hand NUMERIC(18, 2) NOT NULL, 
+	PRIMARY KEY (warehouse_id, product_id), 
+	FOREIGN KEY(warehouse_id) REFERENCES warehouses (id), 
+	FOREIGN KEY(product_id) REFERENCES products (id)
+);
+CREATE TABLE doc_lines (
+	id INTEGER NOT NULL, 
+	doc_id INTEGER NOT NULL, 
+	line_no INTEGER NOT NULL, 
+	product_id INTEGER NOT NULL, 
+	qty NUMERIC(18, 2) NOT NULL, 
+	unit_price NUMERIC(18, 2), 
+	amount NUMERIC(18, 2), 
+	from_wh_id INTEGER, 
+	to_wh_id INTEGER, 
+	remark VARCHAR(500), 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_doc_line_no UNIQUE (doc_id, line_no), 
+	CONSTRAINT ck_doc_line_qty_gt_zero CHECK (qty > 0), 
+	FOREIGN KEY(doc_id) REFERENCES docs (id), 
+	FOREIGN KEY(product_id) REFERENCES products (id), 
+	FOREIGN KEY(from_wh_id) REFERENCES warehouses (id), 
+	FOREIGN KEY(to_wh_id) REFERENCES warehouses (id)
+);
+CREATE INDEX ix_doc_lines_product_id ON doc_lines (product_id);
+CREATE INDEX ix_doc_lines_doc_id ON doc_lines (doc_id);
+CREATE INDEX ix_doc_lines_from_wh_id ON doc_lines (from_wh_id);
+CREATE INDEX ix_doc_lines_to_wh_id ON doc_lines (to_wh_id);
+CREATE TABLE stock_ledger (
+	id INTEGER NOT NULL, 
+	warehouse_id INTEGER NOT NULL, 
+	product_id INTEGER NOT NULL, 
+	ref_doc_id INTEGER NOT NULL, 
+	ref_line_id INTEGER NOT NULL, 
+	ref_type VARCHAR(30) NOT NULL, 
+	biz_date DATE NOT NULL, 
+	in_qty NUMERIC(18, 2) NOT NULL, 
+	out_qty NUMERIC(18, 2) NOT NULL, 
+	unit_cost NUMERIC(18, 2), 
+	created_at DATETIME NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(warehouse_id) REFERENCES warehouses (id), 
+	FOREIGN KEY(product_id) REFERENCES products (id), 
+	FOREIGN KEY(ref_doc_id) REFERENCES docs (id), 
+	FOREIGN KEY(ref_line_id) REFERENCES doc_lines (id)
+);
+CREATE INDEX ix_ledger_ref_doc ON stock_ledger (ref_doc_id);
+CREATE INDEX ix_ledger_wh_prod_date ON stock_ledger (warehouse_id, product_id, biz_date);
+CREATE TABLE product_sns (
+	id INTEGER NOT NULL, 
+	product_id INTEGER NOT NULL, 
+	sn VARCHAR(100) NOT NULL, 
+	status VARCHAR(20) NOT NULL, 
+	warehouse_id INTEGER, 
+	in_doc_id INTEGER, 
+	in_line_id INTEGER, 
+	in_date DATE, 
+	out_doc_id INTEGER, 
+	out_line_id INTEGER, 
+	out_date DATE, 
+	warranty_start DATE, 
+	warranty_end DATE, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(product_id) REFERENCES products (id), 
+	FOREIGN KEY(warehouse_id) REFERENCES warehouses (id), 
+	FOREIGN KEY(in_doc_id) REFERENCES docs (id), 
+	FOREIGN KEY(in_line_id) REFERENCES doc_lines (id), 
+	FOREIGN KEY(out_doc_id) REFERENCES docs (id), 
+	FOREIGN KEY(out_line_id) REFERENCES doc_lines (id)
+);
+CREATE INDEX ix_product_sns_warehouse_id ON product_sns (warehouse_id);
+CREATE INDEX ix_product_sns_product_id ON product_sns (product_id);
+CREATE UNIQUE INDEX ix_product_sns_sn ON product_sns (sn);
+CREATE INDEX ix_product_sns_status ON product_sns (status);
+CREATE TABLE doc_line_sns (
+	id INTEGER NOT NULL, 
+	doc_id INTEGER NOT NULL, 
+	line_id INTEGER NOT NULL, 
+	sn_id INTEGER NOT NULL, 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_line_sn UNIQUE (line_id, sn_id), 
+	FOREIGN KEY(doc_id) REFERENCES docs (id), 
+	FOREIGN KEY(line_id) REFERENCES doc_lines (id), 
+	FOREIGN KEY(sn_id) REFERENCES product_sns (id)
+);
+CREATE INDEX ix_doc_line_sn ON doc_line_sns (doc_id, sn_id);
+CREATE INDEX ix_doc_line_sns_line_id ON doc_line_sns (line_id);
+CREATE INDEX ix_doc_line_sns_doc_id ON doc_line_sns (doc_id);
@@ -1,4 +1,4 @@
-﻿import axios from 'axios'
+﻿import axios, { type InternalAxiosRequestConfig } from 'axios'
 
 const apiBase = import.meta.env.VITE_API_BASE || 'http://127.0.0.1:8000'
 
@@ -16,6 +16,38 @@ api.interceptors.request.use((config) => {
   return config
 })
 
+const AUTH_PATHS = ['/api/auth/login', '/api/auth/refresh', '/api/auth/logout']
+let refreshing: Promise<boolean> | null = null
+
+// Access tokens are short-lived; trade the refresh token for a new pair (one refresh at a time).
+function refreshTokens(): Promise<boolean> {
+  const refreshToken = localStorage.getItem('refresh_token')
+  if (!refreshToken) return Promise.resolve(false)
+  if (!refreshing) {
+    refreshing = axios
+      .post<LoginResponse>(`${apiBase}/api/auth/refresh`, { refresh_token: refreshToken })
+      .then((res) => {
+        localStorage.setItem('access_token', res.data.access_token)
+        localStorage.setItem('refresh_token', res.data.refresh_token)
+        return true
+      })
+      .catch(() => false)
+      .finally(() => {
+        refreshing = null
+      })
+  }
+  return refreshing
+}
+
+api.interceptors.response.use(undefined, async (error) => {
+  const config = error.config as (InternalAxiosRequestConfig & { _retried?: boolean }) | undefined
+  if (error.response?.status === 401 && config && !config._retried && !AUTH_PATHS.includes(config.url || '')) {
+    config._retried = true
+    if (await refreshTokens()) return api.request(config)
+  }
+  return Promise.reject(error)
+})
+
 export type LoginResponse = {
   access_token: string
   refresh_token: string
@@ -27,6 +59,11 @@ export async function login(username: string, password: string) {
   return res.data
 }
 
+export async function logout() {
+  const refreshToken = localStorage.getItem('refresh_token')
+  if (refreshToken) await api.post('/api/auth/logout', { refresh_token: refreshToken })
+}
+
 export async function getMe() {
   const res = await api.get('/api/auth/me')
   return res.data as { id: number; username: string; role: string }
@@ -11,6 +11,10 @@ pushd backend
 python -m pip install -r requirements.txt
 if errorlevel 1 exit /b 1
 
+echo Migrating database ...
+python -m app.manage migrate
+if errorlevel 1 exit /b 1
+
 echo Starting backend on http://127.0.0.1:8000 ...
 python -m uvicorn app.main:app --host 0.0.0.0 --port 8000
 popd